@@ -0,0 +1,166 @@
+"""
+Shared execution layer for every Google API request.
+
+Requests built by gcp_clients run through ``execute`` which:
+
+- waits on a token bucket per (API, project) — ``API_RATE_LIMIT`` requests per
+  second, per-API overrides in ``API_RATE_LIMITS`` (e.g. ``compute=20,storage=50``);
+- retries 429, 5xx, quota-flavoured 403s and dropped connections with
+  exponential backoff and full jitter, honouring ``Retry-After`` when the server
+  sends one (waiting the full time asked, never less); a request gives up instead of
+  sleeping past what its remaining retries could wait, or past the deadline of
+  the check it runs for (``deadline_scope``); once that deadline has passed,
+  no new request is sent (``DeadlineExceeded``), so a check that timed out
+  stops at its next API call instead of holding a worker thread to the end;
+- counts requests, retries, throttle waits and failures per API.
+
+The limits are for the whole server: with ``SERVER_WORKERS`` worker processes
+(set by serve.py) each process enforces its equal share.
+"""
+import contextlib
+import contextvars
+import email.utils
+import os
+import random
+import re
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+
+from googleapiclient.errors import HttpError
+
+from ratelimit import RateLimiters, parse_rates
+
+API_RATE_LIMIT = float(os.getenv("API_RATE_LIMIT", "20"))  # requests/second per API and project
+API_RATE_LIMITS = parse_rates(os.getenv("API_RATE_LIMITS"))
+SERVER_WORKERS = max(1, int(os.getenv("SERVER_WORKERS", "1")))
+API_MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", "5"))
+API_BACKOFF_BASE = float(os.getenv("API_BACKOFF_BASE", "0.5"))  # seconds
+API_BACKOFF_MAX = float(os.getenv("API_BACKOFF_MAX", "32"))  # seconds
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = (b"rateLimitExceeded", b"userRateLimitExceeded", b"quotaExceeded")
+
+limiters = RateLimiters(API_RATE_LIMIT / SERVER_WORKERS,
+                        overrides={api: rate / SERVER_WORKERS for api, rate in API_RATE_LIMITS.items()})
+
+# time.monotonic() by which the current check must finish, set by audit_runner
+_deadline = contextvars.ContextVar("api_deadline", default=None)
+
+_counters = Counter()
+_counters_lock = threading.Lock()
+
+_PROJECT_RE = re.compile(r"(?:/projects/|[?&]project=)([^/?&]+)")
+
+
+class DeadlineExceeded(TimeoutError):
+    """The check this request was made for is out of time."""
+
+
+def count(api, name, value=1):
+    with _counters_lock:
+        _counters[(api, name)] += value
+
+
+def counters():
+    """``{api: {counter: value}}`` snapshot of the execution counters."""
+    with _counters_lock:
+        snapshot = {}
+        for (api, name), value in _counters.items():
+            snapshot.setdefault(api, {})[name] = round(value, 3) if isinstance(value, float) else value
+        return snapshot
+
+
+def project_of(uri):
+    match = _PROJECT_RE.search(uri or "")
+    return match.group(1) if match else None
+
+
+def is_retryable(error):
+    if isinstance(error, HttpError):
+        status = error.resp.status
+        if status in RETRY_STATUSES:
+            return True
+        return status == 403 and any(reason in (error.content or b"") for reason in RATE_LIMIT_REASONS)
+    # httplib2 is imported with the first request, so its errors can only exist once it is loaded
+    httplib2 = sys.modules.get("httplib2")
+    transport_errors = (httplib2.HttpLib2Error,) if httplib2 is not None else ()
+    return isinstance(error, (socket.timeout, ConnectionError) + transport_errors)
+
+
+def retry_after(error):
+    """Seconds requested by a ``Retry-After`` header, if any."""
+    resp = getattr(error, "resp", None)
+    value = resp.get("retry-after") if resp is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+@contextlib.contextmanager
+def deadline_scope(seconds):
+    """Requests made in this scope (and threads that copy its context) stop retrying ``seconds`` from now."""
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_left():
+    """Seconds until the current deadline, or ``None`` without one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def backoff(attempt):
+    return random.uniform(0, min(API_BACKOFF_MAX, API_BACKOFF_BASE * (2 ** attempt)))
+
+
+def execute(api, uri, send):
+    """Call ``send()`` under the rate limit for (api, project), retrying transient failures."""
+    bucket = limiters.get((api, project_of(uri)))
+    attempt = 0
+    while True:
+        remaining = time_left()
+        if remaining is not None and remaining <= 0:
+            count(api, "deadline_exceeded")
+            raise DeadlineExceeded(f"Deadline exceeded before calling {api}")
+        waited = bucket.acquire()
+        if waited:
+            count(api, "throttle_waits")
+            count(api, "throttle_wait_seconds", waited)
+
+        try:
+            result = send()
+            count(api, "requests")
+            return result
+        except Exception as e:
+            count(api, "requests")
+            if not is_retryable(e) or attempt >= API_MAX_RETRIES:
+                count(api, "failures")
+                raise
+            requested = retry_after(e)
+            delay = backoff(attempt) if requested is None else requested
+            remaining = time_left()
+            # ✅ Fail now rather than wait for a retry that could only come too late
+            if ((requested is not None and requested > (API_MAX_RETRIES - attempt) * API_BACKOFF_MAX)
+                    or (remaining is not None and delay >= remaining)):
+                count(api, "failures")
+                count(api, "retries_abandoned")
+                raise
+
+        attempt += 1
+        count(api, "retries")
+        time.sleep(delay)
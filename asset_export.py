@@ -0,0 +1,279 @@
+"""
+Cloud Asset Inventory as a data source for the checks.
+
+One Cloud Asset export covers every project under an organization or folder,
+resources and IAM policies alike, so an org-wide audit needs a handful of
+paged ``assets.list`` reads (``list_assets``) or a single export file
+(``exportAssets`` NDJSON, a JSON array, or saved ``assets.list`` pages)
+instead of the per-API, per-resource requests of a live scan.
+
+Exports are parsed as a stream (``iter_assets``), so the file is never held
+in memory as one document. ``AssetExport`` groups the assets by project into
+the same resource types the inventory snapshots use, and
+``AssetExport.source(project)`` is a data source for ``inventory.ReplayClient``:
+every check in audit_checks runs unchanged against it, e.g. through
+``audit_runner.run_audit(..., source=export.source(project))``.
+"""
+import codecs
+import gzip
+import io
+import json
+
+from gcp_clients import get_client
+from inventory import resource_name
+from pagination import iter_pages
+
+CHUNK_SIZE = 1 << 16
+PAGE_SIZE = 1000
+
+# Cloud Asset type -> inventory resource type (compute types are listed per scope)
+ASSET_TYPES = {
+    "compute.googleapis.com/Instance": "compute.instances",
+    "compute.googleapis.com/ForwardingRule": "compute.forwardingRules",
+    "compute.googleapis.com/GlobalForwardingRule": "compute.forwardingRules",
+    "compute.googleapis.com/TargetHttpsProxy": "compute.targetHttpsProxies",
+    "compute.googleapis.com/TargetHttpProxy": "compute.targetHttpProxies",
+    "compute.googleapis.com/SslCertificate": "compute.sslCertificates",
+    "compute.googleapis.com/UrlMap": "compute.urlMaps",
+    "compute.googleapis.com/SecurityPolicy": "compute.securityPolicies",
+    "compute.googleapis.com/Firewall": "compute.firewalls",
+    "sqladmin.googleapis.com/Instance": "sqladmin.instances",
+    "container.googleapis.com/Cluster": "container.clusters",
+    "storage.googleapis.com/Bucket": "storage.buckets",
+    "cloudfunctions.googleapis.com/CloudFunction": "cloudfunctions.functions",
+    "run.googleapis.com/Service": "run.services",
+}
+
+PROJECT_TYPE = "cloudresourcemanager.googleapis.com/Project"
+
+# Cloud Asset type -> inventory type of its IAM policy
+IAM_TYPES = {
+    PROJECT_TYPE: "cloudresourcemanager.projectIamPolicies",
+    "storage.googleapis.com/Bucket": "storage.bucketIamPolicies",
+    "run.googleapis.com/Service": "run.serviceIamPolicies",
+}
+
+
+# ----------------- Stream Parsing -----------------
+def iter_values(fp, chunk_size=CHUNK_SIZE):
+    """
+    Top-level JSON values of a text stream, one at a time: whitespace-separated
+    values (NDJSON) or the elements of a top-level array.
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, eof, in_array = "", 0, False, False
+
+    while True:
+        # Skip whitespace (and separators inside the array), refilling as needed
+        while True:
+            while pos < len(buf) and (buf[pos].isspace() or (in_array and buf[pos] == ",")):
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            buf, pos = fp.read(chunk_size), 0
+            eof = not buf
+        if pos >= len(buf):
+            return
+
+        if not in_array and buf[pos] == "[":
+            in_array, pos = True, pos + 1
+            continue
+        if in_array and buf[pos] == "]":
+            in_array, pos = False, pos + 1
+            continue
+
+        try:
+            value, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # ✅ Value cut by the chunk boundary: read at least as much again, so large values stay linear
+            more = fp.read(max(chunk_size, len(buf) - pos))
+            buf, pos, eof = buf[pos:] + more, 0, not more
+            continue
+        pos = end
+        yield value
+
+
+class _TextReader:
+    """
+    ``read(n)`` of a binary file object, decoded as UTF-8. Works on anything with
+    ``read()``: upload spools such as Starlette's ``SpooledTemporaryFile`` lack
+    the ``readable()`` that ``io.TextIOWrapper`` needs.
+    """
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def read(self, size):
+        while True:
+            data = self.fp.read(size)
+            text = self.decoder.decode(data, final=not data)
+            # ✅ A chunk holding only part of a multi-byte character decodes to "", which isn't EOF
+            if text or not data:
+                return text
+
+
+def iter_assets(source):
+    """
+    Assets of a Cloud Asset export, streamed from a path (``.gz`` allowed) or a
+    text/binary file object; ``{"assets": [...]}`` pages are flattened.
+    """
+    if isinstance(source, str):
+        opener = gzip.open if source.endswith(".gz") else open
+        with opener(source, "rt", encoding="utf-8") as fp:
+            yield from iter_assets(fp)
+        return
+    if not isinstance(source, io.TextIOBase):
+        source = _TextReader(source)
+
+    for value in iter_values(source):
+        if not isinstance(value, dict):
+            raise ValueError(f"Expected asset objects, got {type(value).__name__}")
+        if "assets" in value and "name" not in value:
+            page = value["assets"]
+            if not isinstance(page, list) or not all(isinstance(a, dict) for a in page):
+                raise ValueError("Expected \"assets\" to be a list of asset objects")
+            yield from page
+        elif value:
+            yield value
+
+
+def list_assets(creds, parent, content_types=("RESOURCE", "IAM_POLICY")):
+    """Assets the checks need under ``organizations/N``, ``folders/N`` or ``projects/X``, straight from the API."""
+    cloudasset = get_client("cloudasset", "v1", creds)
+    for content_type in content_types:
+        types = list(ASSET_TYPES) + [PROJECT_TYPE] if content_type == "RESOURCE" else list(IAM_TYPES)
+        request = cloudasset.assets().list(parent=parent, contentType=content_type, assetTypes=types,
+                                           pageSize=PAGE_SIZE)
+        for res in iter_pages(request, cloudasset.assets().list_next):
+            yield from res.get("assets", [])
+
+
+# ----------------- Export Grouping -----------------
+def field(asset, snake, camel):
+    """Export files use snake_case keys, the API camelCase."""
+    return asset.get(snake, asset.get(camel))
+
+
+def path_of(asset):
+    """``//compute.googleapis.com/projects/p/zones/z/instances/vm`` -> the segments after the host."""
+    return asset.get("name", "").lstrip("/").split("/")[1:]
+
+
+def project_key(asset, path):
+    """Project number from the ancestors, else the project named in the asset's own path."""
+    for ancestor in asset.get("ancestors", []):
+        if ancestor.startswith("projects/"):
+            return ancestor.split("/", 1)[1]
+    if len(path) > 1 and path[0] == "projects":
+        return path[1]
+    return None
+
+
+def compute_scope(path):
+    """``zones/z`` or ``regions/r`` from a compute asset path, else ``global`` (the aggregatedList key)."""
+    if len(path) > 3 and path[2] in ("zones", "regions"):
+        return f"{path[2]}/{path[3]}"
+    return "global"
+
+
+class AssetExport:
+    """The assets of one export, grouped by project into inventory resource types."""
+
+    def __init__(self, assets):
+        grouped = {}
+        project_ids = {}
+        inactive = set()
+
+        for asset in assets:
+            asset_type = field(asset, "asset_type", "assetType")
+            path = path_of(asset)
+            key = project_key(asset, path)
+            if key is None:
+                continue
+            resource = asset.get("resource") or {}
+            data = resource.get("data")
+            policy = field(asset, "iam_policy", "iamPolicy")
+            collections = grouped.setdefault(key, {})
+
+            if asset_type == PROJECT_TYPE and data:
+                project_ids[str(data.get("projectNumber", key))] = data.get("projectId", key)
+                if data.get("lifecycleState", "ACTIVE") != "ACTIVE":
+                    inactive.add(key)
+
+            kind = ASSET_TYPES.get(asset_type)
+            if kind and data:
+                scope = compute_scope(path) if kind.startswith("compute.") else None
+                collections.setdefault(kind, []).append((resource_name(data), scope, data))
+
+            if asset_type in IAM_TYPES and policy is not None:
+                collections.setdefault(IAM_TYPES[asset_type], []).append(
+                    (self.policy_target(asset_type, path, resource), None, policy))
+
+        # Ancestors name projects by number; the checks ask by project ID
+        self.projects_by_id = {}
+        for key, collections in grouped.items():
+            if key in inactive:
+                continue
+            project = project_ids.get(key, key)
+            merged = self.projects_by_id.setdefault(project, {})
+            for kind, rows in collections.items():
+                merged.setdefault(kind, []).extend(rows)
+        for project, collections in self.projects_by_id.items():
+            if "cloudresourcemanager.projectIamPolicies" in collections:
+                collections["cloudresourcemanager.projectIamPolicies"] = [
+                    (project, None, policy) for _, _, policy in collections["cloudresourcemanager.projectIamPolicies"]]
+            run_policies = collections.get("run.serviceIamPolicies", [])
+            collections["run.serviceIamPolicies"] = [
+                (f"projects/{project}/{name}", None, policy) for name, _, policy in run_policies]
+
+    @staticmethod
+    def policy_target(asset_type, path, resource):
+        """The name ``getIamPolicy`` is called with, as the checks build it (the project part is added later)."""
+        if asset_type == "run.googleapis.com/Service":
+            labels = (resource.get("data") or {}).get("metadata", {}).get("labels", {})
+            location = (labels.get("cloud.googleapis.com/location") or resource.get("location")
+                        or (path[3] if len(path) > 3 else "global"))
+            return f"locations/{location}/services/{path[-1]}"
+        return path[-1] if path else ""
+
+    @classmethod
+    def load(cls, source):
+        """Stream-parse an export file (path or file object)."""
+        return cls(iter_assets(source))
+
+    @classmethod
+    def from_api(cls, creds, parent):
+        return cls(list_assets(creds, parent))
+
+    def projects(self):
+        return sorted(self.projects_by_id)
+
+    def source(self, project):
+        return ExportSource(self.projects_by_id.get(project, {}))
+
+    def collections(self, project):
+        """``{type: [(name, scope, data)]}`` of one project, in the form ``InventoryStore.save`` takes."""
+        return self.projects_by_id.get(project, {})
+
+
+class ExportSource:
+    """One project of an export as a data source for ``inventory.ReplayClient``."""
+
+    def __init__(self, collections):
+        self._collections = collections
+        self._by_name = {}
+
+    def resources(self, kind):
+        return [(scope, data) for _, scope, data in self._collections.get(kind, [])]
+
+    def get(self, kind, name):
+        if kind not in self._by_name:
+            self._by_name[kind] = {n: data for n, _, data in self._collections.get(kind, [])}
+        return self._by_name[kind].get(name)
+
+    def failure(self, kind):
+        # An export has no per-type failures: a type it does not contain simply has no resources
+        return None
@@ -0,0 +1,259 @@
+"""
+Persistent audit results cache (SQLite).
+
+Two things are stored per (project, check):
+
+- per-resource verdicts keyed by the identity they were evaluated as (two
+  service accounts may be allowed to read different things) and the version of
+  what the verdict reads (a bucket's ``etag`` and ``metageneration``), so a
+  scan only re-reads the IAM policies of buckets that changed. Verdicts that
+  depend on something without a cheap version are not cached: Cloud Run IAM
+  policies, and load balancers, whose proxy, certificates, Cloud Armor policy
+  and URL map would each need a GET just to build the key. Verdicts also
+  expire after ``AUDIT_CACHE_TTL`` seconds;
+- the findings of the last two scans, for the "diff since last scan" view.
+  Findings are stored one row each, so a streamed scan can be written as it
+  goes (``ScanWriter``) instead of being held in memory until it finishes.
+
+Set ``AUDIT_CACHE=off`` to disable; ``AUDIT_CACHE_PATH`` picks the database file,
+which is created private to the server's user (see sqlite_store). A verdict
+planted by another user could hide a finding, so a file others could write or
+read is refused and the process audits without the cache.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from sqlite_store import DATA_DIR, SqliteStore, private_database
+
+AUDIT_CACHE_ENABLED = os.getenv("AUDIT_CACHE", "on").lower() not in ("0", "off", "false", "no")
+AUDIT_CACHE_PATH = os.getenv("AUDIT_CACHE_PATH") or os.path.join(DATA_DIR, "audit_cache.sqlite3")
+AUDIT_CACHE_TTL = int(os.getenv("AUDIT_CACHE_TTL", "3600"))  # seconds
+SCAN_WRITE_BATCH = int(os.getenv("SCAN_WRITE_BATCH", "500"))  # findings per insert
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS verdicts (
+    project TEXT NOT NULL,
+    check_name TEXT NOT NULL,
+    viewer TEXT NOT NULL,
+    resource TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    verdict TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (project, check_name, viewer, resource)
+);
+CREATE TABLE IF NOT EXISTS scans (
+    scan_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project TEXT NOT NULL,
+    check_name TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL  -- NULL while the scan is still being written
+);
+CREATE INDEX IF NOT EXISTS scans_by_check ON scans (project, check_name, scan_id);
+CREATE TABLE IF NOT EXISTS scan_findings (
+    scan_id INTEGER NOT NULL,
+    finding TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS findings_by_scan ON scan_findings (scan_id);
+"""
+
+
+def finding_key(finding):
+    return json.dumps(finding, sort_keys=True, default=str)
+
+
+class AuditCache(SqliteStore):
+    def __init__(self, path, ttl=AUDIT_CACHE_TTL):
+        private_database(path)
+        super().__init__(path)
+        self.ttl = ttl
+        with self._conn() as conn:
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(verdicts)")]
+            if columns and "viewer" not in columns:
+                conn.execute("DROP TABLE verdicts")  # verdicts from before they were keyed on the viewer
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(scans)")]
+            if "findings" in columns:
+                conn.execute("DROP TABLE scans")  # scans that kept all findings in one JSON blob
+            conn.executescript(SCHEMA)
+
+    # ----------------- Per-resource verdicts -----------------
+    def get_verdict(self, project, check, viewer, resource, fingerprint):
+        row = self._conn().execute(
+            "SELECT verdict FROM verdicts WHERE project=? AND check_name=? AND viewer=? AND resource=? "
+            "AND fingerprint=? AND updated_at>=?",
+            (project, check, viewer, resource, fingerprint, time.time() - self.ttl),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_verdict(self, project, check, viewer, resource, fingerprint, verdict):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (project, check, viewer, resource, fingerprint, json.dumps(verdict, default=str), time.time()),
+            )
+
+    # ----------------- Scan history -----------------
+    def begin_scan(self, project, check):
+        """Start a scan; it stays out of diffs until ``finish_scan``."""
+        with self._conn() as conn:
+            cur = conn.execute(
+                "INSERT INTO scans (project, check_name, started_at) VALUES (?, ?, ?)",
+                (project, check, time.time()),
+            )
+            return cur.lastrowid
+
+    def add_findings(self, scan_id, findings):
+        with self._conn() as conn:
+            conn.executemany(
+                "INSERT INTO scan_findings VALUES (?, ?)",
+                ((scan_id, json.dumps(f, default=str)) for f in findings),
+            )
+
+    def finish_scan(self, project, check, scan_id):
+        """Publish the scan, keeping the previous one for diffs."""
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute("UPDATE scans SET finished_at=? WHERE scan_id=?", (now, scan_id))
+            # Older finished scans, and unfinished ones whose writer died with its process
+            stale = (
+                "SELECT scan_id FROM scans WHERE project=? AND check_name=? AND ("
+                "(finished_at IS NOT NULL AND scan_id NOT IN (SELECT scan_id FROM scans WHERE project=? "
+                "AND check_name=? AND finished_at IS NOT NULL ORDER BY scan_id DESC LIMIT 2)) "
+                "OR (finished_at IS NULL AND started_at<?))"
+            )
+            params = (project, check, project, check, now - self.ttl)
+            conn.execute(f"DELETE FROM scan_findings WHERE scan_id IN ({stale})", params)
+            conn.execute(f"DELETE FROM scans WHERE scan_id IN ({stale})", params)
+            conn.execute(
+                "DELETE FROM verdicts WHERE project=? AND check_name=? AND updated_at<?",
+                (project, check, now - self.ttl),
+            )
+
+    def abandon_scan(self, scan_id):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM scan_findings WHERE scan_id=?", (scan_id,))
+            conn.execute("DELETE FROM scans WHERE scan_id=?", (scan_id,))
+
+    def record_scan(self, project, check, findings):
+        """Store this scan's findings, keeping the previous scan for diffs."""
+        scan_id = self.begin_scan(project, check)
+        self.add_findings(scan_id, findings)
+        self.finish_scan(project, check, scan_id)
+        return scan_id
+
+    def _findings(self, scan_id):
+        rows = self._conn().execute(
+            "SELECT finding FROM scan_findings WHERE scan_id=? ORDER BY rowid", (scan_id,)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def diff(self, project, check):
+        """Findings added and removed between the last two scans of ``check``."""
+        rows = self._conn().execute(
+            "SELECT scan_id, finished_at FROM scans WHERE project=? AND check_name=? "
+            "AND finished_at IS NOT NULL ORDER BY scan_id DESC LIMIT 2",
+            (project, check),
+        ).fetchall()
+        if not rows:
+            return None
+
+        latest = self._findings(rows[0][0])
+        previous = self._findings(rows[1][0]) if len(rows) > 1 else []
+        latest_keys = {finding_key(f) for f in latest}
+        previous_keys = {finding_key(f) for f in previous}
+        return {
+            "latest_scan_at": rows[0][1],
+            "previous_scan_at": rows[1][1] if len(rows) > 1 else None,
+            "added": [f for f in latest if finding_key(f) not in previous_keys],
+            "removed": [f for f in previous if finding_key(f) not in latest_keys],
+            "unchanged": len(latest_keys & previous_keys),
+        }
+
+    def checks_scanned(self, project):
+        rows = self._conn().execute(
+            "SELECT DISTINCT check_name FROM scans WHERE project=? AND finished_at IS NOT NULL ORDER BY check_name", (project,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+
+_cache = None
+_cache_failed = False
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """The process-wide cache, or ``None`` when caching is disabled or its file is unsafe."""
+    global _cache, _cache_failed
+    if not AUDIT_CACHE_ENABLED or _cache_failed:
+        return None
+    with _cache_lock:
+        if _cache is None and not _cache_failed:
+            try:
+                _cache = AuditCache(AUDIT_CACHE_PATH)
+            except OSError as e:
+                _cache_failed = True
+                logger.error("Audit cache disabled: %s", e)
+        return _cache
+
+
+def cached_verdict(check, project, viewer, resource, fingerprint, evaluate, should_cache=None):
+    """
+    ``evaluate()`` unless a verdict for this exact resource version, evaluated as
+    ``viewer``, is cached. ``should_cache(verdict)`` can veto storing a verdict,
+    e.g. one that records an API error.
+    """
+    cache = get_cache()
+    if cache is None or not fingerprint:
+        return evaluate()
+    verdict = cache.get_verdict(project, check, viewer, resource, fingerprint)
+    if verdict is None:
+        verdict = evaluate()
+        if should_cache is None or should_cache(verdict):
+            cache.put_verdict(project, check, viewer, resource, fingerprint, verdict)
+    return verdict
+
+
+def record_scan(project, check, findings):
+    cache = get_cache()
+    if cache is not None:
+        cache.record_scan(project, check, findings)
+
+
+class ScanWriter:
+    """
+    Records a scan's findings while they are produced, ``SCAN_WRITE_BATCH`` at a
+    time. ``finish()`` publishes the scan; ``abandon()`` drops a partial one.
+    """
+
+    def __init__(self, cache, project, check):
+        self.cache, self.project, self.check = cache, project, check
+        self.scan_id = cache.begin_scan(project, check)
+        self.batch = []
+
+    def add(self, finding):
+        self.batch.append(finding)
+        if len(self.batch) >= SCAN_WRITE_BATCH:
+            self._flush()
+
+    def _flush(self):
+        if self.batch:
+            self.cache.add_findings(self.scan_id, self.batch)
+            self.batch = []
+
+    def finish(self):
+        self._flush()
+        self.cache.finish_scan(self.project, self.check, self.scan_id)
+
+    def abandon(self):
+        self.batch = []
+        self.cache.abandon_scan(self.scan_id)
+
+
+def scan_writer(project, check):
+    """A ``ScanWriter`` for ``check``, or ``None`` when caching is disabled."""
+    cache = get_cache()
+    return ScanWriter(cache, project, check) if cache is not None else None
@@ -1,61 +1,105 @@
-from googleapiclient import discovery
-from google.auth import default
-
-# ✅ Get credentials once — reuse everywhere
-creds, project_from_creds = default()
+import threading
+
+from googleapiclient.errors import HttpError
+from gcp_clients import get_client
+from fanout import fetch_all, FetchOnce
+from audit_cache import cached_verdict
+from pagination import iter_pages, token_pager
+from firewall_engine import FirewallEngine, instance_external_ips, SENSITIVE_PORTS
+from findings import (ComputePublicIp, SqlPublicIp, GkeCluster, OwnerServiceAccount, PublicBucket, LoadBalancer,
+                      FirewallRule, FirewallExposure, ServerlessService, as_record)
+
+# ✅ Application Default Credentials are resolved on first use, then reused everywhere
+_adc = None
+_adc_lock = threading.Lock()
+
+def default_credentials():
+    global _adc
+    if _adc is None:
+        # ✅ One thread runs the (slow) ADC lookup; concurrent first requests wait for its result
+        with _adc_lock:
+            if _adc is None:
+                from google.auth import default
+                _adc = default()
+    return _adc
 
 # ✅ Helper to always choose ENV var first
 import os
 def get_project_id():
-    return os.getenv("PROJECT_ID") or project_from_creds
+    return os.getenv("PROJECT_ID") or default_credentials()[1]
+
+
+# ✅ Page size for list calls; responses are trimmed with `fields=` masks to what each check reads
+PAGE_SIZE = 500
+
+
+# ✅ Checks audit the given credentials/project, falling back to ADC
+def resolve_credentials(creds=None, project=None):
+    if creds is None:
+        return default_credentials()[0], project or get_project_id()
+    return creds, project or getattr(creds, "project_id", None) or get_project_id()
+
+
+def credential_identity(creds):
+    """Who a cached verdict was evaluated as: accounts can be allowed to read different things."""
+    return getattr(creds, 'service_account_email', None) or type(creds).__name__
 
 
 # ----------------- Compute VM Public IPs -----------------
-def check_compute_public_ips():
-    project = get_project_id()
-    compute = discovery.build('compute', 'v1', credentials=creds)
-    
-    vm_data = []
-    req = compute.instances().aggregatedList(project=project)
-
-    while req is not None:
-        res = req.execute()
+def iter_compute_public_ips(creds=None, project=None):
+    creds, project = resolve_credentials(creds, project)
+    compute = get_client('compute', 'v1', creds)
+
+    req = compute.instances().aggregatedList(
+        project=project, maxResults=PAGE_SIZE,
+        fields='items/*/instances(name,networkInterfaces/accessConfigs/natIP),nextPageToken'
+    )
+
+    for res in iter_pages(req, compute.instances().aggregatedList_next):
         for zone, scoped_list in res.get('items', {}).items():
             for instance in scoped_list.get('instances', []):
                 name = instance['name']
                 for nic in instance.get('networkInterfaces', []):
                     for ac in nic.get('accessConfigs', []):
                         if 'natIP' in ac:
-                            vm_data.append([name, zone, ac['natIP']])
-        req = compute.instances().aggregatedList_next(req, res)
+                            yield ComputePublicIp(name, zone, ac['natIP'])
 
-    return vm_data
+
+def check_compute_public_ips(creds=None, project=None):
+    return list(iter_compute_public_ips(creds, project))
 
 
 # ----------------- SQL Public IPs -----------------
-def check_sql_public_ips():
-    project = get_project_id()
-    sqladmin = discovery.build('sqladmin', 'v1beta4', credentials=creds)
+def iter_sql_public_ips(creds=None, project=None):
+    creds, project = resolve_credentials(creds, project)
+    sqladmin = get_client('sqladmin', 'v1beta4', creds)
 
-    sql_data = []
-    req = sqladmin.instances().list(project=project)
-    res = req.execute()
+    req = sqladmin.instances().list(
+        project=project, maxResults=PAGE_SIZE,
+        fields='items(name,ipAddresses(type,ipAddress)),nextPageToken'
+    )
+    for res in iter_pages(req, sqladmin.instances().list_next):
+        for instance in res.get('items', []):
+            for ip in instance.get('ipAddresses', []):
+                if ip.get('type') == 'PRIMARY':
+                    yield SqlPublicIp(instance['name'], ip.get('ipAddress', 'N/A'))
 
-    for instance in res.get('items', []):
-        for ip in instance.get('ipAddresses', []):
-            if ip.get('type') == 'PRIMARY':
-                sql_data.append([instance['name'], ip.get('ipAddress', 'N/A')])
 
-    return sql_data
+def check_sql_public_ips(creds=None, project=None):
+    return list(iter_sql_public_ips(creds, project))
 
 
 # ----------------- GKE Cluster Public Endpoints -----------------
-def check_gke_clusters():
-    project = get_project_id()
-    container = discovery.build('container', 'v1', credentials=creds)
+def check_gke_clusters(creds=None, project=None):
+    creds, project = resolve_credentials(creds, project)
+    container = get_client('container', 'v1', creds)
 
     gke_data = []
-    req = container.projects().locations().clusters().list(parent=f"projects/{project}/locations/-")
+    req = container.projects().locations().clusters().list(
+        parent=f"projects/{project}/locations/-",
+        fields='clusters(name,endpoint,privateClusterConfig/enablePrivateNodes)'
+    )
+    # clusters.list is not paginated: one response holds every cluster
     res = req.execute()
 
     for cluster in res.get('clusters', []):
@@ -63,331 +107,437 @@ def check_gke_clusters():
         private_nodes = cluster.get('privateClusterConfig', {}).get('enablePrivateNodes', False)
 
         if endpoint and not private_nodes:
-            gke_data.append([cluster['name'], endpoint])
+            gke_data.append(GkeCluster(cluster['name'], endpoint))
 
     return gke_data
 
 
 # ----------------- Owner Service Accounts -----------------
-def check_owner_service_accounts():
-    project = get_project_id()
-    crm = discovery.build('cloudresourcemanager', 'v1', credentials=creds)
+def check_owner_service_accounts(creds=None, project=None):
+    creds, project = resolve_credentials(creds, project)
+    crm = get_client('cloudresourcemanager', 'v1', creds)
 
     owner_data = []
-    policy = crm.projects().getIamPolicy(resource=project, body={}).execute()
+    policy = crm.projects().getIamPolicy(resource=project, body={}, fields='bindings(role,members)').execute()
 
     for binding in policy.get('bindings', []):
         if binding.get('role') == 'roles/owner':
             for member in binding.get('members', []):
                 if member.startswith("serviceAccount:"):
-                    owner_data.append([member, binding['role']])
+                    owner_data.append(OwnerServiceAccount(member, binding['role']))
 
     return owner_data
 
 
 # ----------------- Public Buckets -----------------
-def check_public_buckets():
-    project = get_project_id()
-    storage = discovery.build('storage', 'v1', credentials=creds)
+def iter_public_buckets(creds=None, project=None):
+    creds, project = resolve_credentials(creds, project)
+    storage = get_client('storage', 'v1', creds)
+
+    req = storage.buckets().list(
+        project=project, maxResults=1000, projection='noAcl',
+        fields='items(name,etag,metageneration),nextPageToken'
+    )
 
-    bucket_data = []
-    res = storage.buckets().list(project=project).execute()
+    viewer = credential_identity(creds)
 
-    for bucket in res.get('items', []):
+    def public_bindings(bucket, unread):
         try:
-            iam = storage.buckets().getIamPolicy(bucket=bucket['name']).execute()
-            for b in iam.get('bindings', []):
-                for m in b.get('members', []):
-                    if 'allUsers' in m or 'allAuthenticatedUsers' in m:
-                        bucket_data.append([bucket['name'], b['role'], m])
-        except:
-            continue
-
-    return bucket_data
-
-def check_load_balancers_audit():
-    creds, project = default()
-    compute = discovery.build('compute', 'v1', credentials=creds)
-    lb_data = []
-
-    req = compute.forwardingRules().aggregatedList(project=project)
-    while req is not None:
-        res = req.execute()
+            iam = storage.buckets().getIamPolicy(bucket=bucket['name'], fields='bindings(role,members)').execute()
+        except HttpError as e:
+            # Bucket deleted mid-scan or IAM not readable by this account: nothing to report
+            if e.resp.status in (403, 404):
+                unread.append(e.resp.status)
+                return []
+            return [PublicBucket(bucket['name'], 'Error fetching IAM policy', str(e))]
+        return [PublicBucket(bucket['name'], b['role'], m)
+                for b in iam.get('bindings', [])
+                for m in b.get('members', [])
+                if 'allUsers' in m or 'allAuthenticatedUsers' in m]
+
+    def bucket_verdict(bucket):
+        # ✅ IAM is only re-read for buckets whose metadata changed since the last scan
+        fingerprint = f"{bucket.get('etag')}:{bucket.get('metageneration')}" if bucket.get('etag') else None
+        unread = []  # an IAM policy this account could not read says nothing about the bucket: never cached
+        rows = cached_verdict('public_buckets', project, viewer, bucket['name'], fingerprint,
+                              lambda: public_bindings(bucket, unread),
+                              should_cache=lambda rows: not unread and
+                              not any(r[1] == 'Error fetching IAM policy' for r in rows))
+        return [as_record(PublicBucket, row) for row in rows]
+
+    # ✅ One getIamPolicy per bucket, fetched concurrently, page by page
+    for res in iter_pages(req, storage.buckets().list_next):
+        for findings in fetch_all(bucket_verdict, res.get('items', [])):
+            yield from findings
+
+
+def check_public_buckets(creds=None, project=None):
+    return list(iter_public_buckets(creds, project))
+
+def iter_load_balancers_audit(creds=None, project=None):
+    creds, project = resolve_credentials(creds, project)
+    compute = get_client('compute', 'v1', creds)
+
+    # ✅ Proxies, certificates, Cloud Armor policies and URL maps are fetched once per
+    # scan: certificates, policies and URL maps are usually shared by many proxies.
+    # Verdicts are not cached: they depend on all of these objects, and checking
+    # whether any of them changed takes the same GETs as re-evaluating the rule
+    https_proxies = FetchOnce(lambda name: compute.targetHttpsProxies().get(
+        project=project, targetHttpsProxy=name, fields='sslPolicy,securityPolicy,sslCertificates').execute())
+    http_proxies = FetchOnce(lambda name: compute.targetHttpProxies().get(
+        project=project, targetHttpProxy=name, fields='securityPolicy,urlMap').execute())
+    ssl_certificates = FetchOnce(lambda name: compute.sslCertificates().get(
+        project=project, sslCertificate=name, fields='expireTime').execute())
+    security_policies = FetchOnce(lambda name: compute.securityPolicies().get(
+        project=project, securityPolicy=name, fields='rules/priority').execute())
+    url_maps = FetchOnce(lambda name: compute.urlMaps().get(
+        project=project, urlMap=name, fields='pathMatchers/defaultRouteAction').execute())
+
+    def proxy_of(target):
+        if 'targetHttpsProxies' in target or target.endswith('httpsProxies'):
+            return https_proxies.get(target.split('/')[-1])
+        if 'targetHttpProxies' in target or target.endswith('httpProxies'):
+            return http_proxies.get(target.split('/')[-1])
+        return None
+
+    def audit_rule(rule):
+        lb_name = rule.get('name', '')
+        target = rule.get('target', '') or rule.get('backendService', '') or rule.get('targetPool', '')
+        scheme = rule.get('loadBalancingScheme', '')
+        ip = rule.get('IPAddress', '')
+
+        # Default values
+        ssl_policy = 'N/A'
+        cloud_armor_policy = 'N/A'
+        ssl_cert_status = 'N/A'
+        https_redirect = 'N/A'
+        armor_rule_strength = 'N/A'
+        internal_exposure = 'N/A'
+
+        # ---------------- HTTPS Proxy ----------------
+        if 'targetHttpsProxies' in target or target.endswith('httpsProxies'):
+            try:
+                proxy = proxy_of(target)
+
+                ssl_policy = proxy.get('sslPolicy', 'None')
+                cloud_armor_policy = proxy.get('securityPolicy', 'None')
+
+                # 1️⃣ SSL Certificate Check
+                cert_urls = proxy.get('sslCertificates', [])
+                if cert_urls:
+                    ssl_cert_status = []
+                    for cert_url in cert_urls:
+                        cert = ssl_certificates.get(cert_url.split('/')[-1])
+                        exp = cert.get('expireTime', 'Unknown')
+                        ssl_cert_status.append(f"Valid till: {exp}")
+                    ssl_cert_status = ', '.join(ssl_cert_status)
+                else:
+                    ssl_cert_status = 'No SSL Certificates attached'
+
+                # 3️⃣ Cloud Armor Rule Strength
+                if cloud_armor_policy not in ['None', 'N/A']:
+                    policy = security_policies.get(cloud_armor_policy.split('/')[-1])
+                    rules = policy.get('rules', [])
+                    if not rules:
+                        armor_rule_strength = 'Weak - No rules found'
+                    else:
+                        armor_rule_strength = f"Strong - {len(rules)} rules"
+                else:
+                    armor_rule_strength = 'No Cloud Armor policy'
+
+            except Exception as e:
+                ssl_cert_status = f"Error: {str(e)}"
+
+        # ---------------- HTTP Proxy ----------------
+        elif 'targetHttpProxies' in target or target.endswith('httpProxies'):
+            try:
+                proxy = proxy_of(target)
+                cloud_armor_policy = proxy.get('securityPolicy', 'None')
+
+                # 2️⃣ Check if HTTP is redirected to HTTPS
+                # Usually via URL maps that contain redirect actions
+                url_map_url = proxy.get('urlMap', '')
+                if url_map_url:
+                    url_map = url_maps.get(url_map_url.split('/')[-1])
+                    has_redirect = any('redirectAction' in path_matcher.get('defaultRouteAction', {})
+                                       for path_matcher in url_map.get('pathMatchers', []))
+                    https_redirect = 'Yes' if has_redirect else 'No'
+                else:
+                    https_redirect = 'No URL map found'
+
+                # Cloud Armor policy check (similar to HTTPS)
+                if cloud_armor_policy not in ['None', 'N/A']:
+                    policy = security_policies.get(cloud_armor_policy.split('/')[-1])
+                    rules = policy.get('rules', [])
+                    armor_rule_strength = f"Strong - {len(rules)} rules" if rules else "Weak - No rules"
+                else:
+                    armor_rule_strength = 'No Cloud Armor policy'
+
+            except Exception as e:
+                https_redirect = f"Error: {str(e)}"
+
+        # ---------------- External Exposure Check ----------------
+        if scheme == 'EXTERNAL':
+            # Check if backend is an internal resource (like internal backend service or instance group)
+            internal_exposure = 'Potential Risk' if any(x in target for x in ['backendServices', 'instanceGroups']) else 'OK'
+
+        return LoadBalancer(
+            name=lb_name,
+            scheme=scheme,
+            ip=ip,
+            ssl_policy=ssl_policy,
+            ssl_cert_status=ssl_cert_status,
+            https_redirect=https_redirect,
+            cloud_armor_policy=cloud_armor_policy,
+            armor_rule_strength=armor_rule_strength,
+            internal_exposure=internal_exposure
+        )
+
+    req = compute.forwardingRules().aggregatedList(
+        project=project, maxResults=PAGE_SIZE,
+        fields='items/*/forwardingRules(name,target,backendService,loadBalancingScheme,IPAddress),nextPageToken'
+    )
+    for res in iter_pages(req, compute.forwardingRules().aggregatedList_next):
+        forwarding_rules = []
         for region, scoped_list in res.get('items', {}).items():
-            for rule in scoped_list.get('forwardingRules', []):
-                lb_name = rule.get('name', '')
-                target = rule.get('target', '') or rule.get('backendService', '') or rule.get('targetPool', '')
-                scheme = rule.get('loadBalancingScheme', '')
-                ip = rule.get('IPAddress', '')
-
-                # Default values
-                ssl_policy = 'N/A'
-                cloud_armor_policy = 'N/A'
-                ssl_cert_status = 'N/A'
-                https_redirect = 'N/A'
-                armor_rule_strength = 'N/A'
-                internal_exposure = 'N/A'
-
-                # ---------------- HTTPS Proxy ----------------
-                if 'targetHttpsProxies' in target or target.endswith('httpsProxies'):
-                    try:
-                        target_name = target.split('/')[-1]
-                        proxy = compute.targetHttpsProxies().get(project=project, targetHttpsProxy=target_name).execute()
-
-                        ssl_policy = proxy.get('sslPolicy', 'None')
-                        cloud_armor_policy = proxy.get('securityPolicy', 'None')
-
-                        # 1️⃣ SSL Certificate Check
-                        cert_urls = proxy.get('sslCertificates', [])
-                        if cert_urls:
-                            ssl_cert_status = []
-                            for cert_url in cert_urls:
-                                cert_name = cert_url.split('/')[-1]
-                                cert = compute.sslCertificates().get(project=project, sslCertificate=cert_name).execute()
-                                exp = cert.get('expireTime', 'Unknown')
-                                ssl_cert_status.append(f"Valid till: {exp}")
-                            ssl_cert_status = ', '.join(ssl_cert_status)
-                        else:
-                            ssl_cert_status = 'No SSL Certificates attached'
-
-                        # 3️⃣ Cloud Armor Rule Strength
-                        if cloud_armor_policy not in ['None', 'N/A']:
-                            armor_name = cloud_armor_policy.split('/')[-1]
-                            policy = compute.securityPolicies().get(project=project, securityPolicy=armor_name).execute()
-                            rules = policy.get('rules', [])
-                            if not rules:
-                                armor_rule_strength = 'Weak - No rules found'
-                            else:
-                                armor_rule_strength = f"Strong - {len(rules)} rules"
-                        else:
-                            armor_rule_strength = 'No Cloud Armor policy'
-
-                    except Exception as e:
-                        ssl_cert_status = f"Error: {str(e)}"
-
-                # ---------------- HTTP Proxy ----------------
-                elif 'targetHttpProxies' in target or target.endswith('httpProxies'):
-                    try:
-                        target_name = target.split('/')[-1]
-                        proxy = compute.targetHttpProxies().get(project=project, targetHttpProxy=target_name).execute()
-                        cloud_armor_policy = proxy.get('securityPolicy', 'None')
-
-                        # 2️⃣ Check if HTTP is redirected to HTTPS
-                        # Usually via URL maps that contain redirect actions
-                        url_map_url = proxy.get('urlMap', '')
-                        if url_map_url:
-                            url_map_name = url_map_url.split('/')[-1]
-                            url_map = compute.urlMaps().get(project=project, urlMap=url_map_name).execute()
-                            has_redirect = any('redirectAction' in path_matcher.get('defaultRouteAction', {})
-                                               for path_matcher in url_map.get('pathMatchers', []))
-                            https_redirect = 'Yes' if has_redirect else 'No'
-                        else:
-                            https_redirect = 'No URL map found'
-
-                        # Cloud Armor policy check (similar to HTTPS)
-                        if cloud_armor_policy not in ['None', 'N/A']:
-                            armor_name = cloud_armor_policy.split('/')[-1]
-                            policy = compute.securityPolicies().get(project=project, securityPolicy=armor_name).execute()
-                            rules = policy.get('rules', [])
-                            armor_rule_strength = f"Strong - {len(rules)} rules" if rules else "Weak - No rules"
-                        else:
-                            armor_rule_strength = 'No Cloud Armor policy'
-
-                    except Exception as e:
-                        https_redirect = f"Error: {str(e)}"
-
-                # ---------------- External Exposure Check ----------------
-                if scheme == 'EXTERNAL':
-                    # Check if backend is an internal resource (like internal backend service or instance group)
-                    internal_exposure = 'Potential Risk' if any(x in target for x in ['backendServices', 'instanceGroups']) else 'OK'
-
-                lb_data.append({
-                    'name': lb_name,
-                    'scheme': scheme,
-                    'ip': ip,
-                    'ssl_policy': ssl_policy,
-                    'ssl_cert_status': ssl_cert_status,
-                    'https_redirect': https_redirect,
-                    'cloud_armor_policy': cloud_armor_policy,
-                    'armor_rule_strength': armor_rule_strength,
-                    'internal_exposure': internal_exposure
-                })
-
-        req = compute.forwardingRules().aggregatedList_next(req, res)
-    return lb_data
+            forwarding_rules.extend(scoped_list.get('forwardingRules', []))
+
+        # ✅ Per-rule proxy lookups for the page run concurrently instead of one rule at a time
+        yield from fetch_all(audit_rule, forwarding_rules)
+
+
+def check_load_balancers_audit(creds=None, project=None):
+    return list(iter_load_balancers_audit(creds, project))
 
 
 
 # ----------------- Firewall Rules Check -----------------
+FIREWALL_FIELDS = ('items(name,direction,allowed,denied,sourceRanges,sourceTags,targetTags,'
+                   'targetServiceAccounts,network,priority,disabled),nextPageToken')
 
-def check_firewall_rules():
-    creds, project = default()
-    compute = discovery.build('compute', 'v1', credentials=creds)
-    firewall_data = []
 
-    try:
-        request = compute.firewalls().list(project=project)
-        while request is not None:
-            response = request.execute()
+def list_ingress_rules(compute, project):
+    # Egress rules have no sourceRanges, so only ingress rules are fetched
+    request = compute.firewalls().list(
+        project=project, maxResults=PAGE_SIZE, filter='direction = "INGRESS"', fields=FIREWALL_FIELDS
+    )
+    for response in iter_pages(request, compute.firewalls().list_next):
+        yield response.get('items', [])
+
+
+def iter_firewall_rules(creds=None, project=None):
+    creds, project = resolve_credentials(creds, project)
+    compute = get_client('compute', 'v1', creds)
 
-            for rule in response.get('items', []):
+    try:
+        for rules in list_ingress_rules(compute, project):
+            # ✅ Each page is compiled once; public coverage is the union of all source ranges,
+            # so 0.0.0.0/1 + 128.0.0.0/1 or a large public CIDR is caught like 0.0.0.0/0
+            engine = FirewallEngine(rules)
+            for i, rule in enumerate(engine.rules):
                 name = rule.get('name')
-                direction = rule.get('direction')
-                allowed = rule.get('allowed', [])
-                source_ranges = rule.get('sourceRanges', [])
-                network = rule.get('network', '')
-                priority = rule.get('priority', '')
-                disabled = rule.get('disabled', False)
 
                 # Skip default / GCP-managed firewall rules
                 if name.startswith("default-") or "gke-" in name:
                     continue
 
                 # Check if open to the internet
-                if any(src == "0.0.0.0/0" for src in source_ranges):
-                    firewall_data.append([
+                if not engine.deny[i] and engine.is_open_to_internet(i):
+                    tags, service_accounts = engine.targets(i)
+                    yield FirewallRule(
                         name,
-                        direction,
-                        [a.get('IPProtocol') for a in allowed],
-                        source_ranges,
-                        network.split('/')[-1],  # extract network name
-                        priority,
-                        disabled
-                    ])
-
-            request = compute.firewalls().list_next(previous_request=request, previous_response=response)
+                        rule.get('direction'),
+                        [a.get('IPProtocol') for a in rule.get('allowed', [])],
+                        rule.get('sourceRanges', []),
+                        rule.get('network', '').split('/')[-1],  # extract network name
+                        rule.get('priority'),
+                        rule.get('disabled', False),
+                        engine.public_addresses(i),
+                        engine.exposed_ports(i, SENSITIVE_PORTS),
+                        tags + service_accounts or "All instances"
+                    )
     except Exception as e:
-        firewall_data.append([f"Error fetching firewall rules: {str(e)}"])
+        yield FirewallRule(f"Error fetching firewall rules: {str(e)}")
 
-    return firewall_data
 
-# --------------------------------- check_cloud_functions_and_run ---------------------------------------------------
-def check_cloud_functions_and_run():
-    from googleapiclient import discovery
-    from google.auth import default
+def check_firewall_rules(creds=None, project=None):
+    return list(iter_firewall_rules(creds, project))
+
+
+# ----------------- Firewall Exposure Check -----------------
+def check_firewall_exposure(creds=None, project=None):
+    """Sensitive ports of VMs with an external IP that the internet can reach after rule precedence."""
+    creds, project = resolve_credentials(creds, project)
+    compute = get_client('compute', 'v1', creds)
+
+    def rules():
+        return [rule for page in list_ingress_rules(compute, project) for rule in page]
+
+    def instances():
+        req = compute.instances().aggregatedList(
+            project=project, maxResults=PAGE_SIZE,
+            fields='items/*/instances(name,tags/items,serviceAccounts/email,'
+                   'networkInterfaces(network,accessConfigs/natIP)),nextPageToken'
+        )
+        found = []
+        for res in iter_pages(req, compute.instances().aggregatedList_next):
+            for zone, scoped_list in res.get('items', {}).items():
+                for instance in scoped_list.get('instances', []):
+                    found.append(dict(instance, zone=zone.split('/')[-1]))
+        return found
+
+    # ✅ Rules and instances are listed concurrently
+    rule_list, instance_list = fetch_all(lambda fetch: fetch(), [rules, instances])
+    engine = FirewallEngine(rule_list)
+
+    exposure_data = []
+    for instance, port, public, public6, allowing in engine.exposed_instances(instance_list, SENSITIVE_PORTS):
+        exposure_data.append(FirewallExposure(
+            instance['name'],
+            instance['zone'],
+            instance_external_ips(instance),
+            port,
+            public,
+            public6,
+            [engine.names[i] for i in allowing]
+        ))
+    return exposure_data
 
-    creds, project = default()
-    functions_service = discovery.build('cloudfunctions', 'v1', credentials=creds)
-    run_service = discovery.build('run', 'v1', credentials=creds)
 
-    audit_data = []
+# --------------------------------- check_cloud_functions_and_run ---------------------------------------------------
+def iter_cloud_functions_and_run(creds=None, project=None):
+    creds, project = resolve_credentials(creds, project)
+    functions_service = get_client('cloudfunctions', 'v1', creds)
+    run_service = get_client('run', 'v1', creds)
 
     # -------------------- Cloud Functions --------------------
     try:
         req = functions_service.projects().locations().functions().list(
-            parent=f"projects/{project}/locations/-"
+            parent=f"projects/{project}/locations/-", pageSize=PAGE_SIZE,
+            fields='functions(name,runtime,httpsTrigger(url,securityLevel),ingressSettings,'
+                   'serviceAccountEmail),nextPageToken'
         )
-        res = req.execute()
-
-        for fn in res.get('functions', []):
-            name = fn.get('name', '').split('/')[-1]
-            region = fn.get('name', '').split('/')[3] if len(fn.get('name', '').split('/')) > 3 else 'global'
-            runtime = fn.get('runtime', 'N/A')
-            trigger_type = 'HTTP' if 'httpsTrigger' in fn else 'Event'
-
-            # ✅ Use correct public URL for GCF HTTP invocation
-            url = fn.get('httpsTrigger', {}).get('url', 'N/A')
-            if url == 'N/A' or 'run.app' in url:
-                url = f"https://{region}-{project}.cloudfunctions.net/{name}"
-
-            ingress = fn.get('ingressSettings', 'N/A')
-            auth = fn.get('httpsTrigger', {}).get('securityLevel', 'N/A')
-            service_account = fn.get('serviceAccountEmail', 'N/A')
-
-            unauthenticated = 'Yes' if auth == 'SECURE_OPTIONAL' else 'No'
-            exposure_risk = (
-                'High' if ingress == 'ALLOW_ALL' or unauthenticated == 'Yes'
-                else 'Medium' if ingress == 'ALLOW_INTERNAL_AND_GCLB'
-                else 'Low'
-            )
+        for res in iter_pages(req, functions_service.projects().locations().functions().list_next):
+            for fn in res.get('functions', []):
+                name = fn.get('name', '').split('/')[-1]
+                region = fn.get('name', '').split('/')[3] if len(fn.get('name', '').split('/')) > 3 else 'global'
+                runtime = fn.get('runtime', 'N/A')
+                trigger_type = 'HTTP' if 'httpsTrigger' in fn else 'Event'
+
+                # ✅ Use correct public URL for GCF HTTP invocation
+                url = fn.get('httpsTrigger', {}).get('url', 'N/A')
+                if url == 'N/A' or 'run.app' in url:
+                    url = f"https://{region}-{project}.cloudfunctions.net/{name}"
+
+                ingress = fn.get('ingressSettings', 'N/A')
+                auth = fn.get('httpsTrigger', {}).get('securityLevel', 'N/A')
+                service_account = fn.get('serviceAccountEmail', 'N/A')
+
+                unauthenticated = 'Yes' if auth == 'SECURE_OPTIONAL' else 'No'
+                exposure_risk = (
+                    'High' if ingress == 'ALLOW_ALL' or unauthenticated == 'Yes'
+                    else 'Medium' if ingress == 'ALLOW_INTERNAL_AND_GCLB'
+                    else 'Low'
+                )
 
-            recommendation = "Restrict unauthenticated invocations and apply ingress controls for internal-only access."
-
-            audit_data.append([
-                "Cloud Function",
-                name,
-                region,
-                runtime,
-                trigger_type,
-                url,
-                ingress,
-                auth,
-                service_account,
-                unauthenticated,
-                exposure_risk,
-                recommendation
-            ])
+                recommendation = "Restrict unauthenticated invocations and apply ingress controls for internal-only access."
+
+                yield ServerlessService(
+                    "Cloud Function",
+                    name,
+                    region,
+                    runtime,
+                    trigger_type,
+                    url,
+                    ingress,
+                    auth,
+                    service_account,
+                    unauthenticated,
+                    exposure_risk,
+                    recommendation
+                )
     except Exception as e:
-        audit_data.append([
+        yield ServerlessService(
             "Cloud Function",
             f"Error fetching: {str(e)}",
-            "", "", "", "", "", "", "", "", "",
-            "Restrict unauthenticated invocations and apply ingress controls for internal-only access."
-        ])
+            recommendation="Restrict unauthenticated invocations and apply ingress controls for internal-only access."
+        )
 
     # -------------------- Cloud Run --------------------
     try:
-        req = run_service.projects().locations().services().list(
-            parent=f"projects/{project}/locations/-"
-        )
-        res = req.execute()
-
-        for service in res.get('items', []):
-            metadata = service.get('metadata', {})
-            spec = service.get('spec', {})
-            template_spec = spec.get('template', {}).get('spec', {})
-
-            name = metadata.get('name', 'N/A')
-            region = metadata.get('labels', {}).get('cloud.googleapis.com/location', 'global')
-            url = service.get('status', {}).get('url', 'N/A')
-            annotations = metadata.get('annotations', {})
-            ingress = annotations.get('run.googleapis.com/ingress', 'N/A')
-            service_account = template_spec.get('serviceAccountName', 'N/A')
+        def list_services(**page):
+            return run_service.projects().locations().services().list(
+                parent=f"projects/{project}/locations/-", limit=PAGE_SIZE,
+                fields='items(metadata(name,labels,annotations,resourceVersion),'
+                       'spec/template/spec/serviceAccountName,status/url),metadata/continue',
+                **page
+            )
 
-            # IAM Policy check for auth
-            try:
+        # Cloud Run v1 pages with Kubernetes-style metadata.continue instead of nextPageToken
+        next_services = token_pager(list_services, token_field='metadata.continue', param='continue')
+        for res in iter_pages(list_services(), next_services):
+            for service in res.get('items', []):
+                metadata = service.get('metadata', {})
+                spec = service.get('spec', {})
+                template_spec = spec.get('template', {}).get('spec', {})
+
+                name = metadata.get('name', 'N/A')
+                region = metadata.get('labels', {}).get('cloud.googleapis.com/location', 'global')
+                url = service.get('status', {}).get('url', 'N/A')
+                annotations = metadata.get('annotations', {})
+                ingress = annotations.get('run.googleapis.com/ingress', 'N/A')
+                service_account = template_spec.get('serviceAccountName', 'N/A')
+
+                # IAM Policy check for auth
+                def service_auth(resource_name):
+                    try:
+                        policy = run_service.projects().locations().services().getIamPolicy(
+                            resource=resource_name, fields='bindings(members)'
+                        ).execute()
+
+                        members = [m for b in policy.get('bindings', []) for m in b.get('members', [])]
+                        unauthenticated = any('allUsers' in m for m in members)
+                        authenticated = any('allAuthenticatedUsers' in m for m in members)
+
+                        auth_level = (
+                            "Unauthenticated" if unauthenticated else
+                            "Authenticated (All Authenticated Users)" if authenticated else
+                            "Authenticated (Restricted)"
+                        )
+                    except Exception:
+                        unauthenticated = False
+                        auth_level = "Unknown"
+                    return [unauthenticated, auth_level]
+
+                # ✅ Not cached: setIamPolicy leaves the service's resourceVersion unchanged
                 resource_name = f"projects/{project}/locations/{region}/services/{name}"
-                policy = run_service.projects().locations().services().getIamPolicy(
-                    resource=resource_name
-                ).execute()
-
-                members = [m for b in policy.get('bindings', []) for m in b.get('members', [])]
-                unauthenticated = any('allUsers' in m for m in members)
-                authenticated = any('allAuthenticatedUsers' in m for m in members)
-
-                auth_level = (
-                    "Unauthenticated" if unauthenticated else
-                    "Authenticated (All Authenticated Users)" if authenticated else
-                    "Authenticated (Restricted)"
+                unauthenticated, auth_level = service_auth(resource_name)
+
+                exposure_risk = (
+                    'High' if ingress == 'all' or unauthenticated else
+                    'Medium' if ingress == 'internal-and-cloud-load-balancing' else
+                    'Low'
+                )
+                yield ServerlessService(
+                    "Cloud Run",
+                    name,
+                    region,
+                    "N/A",
+                    "HTTP",
+                    url,
+                    ingress,
+                    auth_level,
+                    service_account,
+                    "Yes" if unauthenticated else "No",
+                    exposure_risk
                 )
-            except Exception:
-                unauthenticated = False
-                auth_level = "Unknown"
-
-            exposure_risk = (
-                'High' if ingress == 'all' or unauthenticated else
-                'Medium' if ingress == 'internal-and-cloud-load-balancing' else
-                'Low'
-            )
-            audit_data.append([
-                "Cloud Run",
-                name,
-                region,
-                "N/A",
-                "HTTP",
-                url,
-                ingress,
-                auth_level,
-                service_account,
-                "Yes" if unauthenticated else "No",
-                exposure_risk
-            ])
     except Exception as e:
-        audit_data.append([
+        yield ServerlessService(
             "Cloud Run",
             f"Error fetching: {str(e)}",
-            "", "", "", "", "", "", "", "", "",
-            "Restrict unauthenticated invocations and use ingress controls for internal-only access."
-        ])
+            recommendation="Restrict unauthenticated invocations and use ingress controls for internal-only access."
+        )
+
 
-    return audit_data
+def check_cloud_functions_and_run(creds=None, project=None):
+    return list(iter_cloud_functions_and_run(creds, project))
@@ -0,0 +1,274 @@
+"""
+Runs a selection of the checks in audit_checks.py concurrently for one set of
+credentials.
+
+Each check runs on a worker thread with its own timeout; a check that fails or
+times out is reported in its own result entry and never affects the others, so
+a full scan takes about as long as the slowest check.
+
+Checks can also run against another data source instead of the live APIs: an
+inventory snapshot (see inventory.py) or a Cloud Asset export (asset_export.py).
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import api_exec
+import audit_cache
+import audit_checks
+import gcp_clients
+import inventory
+import telemetry
+
+# Check name -> check function
+CHECKS = {
+    "compute_public_ips": audit_checks.check_compute_public_ips,
+    "sql_public_ips": audit_checks.check_sql_public_ips,
+    "gke_clusters": audit_checks.check_gke_clusters,
+    "owner_service_accounts": audit_checks.check_owner_service_accounts,
+    "public_buckets": audit_checks.check_public_buckets,
+    "load_balancers": audit_checks.check_load_balancers_audit,
+    "firewall_rules": audit_checks.check_firewall_rules,
+    "firewall_exposure": audit_checks.check_firewall_exposure,
+    "cloud_functions_and_run": audit_checks.check_cloud_functions_and_run,
+}
+
+# Check name -> Google APIs it calls
+CHECK_APIS = {
+    "compute_public_ips": ["compute"],
+    "sql_public_ips": ["sqladmin"],
+    "gke_clusters": ["container"],
+    "owner_service_accounts": ["cloudresourcemanager"],
+    "public_buckets": ["storage"],
+    "load_balancers": ["compute"],
+    "firewall_rules": ["compute"],
+    "firewall_exposure": ["compute"],
+    "cloud_functions_and_run": ["cloudfunctions", "run"],
+}
+
+# API -> discovery version the checks build their clients with
+API_VERSIONS = {
+    "compute": "v1",
+    "sqladmin": "v1beta4",
+    "container": "v1",
+    "cloudresourcemanager": "v1",
+    "storage": "v1",
+    "cloudfunctions": "v1",
+    "run": "v1",
+}
+
+# Check name -> generator yielding findings page by page, for streaming responses
+STREAMS = {
+    "compute_public_ips": audit_checks.iter_compute_public_ips,
+    "sql_public_ips": audit_checks.iter_sql_public_ips,
+    "public_buckets": audit_checks.iter_public_buckets,
+    "load_balancers": audit_checks.iter_load_balancers_audit,
+    "firewall_rules": audit_checks.iter_firewall_rules,
+    "cloud_functions_and_run": audit_checks.iter_cloud_functions_and_run,
+}
+
+CHECK_TIMEOUT = float(os.getenv("AUDIT_CHECK_TIMEOUT", "120"))  # seconds
+
+# Checks that issue sub-requests per resource get more time by default
+CHECK_TIMEOUTS = {
+    "public_buckets": 2 * CHECK_TIMEOUT,
+    "load_balancers": 2 * CHECK_TIMEOUT,
+}
+
+# Findings buffered between the check threads and a slow streaming client
+STREAM_BUFFER = int(os.getenv("AUDIT_STREAM_BUFFER", "1000"))
+STREAM_POLL = 1.0  # seconds between looks at checks still waiting for a worker thread
+
+AUDIT_CHECK_WORKERS = int(os.getenv("AUDIT_CHECK_WORKERS", "16"))
+check_executor = ThreadPoolExecutor(max_workers=AUDIT_CHECK_WORKERS, thread_name_prefix="check")
+
+
+def select_checks(names=None):
+    """Validate a list of check names; ``None`` or empty selects every check."""
+    if not names:
+        return list(CHECKS)
+    unknown = [n for n in names if n not in CHECKS]
+    if unknown:
+        raise ValueError(f"Unknown checks: {', '.join(unknown)}. Available: {', '.join(CHECKS)}")
+    return list(dict.fromkeys(names))
+
+
+def warm_up(clients=False):
+    """
+    Import the API client stack ahead of the first audit and, with ``clients``,
+    parse the discovery documents of every check API, which the clients of
+    every uploaded service account are then built from.
+    """
+    apis = dict.fromkeys(api for apis in CHECK_APIS.values() for api in apis) if clients else ()
+    gcp_clients.preload((api, API_VERSIONS[api]) for api in apis)
+
+
+def source_scope(source=None):
+    """
+    Serve the check's API reads from ``source``: live if ``None``, an inventory
+    snapshot id, or any data source ``inventory.ReplayClient`` accepts.
+    """
+    if source is None:
+        return contextlib.nullcontext()
+    if isinstance(source, int):
+        return inventory.snapshot_scope(source)
+    return inventory.replay_scope(source)
+
+
+def run_and_record(name, creds, project, source=None, timeout=None):
+    """Run a check and keep its live findings for the "diff since last scan" view."""
+    timeout = timeout or CHECK_TIMEOUTS.get(name, CHECK_TIMEOUT)
+    with source_scope(source), telemetry.check_scope(name) as trace, api_exec.deadline_scope(timeout):
+        findings = CHECKS[name](creds, project)
+    if source is None:
+        audit_cache.record_scan(project, name, findings)
+    return findings, trace
+
+
+async def run_check(name, creds, project, timeout=None, executor=None, timings=False, source=None):
+    """
+    Run one check on the worker pool; never raises. ``timings`` adds the per-API-method
+    breakdown; ``source`` runs it against a snapshot or export instead of the live APIs.
+    The timeout counts from when a worker thread picks the check up, not from when it was queued.
+    """
+    timeout = timeout or CHECK_TIMEOUTS.get(name, CHECK_TIMEOUT)
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    started = asyncio.Event()
+
+    def run():
+        loop.call_soon_threadsafe(started.set)
+        return run_and_record(name, creds, project, source, timeout)
+
+    future = loop.run_in_executor(executor or check_executor, run)
+    waiting = asyncio.ensure_future(started.wait())
+    try:
+        await asyncio.wait({future, waiting}, return_when=asyncio.FIRST_COMPLETED)
+        findings, trace = await asyncio.wait_for(future, timeout)
+        result = {"status": "ok", "findings": findings}
+        if timings:
+            result["timings"] = trace.summary()
+    except (asyncio.TimeoutError, api_exec.DeadlineExceeded):
+        # The worker thread cannot be interrupted: its deadline makes its next API call fail, freeing it
+        result = {"status": "timeout", "error": f"Check did not finish within {timeout:g}s"}
+    except Exception as e:
+        result = {"status": "error", "error": str(e)}
+    finally:
+        waiting.cancel()
+        future.cancel()  # still queued if the caller was cancelled: never start it
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+async def run_audit(creds, project, checks=None, timeout=None, timings=False, source=None):
+    """Run the selected checks concurrently and merge their results."""
+    names = select_checks(checks)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(run_check(name, creds, project, timeout, timings=timings, source=source)
+                                     for name in names))
+    return {
+        "project_id": project,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        "checks": dict(zip(names, results)),
+    }
+
+
+def iter_check(name, creds, project):
+    """Findings of one check as an iterator; checks without a generator are yielded all at once."""
+    if name in STREAMS:
+        return STREAMS[name](creds, project)
+    return iter(CHECKS[name](creds, project))
+
+
+async def stream_audit(creds, project, checks=None, timeout=None, timings=False, source=None):
+    """
+    Run the selected checks concurrently and yield their output as it arrives:
+    ``{"check", "finding"}`` for every finding, then one ``{"check", "status", "elapsed_ms"}``
+    per check (plus ``"timings"`` if asked). At most STREAM_BUFFER findings wait for the client at a time;
+    live runs also write each check's findings to the scan history as they go, like ``run_audit``. Every check gets
+    its own timeout, counted from when a worker thread starts it.
+    """
+    names = select_checks(checks)
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=STREAM_BUFFER)
+    stop = threading.Event()
+
+    def emit(line):
+        # Blocks the check thread while the buffer is full; gives up once the client is gone
+        while not stop.is_set():
+            future = asyncio.run_coroutine_threadsafe(queue.put(line), loop)
+            try:
+                future.result(timeout=1)
+                return
+            except concurrent.futures.TimeoutError:
+                future.cancel()
+
+    def produce(name, limit):
+        start = time.perf_counter()
+        deadlines[name] = time.monotonic() + limit
+        timed_out = {"check": name, "status": "timeout", "error": f"Check did not finish within {limit:g}s"}
+        status = {"check": name, "status": "ok"}
+        recorded = trace = None
+        try:
+            # ✅ Findings go to the scan history as they arrive, not into a list kept until the end
+            if source is None:
+                recorded = audit_cache.scan_writer(project, name)
+            with source_scope(source), telemetry.check_scope(name) as trace, api_exec.deadline_scope(limit):
+                findings = iter_check(name, creds, project)
+                for finding in findings:
+                    if stop.is_set():
+                        return
+                    if time.perf_counter() - start > limit:
+                        status = timed_out
+                        break
+                    if recorded is not None:
+                        recorded.add(finding)
+                    emit({"check": name, "finding": finding})
+            # ✅ Same "diff since last scan" record as run_audit, for complete live runs only
+            if status is not timed_out and recorded is not None:
+                recorded.finish()
+                recorded = None
+        except api_exec.DeadlineExceeded:
+            status = timed_out
+        except Exception as e:
+            status = {"check": name, "status": "error", "error": str(e)}
+        finally:
+            if recorded is not None:
+                recorded.abandon()  # partial scans would show up as removed findings in the diff
+        status["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        if timings and trace is not None:
+            status["timings"] = trace.summary()
+        emit(status)
+
+    limits = {name: timeout or CHECK_TIMEOUTS.get(name, CHECK_TIMEOUT) for name in names}
+    deadlines = {}  # check -> time.monotonic() it must finish by, set when a worker thread starts it
+    for name in names:
+        loop.run_in_executor(check_executor, produce, name, limits[name])
+
+    pending = set(names)
+    try:
+        while pending:
+            # A check stuck inside an API call never yields again: report it once its own time is up
+            now = time.monotonic()
+            for name in sorted(n for n in pending if deadlines.get(n, now) < now):
+                pending.discard(name)
+                yield {"check": name, "status": "timeout", "error": f"Check did not finish within {limits[name]:g}s"}
+            if not pending:
+                return
+            # Checks still queued for a worker thread have no deadline yet: look again shortly
+            wake = min(deadlines.get(n, now + STREAM_POLL) for n in pending)
+            try:
+                line = await asyncio.wait_for(queue.get(), max(0, wake - now))
+            except asyncio.TimeoutError:
+                continue
+            if line["check"] not in pending:
+                continue  # output of a check already reported as timed out
+            if "status" in line:
+                pending.discard(line["check"])
+            yield line
+    finally:
+        stop.set()
@@ -0,0 +1,185 @@
+"""
+Login password verification and JWT checks.
+
+bcrypt is deliberately slow, so ``verify_password`` runs it on a dedicated
+thread pool (bcrypt releases the GIL) instead of the request thread. At most
+``LOGIN_MAX_PENDING`` verifications may be queued or running; beyond that
+``LoginBusy`` is raised and the endpoint answers 429.
+
+Successful verifications are remembered for ``LOGIN_CACHE_TTL`` seconds, keyed
+by an HMAC of the password under a per-process random key, so repeated logins
+from the same dashboard don't pay for bcrypt again.
+
+Password hashes are precomputed: they are loaded on first use from the JSON
+file in ``USER_DB_PATH`` (``{"username": "$2b$..."}``), else from
+``ADMIN_PASSWORD_HASH``, else the demo ``admin`` / ``admin123`` hash.
+
+``require_token`` is the FastAPI dependency every audit endpoint uses. Decoded
+claims are cached per token (keyed by its SHA-256 digest) until the token's
+``exp``, so a dashboard making many calls with one token pays for the HMAC
+check once.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+import jwt
+from fastapi import Header, HTTPException
+
+# bcrypt hash of the demo password "admin123"
+DEMO_ADMIN_HASH = "$2b$12$Zlnd3rjLEjj7q3Ync2jnmeWvEqr3IbWkFWveIAmjXkTYP2E5wHVQq"
+
+SECRET_KEY = os.getenv("SECRET_KEY", "supersecretjwtkey")  # Use Secret Manager in prod
+ALGORITHM = "HS256"
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+
+LOGIN_WORKERS = int(os.getenv("LOGIN_WORKERS", str(os.cpu_count() or 1)))
+LOGIN_MAX_PENDING = int(os.getenv("LOGIN_MAX_PENDING", str(4 * LOGIN_WORKERS)))
+LOGIN_CACHE_TTL = int(os.getenv("LOGIN_CACHE_TTL", "300"))  # seconds
+LOGIN_CACHE_SIZE = int(os.getenv("LOGIN_CACHE_SIZE", "1024"))
+
+login_executor = ThreadPoolExecutor(max_workers=LOGIN_WORKERS, thread_name_prefix="bcrypt")
+
+
+class LoginBusy(Exception):
+    """Too many password verifications already queued."""
+
+
+# ----------------- User Store -----------------
+_user_db = None
+_user_db_lock = threading.Lock()
+
+
+def load_user_db():
+    path = os.getenv("USER_DB_PATH")
+    if path:
+        with open(path) as f:
+            return json.load(f)
+    return {"admin": os.getenv("ADMIN_PASSWORD_HASH") or DEMO_ADMIN_HASH}
+
+
+def user_db():
+    global _user_db
+    with _user_db_lock:
+        if _user_db is None:
+            _user_db = load_user_db()
+        return _user_db
+
+
+# ----------------- Verified-Credential Cache -----------------
+_cache_key = secrets.token_bytes(32)
+_verified = OrderedDict()
+_verified_lock = threading.Lock()
+
+
+def _digest(username, password, stored_hash):
+    # Never keep the password itself; a changed hash invalidates old entries
+    message = b"\0".join([username.encode("utf-8"), password, stored_hash])
+    return hmac.new(_cache_key, message, hashlib.sha256).digest()
+
+
+def _recently_verified(digest):
+    with _verified_lock:
+        expires = _verified.get(digest)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            del _verified[digest]
+            return False
+        _verified.move_to_end(digest)
+        return True
+
+
+def _remember(digest):
+    with _verified_lock:
+        _verified[digest] = time.monotonic() + LOGIN_CACHE_TTL
+        _verified.move_to_end(digest)
+        while len(_verified) > LOGIN_CACHE_SIZE:
+            _verified.popitem(last=False)
+
+
+# ----------------- Verification -----------------
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+async def verify_password(username: str, password: str):
+    """True if ``password`` matches the stored hash for ``username``."""
+    stored = user_db().get(username)
+    if stored is None:
+        return False
+
+    stored_hash = stored.encode("utf-8")
+    password = password.encode("utf-8")
+    digest = _digest(username, password, stored_hash)
+    if LOGIN_CACHE_TTL > 0 and _recently_verified(digest):
+        return True
+
+    global _pending
+    with _pending_lock:
+        if _pending >= LOGIN_MAX_PENDING:
+            raise LoginBusy()
+        _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        ok = await loop.run_in_executor(login_executor, bcrypt.checkpw, password, stored_hash)
+    finally:
+        with _pending_lock:
+            _pending -= 1
+
+    if ok and LOGIN_CACHE_TTL > 0:
+        _remember(digest)
+    return ok
+
+
+# ----------------- JWT Verification -----------------
+_claims = OrderedDict()
+_claims_lock = threading.Lock()
+
+
+def verify_token(token: str):
+    """Decoded claims of a valid token; raises 401 otherwise."""
+    digest = hashlib.sha256(token.encode("utf-8")).digest()
+    now = time.time()
+
+    with _claims_lock:
+        entry = _claims.get(digest)
+        if entry is not None:
+            claims, expires = entry
+            if now < expires:
+                _claims.move_to_end(digest)
+                return claims
+            del _claims[digest]
+
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token expired")
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    expires = claims.get("exp")
+    if TOKEN_CACHE_SIZE > 0 and isinstance(expires, (int, float)):
+        with _claims_lock:
+            _claims[digest] = (claims, expires)
+            while len(_claims) > TOKEN_CACHE_SIZE:
+                _claims.popitem(last=False)
+    return claims
+
+
+async def require_token(authorization: str = Header(None)):
+    """
+    FastAPI dependency: claims of the request's ``Authorization: Bearer`` token.
+    Declared async so FastAPI runs it inline instead of hopping to a worker thread.
+    """
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
+    return verify_token(authorization[7:])
@@ -0,0 +1,91 @@
+"""
+Live per-API scanning against a Cloud Asset export on a synthetic organization.
+
+Every project is scanned three ways and the findings must match:
+
+- live: every check calls its APIs per project (and per bucket / service for IAM);
+- assets: the org's assets are read in bulk pages from the Cloud Asset API;
+- export: an exportAssets NDJSON file is stream-parsed, with no API calls at all.
+
+    python benchmarks/bench_asset_export.py --projects 50 --vms 200 --latency 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("AUDIT_CACHE", "off")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import fake_gcp
+import org_scan
+from asset_export import AssetExport
+
+CREDS = fake_gcp.FakeCredentials({})
+
+
+def calls(services):
+    return sum(sum(service.calls.values()) for service in services.values())
+
+
+def findings(report):
+    return {project: {name: result.get("findings") for name, result in data["checks"].items()}
+            for project, data in report["projects"].items()}
+
+
+def timed(label, services, scan):
+    before = calls(services)
+    start = time.perf_counter()
+    report = asyncio.run(scan())
+    elapsed = time.perf_counter() - start
+    failed = report["summary"]["checks_failed"]
+    print(f"{label:7} {elapsed * 1000:10.1f}ms  {calls(services) - before:7} API calls  "
+          f"{report['summary']['findings']:7} findings  {failed} failed checks")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--projects", type=int, default=50)
+    parser.add_argument("--vms", type=int, default=200)
+    parser.add_argument("--items", type=int, default=40, help="buckets, rules, firewalls, functions, ... per project")
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    n = args.items
+    shape = dict(vms=args.vms, rules=n, buckets=n, firewalls=n, sql=n, functions=n, services=n)
+    projects = [f"project-{i}" for i in range(args.projects)]
+
+    services = fake_gcp.fake_project(latency=args.latency, page_size=500, **shape)
+    assets = list(fake_gcp.fake_assets(projects, **shape))
+    services["cloudasset"] = fake_gcp.fake_cloudasset(assets, latency=args.latency)
+    fake_gcp.install(services)
+    org_scan.ORG_SCAN_API_RATE = 1e9  # measure the calls, not the throttle
+
+    path = os.path.join(tempfile.mkdtemp(), "assets.ndjson")
+    with open(path, "w") as fp:
+        for asset in assets:
+            fp.write(json.dumps(asset) + "\n")
+    print(f"org: {args.projects} projects, {len(assets)} assets, export {os.path.getsize(path) / 1e6:.1f} MB\n")
+
+    live = timed("live", services, lambda: org_scan.scan_projects(CREDS, projects, concurrency=args.concurrency))
+    bulk = timed("assets", services, lambda: org_scan.scan_assets(CREDS, "organizations/1"))
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    export = AssetExport.load(path)
+    parsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"parse   {parsed * 1000:10.1f}ms  peak {peak / 1e6:.1f} MB (export {os.path.getsize(path) / 1e6:.1f} MB)")
+    offline = timed("export", services, lambda: org_scan.scan_export(export))
+
+    expected = findings(live)
+    ok = findings(bulk) == expected and findings(offline) == expected
+    print(f"\nfindings {'identical' if ok else 'DIFFER'} across backends")
+    sys.exit(0 if ok else 1)
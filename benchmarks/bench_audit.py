@@ -0,0 +1,46 @@
+"""
+Full-scan wall time: every check run one after another vs the concurrent
+orchestrator in audit_runner.py.
+
+    python benchmarks/bench_audit.py --latency 0.05
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import fake_gcp
+import audit_runner
+
+CREDS = fake_gcp.FakeCredentials({})
+
+
+def serial():
+    timings = {}
+    for name, check in audit_runner.CHECKS.items():
+        start = time.perf_counter()
+        check(CREDS, CREDS.project_id)
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per API call")
+    args = parser.parse_args()
+    fake_gcp.install(fake_gcp.fake_project(latency=args.latency))
+
+    start = time.perf_counter()
+    timings = serial()
+    serial_wall = time.perf_counter() - start
+
+    start = time.perf_counter()
+    report = asyncio.run(audit_runner.run_audit(CREDS, CREDS.project_id))
+    concurrent_wall = time.perf_counter() - start
+
+    for name, result in report["checks"].items():
+        print(f"{name:26} serial={timings[name] * 1000:8.1f}ms  concurrent={result['elapsed_ms']:8.1f}ms  {result['status']}")
+    print(f"{'total':26} serial={serial_wall * 1000:8.1f}ms  concurrent={concurrent_wall * 1000:8.1f}ms")
@@ -0,0 +1,46 @@
+"""
+Repeated-scan cost with the incremental audit cache: API calls and wall time
+for a cold scan and a warm re-scan of the same (unchanged) fake project.
+
+    python benchmarks/bench_audit_cache.py --rules 300 --buckets 1000 --latency 0.01
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import fake_gcp
+import audit_cache
+import audit_runner
+
+CREDS = fake_gcp.FakeCredentials({})
+CHECKS = ["public_buckets", "load_balancers", "cloud_functions_and_run"]
+
+
+def total_calls(services):
+    return sum(n for service in services.values() for n in service.calls.values())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rules", type=int, default=300)
+    parser.add_argument("--buckets", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds per API call")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        audit_cache._cache = audit_cache.AuditCache(os.path.join(tmp, "cache.sqlite3"))
+        services = fake_gcp.fake_project(latency=args.latency, rules=args.rules, buckets=args.buckets,
+                                         page_size=max(args.rules, args.buckets))
+        fake_gcp.install(services)
+
+        for label in ("cold", "warm"):
+            before = total_calls(services)
+            start = time.perf_counter()
+            asyncio.run(audit_runner.run_audit(CREDS, CREDS.project_id, CHECKS))
+            elapsed = time.perf_counter() - start
+            print(f"{label:5} scan  wall={elapsed * 1000:8.1f}ms  api_calls={total_calls(services) - before}")
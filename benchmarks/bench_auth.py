@@ -0,0 +1,69 @@
+"""
+Per-request auth overhead: uncached ``jwt.decode`` vs the cached
+``auth.verify_token``, then requests/s through an authenticated endpoint with
+and without the claims cache.
+
+    python benchmarks/bench_auth.py --calls 100000 --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import warnings
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import httpx
+import jwt
+
+import auth
+import main
+
+warnings.filterwarnings("ignore", module="jwt")
+
+
+def make_token():
+    expire = datetime.utcnow() + timedelta(minutes=60)
+    return jwt.encode({"sub": "admin", "exp": expire}, auth.SECRET_KEY, algorithm=auth.ALGORITHM)
+
+
+def per_call(label, fn, token, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn(token)
+    elapsed = time.perf_counter() - start
+    print(f"{label:22} {elapsed / calls * 1e6:8.2f}us/call")
+
+
+async def per_request(label, token, requests, concurrency):
+    transport = httpx.ASGITransport(app=main.app)
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker(n):
+            for _ in range(n):
+                (await client.get("/audit/checks", headers=headers)).raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(requests // concurrency) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    print(f"{label:22} {requests / elapsed:8.0f} req/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    token = make_token()
+
+    per_call("jwt.decode", lambda t: jwt.decode(t, auth.SECRET_KEY, algorithms=[auth.ALGORITHM]), token, args.calls)
+    per_call("auth.verify_token", auth.verify_token, token, args.calls)
+
+    asyncio.run(per_request("endpoint, warm-up", token, args.requests, args.concurrency))
+    auth.TOKEN_CACHE_SIZE = 0
+    asyncio.run(per_request("endpoint, no cache", token, args.requests, args.concurrency))
+    auth.TOKEN_CACHE_SIZE = 4096
+    asyncio.run(per_request("endpoint, cached", token, args.requests, args.concurrency))
@@ -0,0 +1,63 @@
+"""
+Per-audit client setup cost: plain ``discovery.build`` vs the cached factory.
+
+    python benchmarks/bench_client_factory.py --audits 20
+
+One "audit" builds every client the checks in audit_checks.py use; "new acct"
+audits use a fresh credentials object each time, so only the parsed discovery
+documents are reused. No network
+access is needed; both paths read the bundled discovery documents.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from google.auth.credentials import AnonymousCredentials
+from googleapiclient import discovery
+
+import gcp_clients
+
+APIS = [
+    ("compute", "v1"),
+    ("sqladmin", "v1beta4"),
+    ("container", "v1"),
+    ("cloudresourcemanager", "v1"),
+    ("storage", "v1"),
+    ("cloudfunctions", "v1"),
+    ("run", "v1"),
+]
+
+
+def uncached(creds):
+    for api, version in APIS:
+        discovery.build(api, version, credentials=creds, static_discovery=True, cache_discovery=False)
+
+
+def cached(creds):
+    for api, version in APIS:
+        gcp_clients.get_client(api, version, creds)
+
+
+def bench(name, setup, audits, new_accounts=False):
+    creds = AnonymousCredentials()
+    samples = []
+    for _ in range(audits):
+        if new_accounts:
+            creds = AnonymousCredentials()  # a service account no client was built for yet
+        start = time.perf_counter()
+        setup(creds)
+        samples.append(time.perf_counter() - start)
+    print(f"{name:10} first={samples[0] * 1000:8.2f}ms  "
+          f"mean={sum(samples) / len(samples) * 1000:8.2f}ms  total={sum(samples):.3f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--audits", type=int, default=20)
+    args = parser.parse_args()
+    bench("uncached", uncached, args.audits)
+    bench("cached", cached, args.audits)
+    bench("new acct", cached, args.audits, new_accounts=True)
@@ -0,0 +1,74 @@
+"""
+Audit latency saved by reusing credentials on repeat uploads of the same key.
+
+The OAuth token exchange is simulated (``--token-latency`` seconds per
+refresh); each "audit" builds credentials from the uploaded key and makes
+sure they hold a valid token, as the first API call would.
+
+    python benchmarks/bench_credentials.py --uploads 20 --token-latency 0.15
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.oauth2 import service_account
+
+import credentials_cache
+
+
+def key_file():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                            serialization.NoEncryption()).decode()
+    return {
+        "type": "service_account",
+        "project_id": "bench-project",
+        "private_key_id": "bench-key",
+        "private_key": pem,
+        "client_email": "bench@bench-project.iam.gserviceaccount.com",
+        "token_uri": "https://oauth2.googleapis.com/token",
+    }
+
+
+def fake_refresh(latency):
+    def refresh(self, request):
+        time.sleep(latency)
+        self.token = "token"
+        self.expiry = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    return refresh
+
+
+def audit_setup(build, info):
+    creds = build(info)
+    if not creds.valid:
+        creds.refresh(None)
+    return creds
+
+
+def bench(label, build, info, uploads):
+    samples = []
+    for _ in range(uploads):
+        start = time.perf_counter()
+        audit_setup(build, info)
+        samples.append(time.perf_counter() - start)
+    print(f"{label:9} first={samples[0] * 1000:7.1f}ms  repeat mean={sum(samples[1:]) / max(1, len(samples) - 1) * 1000:7.2f}ms"
+          f"  total={sum(samples):.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=20)
+    parser.add_argument("--token-latency", type=float, default=0.15, help="seconds per token exchange")
+    args = parser.parse_args()
+
+    service_account.Credentials.refresh = fake_refresh(args.token_latency)
+    info = key_file()
+    bench("uncached", lambda i: service_account.Credentials.from_service_account_info(
+        i, scopes=[credentials_cache.CLOUD_PLATFORM_SCOPE]), info, args.uploads)
+    bench("cached", credentials_cache.get_credentials, info, args.uploads)
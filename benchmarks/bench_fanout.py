@@ -0,0 +1,45 @@
+"""
+Load balancer and bucket audits against fake Compute/Storage APIs, with the
+per-resource fan-out run serially (--workers 1) and concurrently.
+
+    python benchmarks/bench_fanout.py --rules 300 --buckets 1000 --latency 0.02
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import fake_gcp
+import audit_checks
+import fanout
+
+CREDS = fake_gcp.FakeCredentials({})
+
+
+def run(args, workers):
+    services = fake_gcp.fake_project(latency=args.latency, rules=args.rules, buckets=args.buckets)
+    fake_gcp.install(services)
+    fanout.FANOUT_WORKERS = workers
+
+    for name, check in (("load_balancers", audit_checks.check_load_balancers_audit),
+                        ("public_buckets", audit_checks.check_public_buckets)):
+        start = time.perf_counter()
+        findings = check(CREDS, CREDS.project_id)
+        elapsed = time.perf_counter() - start
+        print(f"workers={workers:3}  {name:15} {elapsed * 1000:9.1f}ms  findings={len(findings)}")
+
+    calls = {f"{api}.{method}": n for api, service in services.items() for method, n in service.calls.items()}
+    print("  API calls:", ", ".join(f"{method}={n}" for method, n in sorted(calls.items())))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rules", type=int, default=300)
+    parser.add_argument("--buckets", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per API call")
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+    run(args, 1)
+    run(args, args.workers)
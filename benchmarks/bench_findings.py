@@ -0,0 +1,129 @@
+"""
+Finding records against the old per-finding lists and dicts: memory held by N
+findings, JSON serialization time, and export throughput / peak memory of the
+streaming CSV, write-only XLSX and Parquet writers (against a regular openpyxl
+workbook holding every cell).
+
+    python benchmarks/bench_findings.py --findings 500000 --export-findings 100000
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import export
+from findings import ComputePublicIp, LoadBalancer, VmPublicIp
+
+ZONES = [f"zones/us-central1-{z}" for z in "abcf"]
+
+
+def compute_fields(i):
+    return f"vm-{i}", ZONES[i % 4], f"34.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}"
+
+
+def lb_fields(i):
+    return dict(name=f"fr-{i}", scheme="EXTERNAL", ip=f"35.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+                ssl_policy="None", ssl_cert_status="Valid till: 2030-01-01", https_redirect="N/A",
+                cloud_armor_policy=f"projects/p/global/securityPolicies/armor-{i % 3}",
+                armor_rule_strength="Strong - 2 rules", internal_exposure="OK")
+
+
+SHAPES = {
+    "compute_public_ips": (lambda i: list(compute_fields(i)), lambda i: ComputePublicIp(*compute_fields(i))),
+    "vm_audit": (lambda i: dict(zip(VmPublicIp._fields, compute_fields(i))),
+                 lambda i: VmPublicIp(*compute_fields(i))),
+    "load_balancers": (lb_fields, lambda i: LoadBalancer(**lb_fields(i))),
+}
+
+
+def traced(run):
+    """``run()``'s result and the (held, peak) bytes it allocated; tracing is kept out of the timings."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = run()
+        return result, tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+
+def measure(build, count):
+    gc.collect()
+    start = time.perf_counter()
+    rows = [build(i) for i in range(count)]
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    json.dumps(rows)
+    dumped = time.perf_counter() - start
+    del rows
+    _, (held, _) = traced(lambda: [build(i) for i in range(count)])
+    return held, built, dumped
+
+
+def write_export(make_writer, count):
+    out = io.BytesIO()
+    writer = make_writer(out)
+    batch = []
+    for i in range(count):
+        batch.append({"check": "load_balancers", "finding": LoadBalancer(**lb_fields(i))})
+        if len(batch) == 1000:
+            writer.write_lines(batch)
+            batch = []
+    writer.write_lines(batch + [{"check": "load_balancers", "status": "ok", "elapsed_ms": 1.0}])
+    writer.close()
+    return out
+
+
+def export_run(label, make_writer, count):
+    gc.collect()
+    start = time.perf_counter()
+    out = write_export(make_writer, count)
+    elapsed = time.perf_counter() - start
+    _, (_, peak) = traced(lambda: write_export(make_writer, count))
+    print(f"{label:22} {count:8} rows  {elapsed * 1000:9.1f}ms  {count / elapsed:9.0f} rows/s  "
+          f"peak {peak / 1e6:7.1f} MB  output {len(out.getvalue()) / 1e6:6.1f} MB")
+
+
+class FullWorkbook(export.XlsxExport):
+    """Baseline: a regular openpyxl workbook that keeps every cell until it is saved."""
+
+    def __init__(self, fp):
+        from openpyxl import Workbook
+
+        export.ExportWriter.__init__(self, fp)
+        self.workbook = Workbook()
+        self.workbook.remove(self.workbook.active)
+        self.sheets = {}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--findings", type=int, default=500000)
+    parser.add_argument("--export-findings", type=int, default=100000)
+    args = parser.parse_args()
+
+    print("== memory held / build / json.dumps ==")
+    for check, (old, new) in SHAPES.items():
+        results = {}
+        for label, build in (("old", old), ("record", new)):
+            held, built, dumped = measure(build, args.findings)
+            results[label] = held
+            print(f"{check:20} {label:6}  {held / 1e6:8.1f} MB ({held / args.findings:5.0f} B/finding)  "
+                  f"build {built * 1000:8.1f}ms  json {dumped * 1000:8.1f}ms")
+        print(f"{'':20} records hold {1 - results['record'] / results['old']:.0%} less\n")
+
+    print("== export ==")
+    formats = [("csv (zip)", export.CsvExport), ("xlsx write-only", export.XlsxExport),
+               ("xlsx full workbook", FullWorkbook)]
+    if export.load_pyarrow() is not None:
+        formats.append(("parquet (zip)", export.ParquetExport))
+    else:
+        print("(pyarrow not installed: parquet skipped)")
+    for label, make_writer in formats:
+        export_run(label, make_writer, args.export_findings)
@@ -0,0 +1,137 @@
+"""
+Firewall engine on large synthetic projects: compile time, "which rules expose
+port P" over the sensitive ports, and per-VM effective exposure, against a
+baseline that re-parses every rule for every (VM, port) pair.
+
+    python benchmarks/bench_firewall_engine.py --rules 10000 20000 --vms 5000
+    python benchmarks/bench_firewall_engine.py --rules 10000 --vms 5000 --tag-sets 40
+
+Random tags per VM make nearly every VM a distinct target to evaluate, the
+worst case; VMs stamped from a few templates share their verdicts.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import firewall_engine
+from firewall_engine import FirewallEngine, SENSITIVE_PORTS
+
+NETWORKS = [f"projects/p/global/networks/vpc-{i}" for i in range(4)]
+TAGS = [f"tag-{i}" for i in range(60)]
+
+
+def fake_rules(count, seed=1):
+    rnd = random.Random(seed)
+    rules = []
+    for i in range(count):
+        kind = rnd.random()
+        if kind < 0.05:
+            sources = ["0.0.0.0/0"]
+        elif kind < 0.08:
+            sources = ["0.0.0.0/1", "128.0.0.0/1"]
+        elif kind < 0.4:
+            sources = [f"{rnd.randrange(1, 223)}.{rnd.randrange(256)}.0.0/{rnd.choice((8, 12, 16, 24))}"
+                       for _ in range(rnd.randrange(1, 4))]
+        else:
+            sources = [f"10.{rnd.randrange(256)}.{rnd.randrange(256)}.0/24"]
+        ports = rnd.choice([["22"], ["80", "443"], ["3000-4000"], ["1-65535"], [str(rnd.randrange(1, 65536))],
+                            ["3306", "5432"], None])
+        entry = {"IPProtocol": rnd.choice(["tcp", "tcp", "udp", "all"])}
+        if ports and entry["IPProtocol"] != "all":
+            entry["ports"] = ports
+        rule = {
+            "name": f"fw-{i}",
+            "direction": "INGRESS",
+            "network": rnd.choice(NETWORKS),
+            "priority": rnd.randrange(100, 65535),
+            "sourceRanges": sources,
+            "denied" if rnd.random() < 0.1 else "allowed": [entry],
+        }
+        if rnd.random() < 0.7:
+            rule["targetTags"] = rnd.sample(TAGS, rnd.randrange(1, 3))
+        rules.append(rule)
+    return rules
+
+
+def fake_instances(count, seed=2, tag_sets=None):
+    """VMs with 0-3 random tags each, or one of ``tag_sets`` fixed combinations (instance templates)."""
+    rnd = random.Random(seed)
+    templates = [rnd.sample(TAGS, rnd.randrange(0, 4)) for _ in range(tag_sets or 0)]
+    return [{
+        "name": f"vm-{i}",
+        "tags": {"items": rnd.choice(templates) if templates else rnd.sample(TAGS, rnd.randrange(0, 4))},
+        "networkInterfaces": [{"network": rnd.choice(NETWORKS),
+                               "accessConfigs": [{"natIP": f"34.1.{i >> 8 & 255}.{i & 255}"}] if i % 3 else []}],
+    } for i in range(count)]
+
+
+def baseline(rules, instance, ports):
+    """Rule-at-a-time evaluation: parse and test every rule for each port of one VM."""
+    nic = instance["networkInterfaces"][0]
+    if not nic.get("accessConfigs"):
+        return 0
+    tags = set(instance["tags"]["items"])
+    ordered = sorted(rules, key=lambda r: (r["priority"], "denied" not in r))
+    exposed = 0
+    for port in ports:
+        denied, allowed = [], []
+        for rule in ordered:
+            if rule["network"] != nic["network"] or (rule.get("targetTags") and not tags & set(rule["targetTags"])):
+                continue
+            entries = rule.get("denied") or rule.get("allowed")
+            if not any(proto in (6, 256) and lo <= port <= hi
+                       for e in entries for proto, lo, hi in firewall_engine.port_intervals(e)):
+                continue
+            src = firewall_engine.intersect(
+                firewall_engine.merge(firewall_engine.cidr_interval(c)[:2] for c in rule["sourceRanges"]),
+                firewall_engine.PUBLIC_V4)
+            if "denied" in rule:
+                denied = firewall_engine.merge(denied + src)
+            else:
+                allowed = firewall_engine.merge(allowed + firewall_engine.subtract(src, denied))
+        exposed += bool(allowed)
+    return exposed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rules", type=int, nargs="+", default=[10000, 20000])
+    parser.add_argument("--vms", type=int, default=5000)
+    parser.add_argument("--baseline-vms", type=int, default=20)
+    parser.add_argument("--tag-sets", type=int, default=0,
+                        help="draw VM tags from this many fixed combinations (default: random per VM)")
+    args = parser.parse_args()
+
+    instances = fake_instances(args.vms, tag_sets=args.tag_sets)
+    for count in args.rules:
+        rules = fake_rules(count)
+
+        start = time.perf_counter()
+        engine = FirewallEngine(rules)
+        compiled = time.perf_counter() - start
+
+        start = time.perf_counter()
+        exposing = engine.rules_exposing(SENSITIVE_PORTS)
+        by_port = time.perf_counter() - start
+
+        start = time.perf_counter()
+        findings = list(engine.exposed_instances(instances, SENSITIVE_PORTS))
+        per_vm = time.perf_counter() - start
+
+        sample = [vm for vm in instances if vm["networkInterfaces"][0]["accessConfigs"]][:args.baseline_vms]
+        start = time.perf_counter()
+        slow = sum(baseline(rules, vm, SENSITIVE_PORTS) for vm in sample)
+        slow_per_vm = (time.perf_counter() - start) / max(1, len(sample))
+        fast = sum(1 for vm, *_ in findings if vm in sample)
+        assert slow == fast, (slow, fast)
+
+        print(f"rules={count:6}  compile {compiled * 1000:8.1f}ms  "
+              f"rules_exposing({len(SENSITIVE_PORTS)} ports) {by_port * 1000:7.1f}ms "
+              f"[{sum(map(len, exposing.values()))} hits]  "
+              f"exposed_instances({args.vms} VMs) {per_vm * 1000:8.1f}ms [{len(findings)} findings]")
+        print(f"              baseline {slow_per_vm * 1000:8.1f}ms per VM  "
+              f"(~{slow_per_vm * args.vms:.0f}s for {args.vms} VMs)")
@@ -0,0 +1,95 @@
+"""
+Inventory snapshots: one collection pass, then every check replayed from the
+snapshot with no API calls, against running each audit live; plus indexed
+lookups by IP, network and tag on the stored resources.
+
+    python benchmarks/bench_inventory.py --vms 2000 --latency 0.02 --audits 3
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("AUDIT_CACHE", "off")
+os.environ.setdefault("INVENTORY_PATH", os.path.join(tempfile.mkdtemp(), "inventory.sqlite3"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import fake_gcp
+import audit_runner
+import inventory
+
+CREDS = fake_gcp.FakeCredentials({})
+
+
+def calls(services):
+    return sum(sum(service.calls.values()) for service in services.values())
+
+
+def audit(creds, source=None):
+    start = time.perf_counter()
+    report = asyncio.run(audit_runner.run_audit(creds, CREDS.project_id, source=source))
+    return report, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vms", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=200, help="buckets, rules, firewalls, functions, ...")
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--audits", type=int, default=3)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    n = args.items
+    services = fake_gcp.fake_project(latency=args.latency, vms=args.vms, rules=n, buckets=n, firewalls=n,
+                                     page_size=args.page_size, sql=n, functions=n, services=n)
+    fake_gcp.install(services)
+    store = inventory.get_store()
+
+    live_calls, live_time = calls(services), 0.0
+    for _ in range(args.audits):
+        live, elapsed = audit(CREDS)
+        live_time += elapsed
+    live_calls = calls(services) - live_calls
+    print(f"live      {args.audits} audits  {live_time * 1000:9.1f}ms  {live_calls:6} API calls")
+
+    before = calls(services)
+    start = time.perf_counter()
+    snapshot_id = inventory.collect(CREDS, CREDS.project_id, store=store)
+    collected = time.perf_counter() - start
+    collect_calls = calls(services) - before
+
+    snap_time, ok = 0.0, True
+    for _ in range(args.audits):
+        replay, elapsed = audit(inventory.SnapshotCredentials(CREDS.project_id), source=snapshot_id)
+        snap_time += elapsed
+    replay_calls = calls(services) - before - collect_calls
+    for name, result in live["checks"].items():
+        # Replayed aggregated lists come back as one page grouped by zone, so only the order may differ
+        same = sorted(map(repr, result.get("findings") or [])) == \
+            sorted(map(repr, replay["checks"][name].get("findings") or []))
+        ok &= same
+        if not same:
+            print(f"MISMATCH  {name}")
+    print(f"snapshot  collect {collected * 1000:9.1f}ms  {collect_calls:6} API calls  "
+          f"{sum(store.snapshot(snapshot_id)['resources'].values())} resources")
+    print(f"snapshot  {args.audits} audits  {snap_time * 1000:9.1f}ms  {replay_calls:6} API calls  "
+          f"findings {'identical' if ok else 'DIFFER'}")
+
+    instances = [data for _, data in store.resources(snapshot_id, "compute.instances")]
+    ips = [ip for vm in instances for ip in inventory.resource_ips("compute.instances", vm)]
+    network = inventory.resource_network("compute.instances", instances[0])
+    for label, query in (("ip", lambda i: store.find(snapshot_id, ip=ips[i % len(ips)])),
+                         ("tag", lambda i: store.find(snapshot_id, tag="web", limit=50)),
+                         ("network", lambda i: store.find(snapshot_id, "compute.instances", network=network,
+                                                          limit=50))):
+        start = time.perf_counter()
+        for i in range(args.lookups):
+            query(i)
+        elapsed = time.perf_counter() - start
+        print(f"find by {label:8} {args.lookups} lookups  {elapsed * 1000:8.1f}ms  "
+              f"{elapsed / args.lookups * 1e6:7.1f}us each")
+    sys.exit(0 if ok else 1)
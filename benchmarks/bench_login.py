@@ -0,0 +1,72 @@
+"""
+Login load test: logins per second, 429 rate, and the tail latency of
+concurrent /vm_audit traffic (stubbed Compute API) during a login burst.
+
+    python benchmarks/bench_login.py --logins 200 --audits 20
+    LOGIN_CACHE_TTL=0 python benchmarks/bench_login.py   # every login pays for bcrypt
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import httpx
+from google.oauth2 import service_account
+
+import fake_gcp
+import auth
+import main
+
+warnings.filterwarnings("ignore", module="jwt")
+
+SA_FILE = json.dumps({"project_id": "bench-project"})
+LOGIN = {"username": "admin", "password": "admin123"}
+
+
+async def run(args):
+    fake_gcp.install({"compute": fake_gcp.fake_compute(latency=args.latency)})
+    service_account.Credentials.from_service_account_info = staticmethod(fake_gcp.FakeCredentials)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        token = (await client.post("/login", json=LOGIN)).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        login_samples, audit_samples, statuses = [], [], []
+
+        async def login():
+            start = time.perf_counter()
+            response = await client.post("/login", json=LOGIN)
+            login_samples.append(time.perf_counter() - start)
+            statuses.append(response.status_code)
+
+        async def audit():
+            start = time.perf_counter()
+            response = await client.post("/vm_audit", headers=headers, files={"file": ("sa.json", SA_FILE)})
+            audit_samples.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*([login() for _ in range(args.logins)] + [audit() for _ in range(args.audits)]))
+        wall = time.perf_counter() - start
+
+    ok = statuses.count(200)
+    print(f"LOGIN_WORKERS={auth.LOGIN_WORKERS}  LOGIN_MAX_PENDING={auth.LOGIN_MAX_PENDING}  "
+          f"LOGIN_CACHE_TTL={auth.LOGIN_CACHE_TTL}")
+    print(f"logins: {ok} ok, {statuses.count(429)} rejected (429) in {wall:.2f}s -> {ok / wall:.1f} logins/s")
+    for name, samples in (("/login", login_samples), ("/vm_audit", audit_samples)):
+        print(f"{name:10} n={len(samples):4}  p50={fake_gcp.percentile(samples, 50) * 1000:8.1f}ms"
+              f"  p99={fake_gcp.percentile(samples, 99) * 1000:8.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--audits", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per Compute page")
+    asyncio.run(run(parser.parse_args()))
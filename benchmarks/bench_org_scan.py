@@ -0,0 +1,43 @@
+"""
+Org-wide scan scaling: wall time against project count with a simulated API
+backend, using the bounded fair scheduler in org_scan.py.
+
+    python benchmarks/bench_org_scan.py --projects 10 50 100 200 --latency 0.02
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import fake_gcp
+import org_scan
+
+CREDS = fake_gcp.FakeCredentials({})
+
+
+def run(args, projects):
+    services = fake_gcp.fake_project(latency=args.latency, vms=50, rules=6, buckets=10, firewalls=20)
+    services["cloudresourcemanager:v3"] = fake_gcp.fake_org(projects, latency=args.latency)
+    fake_gcp.install(services)
+
+    start = time.perf_counter()
+    report = asyncio.run(org_scan.scan_parent(CREDS, "organizations/1", args.checks))
+    elapsed = time.perf_counter() - start
+
+    summary = report["summary"]
+    print(f"projects={summary['projects']:4}  checks={summary['checks_run']:5}  failed={summary['checks_failed']:3}  "
+          f"wall={elapsed:7.2f}s  per-project={elapsed / max(1, projects) * 1000:7.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--projects", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per API call")
+    parser.add_argument("--checks", nargs="*", default=None)
+    args = parser.parse_args()
+    print(f"ORG_SCAN_CONCURRENCY={org_scan.ORG_SCAN_CONCURRENCY}  ORG_SCAN_API_RATE={org_scan.ORG_SCAN_API_RATE}/s")
+    for projects in args.projects:
+        run(args, projects)
@@ -0,0 +1,119 @@
+"""
+Pagination completeness and page prefetch.
+
+Every list-based check is run against fake APIs served in small pages and must
+return exactly what it returns when everything fits on one page; then each
+check is timed with pages fetched strictly in turn (--prefetch 0) and with
+the next pages fetched while the current one is processed.
+
+    python benchmarks/bench_paginator.py --page-size 7 --latency 0.02
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("AUDIT_CACHE", "off")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import fake_gcp
+import audit_checks
+import org_scan
+import pagination
+
+CREDS = fake_gcp.FakeCredentials({})
+
+CHECKS = {
+    "compute_public_ips": audit_checks.check_compute_public_ips,
+    "sql_public_ips": audit_checks.check_sql_public_ips,
+    "public_buckets": audit_checks.check_public_buckets,
+    "load_balancers": audit_checks.check_load_balancers_audit,
+    "firewall_rules": audit_checks.check_firewall_rules,
+    "firewall_exposure": audit_checks.check_firewall_exposure,
+    "cloud_functions_and_run": audit_checks.check_cloud_functions_and_run,
+}
+
+
+def project(args, page_size, latency):
+    n = args.items
+    services = fake_gcp.fake_project(latency=latency, vms=n, rules=n, buckets=n, firewalls=n,
+                                     page_size=page_size, sql=n, functions=n, services=n)
+    services["cloudresourcemanager:v3"] = fake_gcp.fake_org(n, latency=latency, page_size=page_size)
+    fake_gcp.install(services)
+    return services
+
+
+def collect(args, page_size, latency=0.0):
+    project(args, page_size, latency)
+    results = {name: sorted(map(repr, check(CREDS, CREDS.project_id))) for name, check in CHECKS.items()}
+    results["list_projects"] = sorted(org_scan.list_projects(CREDS, "organizations/1"))
+    return results
+
+
+def completeness(args):
+    pagination.PAGE_PREFETCH = 2
+    expected = collect(args, page_size=10 ** 9)
+    ok = True
+    for prefetch in (0, 2):
+        pagination.PAGE_PREFETCH = prefetch
+        paged = collect(args, page_size=args.page_size)
+        for name, rows in expected.items():
+            same = paged[name] == rows
+            ok &= same
+            print(f"prefetch={prefetch}  {name:25} rows={len(paged[name]):5} expected={len(rows):5}  "
+                  f"{'ok' if same else 'MISMATCH'}")
+    return ok
+
+
+def overlap(args):
+    pages = 20
+    for prefetch in (0, 1, 2):
+        def fetch(token):
+            time.sleep(args.latency)
+            return {"page": token, "next": token + 1 if token + 1 < pages else None}
+
+        class Request:
+            def __init__(self, token):
+                self.token = token
+
+            def execute(self):
+                return fetch(self.token)
+
+        start = time.perf_counter()
+        seen = []
+        for page in pagination.iter_pages(Request(0), lambda req, res: res["next"] and Request(res["next"]),
+                                          prefetch=prefetch):
+            time.sleep(args.latency)  # processing as slow as the fetch itself
+            seen.append(page["page"])
+        elapsed = time.perf_counter() - start
+        assert seen == list(range(pages)), seen
+        print(f"prefetch={prefetch}  {pages} pages, fetch=process={args.latency * 1000:.0f}ms  "
+              f"{elapsed * 1000:8.1f}ms")
+
+
+def timings(args):
+    for prefetch in (0, args.prefetch):
+        pagination.PAGE_PREFETCH = prefetch
+        project(args, args.page_size, args.latency)
+        for name, check in CHECKS.items():
+            start = time.perf_counter()
+            check(CREDS, CREDS.project_id)
+            elapsed = time.perf_counter() - start
+            print(f"prefetch={prefetch}  {name:25} {elapsed * 1000:9.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=60)
+    parser.add_argument("--page-size", type=int, default=7)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--prefetch", type=int, default=2)
+    args = parser.parse_args()
+
+    print("== completeness ==")
+    ok = completeness(args)
+    print("\n== fetch/process overlap ==")
+    overlap(args)
+    print("\n== checks ==")
+    timings(args)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,126 @@
+"""
+Load test of the production server profile (serve.py): throughput and latency
+of /vm_audit and /audit against fake Google APIs, for several worker counts.
+
+Each configuration starts ``serve.py`` with ``WEB_CONCURRENCY`` workers on a
+free port; every worker serves the real app with the fake APIs installed. The
+client keeps ``--concurrency`` requests in flight until ``--requests`` are done.
+
+    python benchmarks/bench_serve.py --workers 1,2,4 --requests 400 --concurrency 16
+    python benchmarks/bench_serve.py --workers 4 --endpoint audit --checks firewall_exposure,load_balancers
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+sys.path.insert(0, BENCH_DIR)
+
+import fake_gcp
+
+LOGIN = {"username": "admin", "password": "admin123"}
+SA_FILE = json.dumps({"project_id": "bench-project"})
+
+
+def __getattr__(name):
+    # uvicorn workers load "bench_serve:app": the real app, on fake Google APIs
+    if name != "app":
+        raise AttributeError(name)
+    from google.oauth2 import service_account
+
+    settings = json.loads(os.environ["BENCH_SERVE"])
+    fake_gcp.install(fake_gcp.fake_project(latency=settings["latency"], vms=settings["vms"],
+                                           page_size=settings["page_size"]))
+    service_account.Credentials.from_service_account_info = staticmethod(fake_gcp.FakeCredentials)
+    import main
+    return main.app
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def load(args, port):
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None, limits=limits) as client:
+        while True:
+            try:
+                token = (await client.post("/login", json=LOGIN)).json()["access_token"]
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.05)
+        headers = {"Authorization": f"Bearer {token}"}
+        path, data = ("/vm_audit", None) if args.endpoint == "vm_audit" else ("/audit", {"checks": args.checks})
+
+        # Warm the workers up (imports, client builds) before measuring
+        await asyncio.gather(*(client.post(path, headers=headers, data=data, files={"file": ("sa.json", SA_FILE)})
+                               for _ in range(args.concurrency)))
+
+        samples, errors, remaining = [], [0], [args.requests]
+
+        async def user():
+            while remaining[0] > 0:
+                remaining[0] -= 1
+                start = time.perf_counter()
+                response = await client.post(path, headers=headers, data=data,
+                                             files={"file": ("sa.json", SA_FILE)})
+                samples.append(time.perf_counter() - start)
+                errors[0] += response.status_code != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(args.concurrency)))
+        return time.perf_counter() - start, samples, errors[0]
+
+
+def run(args, workers):
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, WEB_CONCURRENCY=str(workers), PORT=str(port), HOST="127.0.0.1",
+                   PYTHONWARNINGS="ignore", AUDIT_CACHE_PATH=os.path.join(tmp, "audit.sqlite3"),
+                   SHARED_CACHE_PATH=os.path.join(tmp, "shared.sqlite3"),
+                   BENCH_SERVE=json.dumps({"latency": args.latency, "vms": args.vms, "page_size": args.page_size}))
+        server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve"], env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            return asyncio.run(load(args, port))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="1,2", help="comma-separated worker counts to compare")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--endpoint", choices=["vm_audit", "audit"], default="vm_audit")
+    parser.add_argument("--checks", default="firewall_exposure,load_balancers", help="for --endpoint audit")
+    parser.add_argument("--vms", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds per fake API call")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        import serve
+        serve.main("bench_serve:app")
+        sys.exit()
+
+    import serve
+    print(f"available CPUs: {serve.available_cpus()}")
+    for workers in [int(w) for w in args.workers.split(",")]:
+        elapsed, samples, errors = run(args, workers)
+        print(f"workers={workers:2}  {len(samples) / elapsed:7.1f} req/s  "
+              f"p50={fake_gcp.percentile(samples, 50) * 1000:8.1f}ms  "
+              f"p99={fake_gcp.percentile(samples, 99) * 1000:8.1f}ms  errors={errors}")
@@ -0,0 +1,137 @@
+"""
+Cold start: ``import main`` time and time-to-first-request of a fresh uvicorn
+server, with the API client libraries imported lazily (default), eagerly at
+import time as before (``--eager``), or by the startup warm-up.
+
+Each run starts a new server process whose Compute client is a real discovery
+build (imports and discovery document parse included) answered by the fake
+Compute API, and a service account key generated for the run, then times:
+process start -> first /login response -> first /vm_audit response.
+
+    python benchmarks/bench_startup.py --runs 5
+    python benchmarks/bench_startup.py --runs 5 --warmup imports --settle 2
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+# The libraries main used to import at module load
+EAGER_MODULES = ["googleapiclient.discovery", "googleapiclient.http", "httplib2", "google_auth_httplib2",
+                 "google.oauth2.service_account", "google.auth", "pyarrow.parquet"]
+
+LOGIN = {"username": "admin", "password": "admin123"}
+
+
+def import_time(eager):
+    code = ("import time, importlib; start = time.perf_counter()\n"
+            f"for name in {EAGER_MODULES if eager else []!r}:\n"
+            "    try: importlib.import_module(name)\n"
+            "    except ImportError: pass\n"
+            "import main; print(time.perf_counter() - start)")
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(out.stdout.split()[-1])
+
+
+def serve(port, eager):
+    """Server process: real client builds answered by the fake Compute API."""
+    for name in EAGER_MODULES if eager else []:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import fake_gcp
+    import gcp_clients
+
+    services = {"compute": fake_gcp.fake_compute(instances=50, latency=0)}
+    build = gcp_clients._build
+
+    def fake_build(api, version, creds):
+        build(api, version, creds)  # pay for the real discovery build, serve the fake
+        return services[api]
+
+    gcp_clients._build = fake_build
+    import uvicorn
+    uvicorn.run("main:app", host="127.0.0.1", port=port, log_level="warning")
+
+
+def service_account_key():
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                            serialization.NoEncryption()).decode()
+    return json.dumps({"type": "service_account", "project_id": "bench-project", "private_key_id": "bench",
+                       "private_key": pem, "client_email": "bench@bench-project.iam.gserviceaccount.com",
+                       "token_uri": "https://oauth2.googleapis.com/token"})
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def first_requests(args, sa_file):
+    import httpx
+
+    port = free_port()
+    env = dict(os.environ, STARTUP_WARMUP=args.warmup, PYTHONWARNINGS="ignore")
+    cmd = [sys.executable, os.path.abspath(__file__), "--serve", str(port)] + (["--eager"] if args.eager else [])
+    start = time.perf_counter()
+    server = subprocess.Popen(cmd, cwd=ROOT, env=env)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=None) as client:
+            while True:
+                try:
+                    response = client.post("/login", json=LOGIN)
+                    break
+                except httpx.ConnectError:
+                    time.sleep(0.005)
+            login = time.perf_counter() - start
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            if args.settle:
+                time.sleep(args.settle)  # an idle gap between startup and the first audit
+            audit_start = time.perf_counter()
+            response = client.post("/vm_audit", headers=headers, files={"file": ("sa.json", sa_file)})
+            response.raise_for_status()
+            audit = time.perf_counter() - audit_start
+    finally:
+        server.terminate()
+        server.wait()
+    return login, audit
+
+
+def ms(samples):
+    return f"median={statistics.median(samples) * 1000:7.1f}ms  max={max(samples) * 1000:7.1f}ms"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--eager", action="store_true", help="import the client libraries before main, as before")
+    parser.add_argument("--warmup", default="off", help="STARTUP_WARMUP for the server: off, imports or clients")
+    parser.add_argument("--settle", type=float, default=0, help="seconds between the first login and first audit")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.eager)
+        sys.exit()
+
+    imports = [import_time(args.eager) for _ in range(args.runs)]
+    print(f"import main          {ms(imports)}")
+
+    sa_file = service_account_key()
+    logins, audits = zip(*(first_requests(args, sa_file) for _ in range(args.runs)))
+    print(f"start -> first login {ms(logins)}")
+    print(f"first /vm_audit      {ms(audits)}")
@@ -0,0 +1,48 @@
+"""
+Cost of the per-call instrumentation: recording one API call (counters,
+latency histogram, check trace) from several threads, and rendering /metrics.
+
+    python benchmarks/bench_telemetry.py --calls 200000 --threads 8
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import telemetry
+
+METHODS = [f"compute.method{i}" for i in range(20)]
+
+
+def record(calls):
+    with telemetry.check_scope("bench"):
+        for i in range(calls):
+            telemetry.record_call("compute", METHODS[i % len(METHODS)], random.random(), 1024, i % 7 == 0, None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    per_thread = args.calls // args.threads
+    threads = [threading.Thread(target=record, args=(per_thread,)) for _ in range(args.threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    total = per_thread * args.threads
+    print(f"record_call: {total} calls on {args.threads} threads  {elapsed * 1000:8.1f}ms  "
+          f"{elapsed / total * 1e6:.2f}us/call")
+
+    start = time.perf_counter()
+    text = telemetry.render_prometheus()
+    elapsed = time.perf_counter() - start
+    print(f"render_prometheus: {len(text.splitlines())} lines  {elapsed * 1000:8.2f}ms")
@@ -0,0 +1,73 @@
+"""
+Latency of concurrent /vm_audit and /login calls against a stubbed Compute API.
+
+    python benchmarks/bench_vm_audit.py --audits 20 --logins 20 --latency 0.1
+
+Every Compute page takes ``--latency`` seconds. If an audit blocked the event
+loop, /login p99 would grow with the number of in-flight audits.
+"""
+import argparse
+import warnings
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import httpx
+from google.oauth2 import service_account
+import fake_gcp
+import gcp_clients
+import main
+
+warnings.filterwarnings("ignore", module="jwt")
+
+SA_FILE = json.dumps({"project_id": "bench-project", "client_email": "bench@bench-project.iam.gserviceaccount.com"})
+
+
+async def timed(samples, coro):
+    start = time.perf_counter()
+    response = await coro
+    samples.append(time.perf_counter() - start)
+    response.raise_for_status()
+
+
+async def run(args):
+    compute = fake_gcp.fake_compute(instances=args.instances, page_size=args.page_size, latency=args.latency)
+    gcp_clients._build = lambda *a: compute
+    service_account.Credentials.from_service_account_info = staticmethod(fake_gcp.FakeCredentials)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        login = {"username": "admin", "password": "admin123"}
+        token = (await client.post("/login", json=login)).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        audit_samples, login_samples = [], []
+        tasks = [
+            timed(audit_samples, client.post("/vm_audit", headers=headers, files={"file": ("sa.json", SA_FILE)}))
+            for _ in range(args.audits)
+        ] + [
+            timed(login_samples, client.post("/login", json=login))
+            for _ in range(args.logins)
+        ]
+        start = time.perf_counter()
+        await asyncio.gather(*tasks)
+        wall = time.perf_counter() - start
+
+    print(f"wall time: {wall:.3f}s  (AUDIT_MAX_CONCURRENCY={main.AUDIT_MAX_CONCURRENCY})")
+    for name, samples in (("/vm_audit", audit_samples), ("/login", login_samples)):
+        print(f"{name:10} n={len(samples):4}  p50={fake_gcp.percentile(samples, 50) * 1000:8.1f}ms"
+              f"  p99={fake_gcp.percentile(samples, 99) * 1000:8.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--audits", type=int, default=20)
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--instances", type=int, default=300)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds per Compute page")
+    asyncio.run(run(parser.parse_args()))
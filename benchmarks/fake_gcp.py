@@ -0,0 +1,336 @@
+"""
+In-process stand-in for the Google API discovery clients used by the benchmarks.
+
+A fake service is built from a dict of handlers keyed by dotted method path,
+e.g. ``"instances.aggregatedList"``. Every ``.execute()`` sleeps for the
+configured latency before calling the handler, which is enough to reproduce the
+blocking behaviour of the real HTTP transport without any network access.
+"""
+import datetime
+import time
+
+
+class FakeRequest:
+    def __init__(self, service, method, kwargs):
+        self.service = service
+        self.method = method
+        self.kwargs = kwargs
+
+    def execute(self, num_retries=0):
+        self.service.calls[self.method] = self.service.calls.get(self.method, 0) + 1
+        if self.service.latency:
+            time.sleep(self.service.latency)
+        return self.service.handlers[self.method](**self.kwargs)
+
+
+class FakeResource:
+    def __init__(self, service, path):
+        self._service = service
+        self._path = path
+
+    def __getattr__(self, name):
+        path = f"{self._path}.{name}" if self._path else name
+
+        if name.endswith("_next"):
+            method = path[: -len("_next")]
+
+            def next_page(previous_request=None, previous_response=None):
+                token = (previous_response or {}).get("nextPageToken")
+                if not token:
+                    return None
+                kwargs = dict(previous_request.kwargs, pageToken=token)
+                return FakeRequest(self._service, method, kwargs)
+
+            return next_page
+
+        if path in self._service.handlers:
+            return lambda **kwargs: FakeRequest(self._service, path, kwargs)
+        return lambda **kwargs: FakeResource(self._service, path)
+
+
+class FakeService(FakeResource):
+    def __init__(self, handlers, latency=0.0):
+        self.handlers = handlers
+        self.latency = latency
+        self.calls = {}
+        super().__init__(self, "")
+
+
+def paged(items, page_size, key="items"):
+    """Build a handler that serves ``items`` in pages linked by ``nextPageToken``."""
+    def handler(pageToken=None, **_):
+        start = int(pageToken or 0)
+        page = {key: items[start:start + page_size]}
+        if start + page_size < len(items):
+            page["nextPageToken"] = str(start + page_size)
+        return page
+    return handler
+
+
+def continued(items, page_size, key="items"):
+    """Like :func:`paged`, but linked Kubernetes-style through ``metadata.continue`` (Cloud Run v1)."""
+    def handler(**kwargs):
+        start = int(kwargs.get("continue") or 0)
+        page = {key: items[start:start + page_size], "metadata": {}}
+        if start + page_size < len(items):
+            page["metadata"]["continue"] = str(start + page_size)
+        return page
+    return handler
+
+
+def aggregated(scoped_items, page_size, key):
+    """Like :func:`paged`, but wraps each page in an ``aggregatedList`` zone map."""
+    def handler(pageToken=None, **_):
+        start = int(pageToken or 0)
+        page = {"items": {}}
+        for scope, item in scoped_items[start:start + page_size]:
+            page["items"].setdefault(scope, {key: []})[key].append(item)
+        if start + page_size < len(scoped_items):
+            page["nextPageToken"] = str(start + page_size)
+        return page
+    return handler
+
+
+def fake_instances(count, public_every=2):
+    vms = []
+    for i in range(count):
+        nic = {"network": "projects/p/global/networks/default", "accessConfigs": []}
+        if i % public_every == 0:
+            nic["accessConfigs"].append({"natIP": f"34.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"})
+        tags = {"items": ["web" if i % 2 else "db"]}
+        vms.append((f"zones/us-central1-{'abc'[i % 3]}", {"name": f"vm-{i}", "tags": tags, "networkInterfaces": [nic]}))
+    return vms
+
+
+def fake_compute(instances=300, page_size=100, latency=0.05):
+    return FakeService({
+        "instances.aggregatedList": aggregated(fake_instances(instances), page_size, "instances"),
+    }, latency=latency)
+
+
+class FakeCredentials:
+    def __init__(self, info, **kwargs):
+        self.project_id = info.get("project_id", "bench-project")
+        self.service_account_email = info.get("client_email", "bench@bench-project.iam.gserviceaccount.com")
+        self.token = None
+        self.expiry = None
+
+    def refresh(self, request):
+        self.token = "fake-token"
+        self.expiry = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def fake_project(latency=0.05, vms=300, rules=50, buckets=50, firewalls=100, page_size=100,
+                 sql=1, functions=1, services=1):
+    """A fake service for every API the checks in audit_checks.py call, keyed by API name."""
+    forwarding_rules = []
+    for i in range(rules):
+        kind = ("targetHttpsProxies", "targetHttpProxies", "backendServices")[i % 3]
+        forwarding_rules.append(("regions/us-central1", {
+            "name": f"fr-{i}",
+            "target": f"projects/p/global/{kind}/proxy-{i}",
+            "loadBalancingScheme": "EXTERNAL",
+            "IPAddress": f"35.0.{i >> 8}.{i & 255}",
+            "fingerprint": f"fp-{i}",
+        }))
+
+    def proxy(targetHttpsProxy=None, targetHttpProxy=None, **_):
+        name = targetHttpsProxy or targetHttpProxy
+        n = int(name.split("-")[-1])
+        return {
+            "name": name,
+            "fingerprint": f"proxy-fp-{n}",
+            # A handful of certificates, policies and URL maps shared by every proxy
+            "sslCertificates": [f"projects/p/global/sslCertificates/cert-{n % 5}"],
+            "securityPolicy": f"projects/p/global/securityPolicies/armor-{n % 3}",
+            "urlMap": f"projects/p/global/urlMaps/map-{n % 4}",
+        }
+
+    # The same proxies, certificates, policies and URL maps as listings, for inventory snapshots
+    https_proxies = [("global", proxy(targetHttpsProxy=f"proxy-{i}")) for i in range(rules) if i % 3 == 0]
+    http_proxies = [("global", proxy(targetHttpProxy=f"proxy-{i}")) for i in range(rules) if i % 3 == 1]
+    certificates = [("global", {"name": f"cert-{n}", "expireTime": "2030-01-01"}) for n in range(5)]
+    url_maps = [("global", {"name": f"map-{n}", "fingerprint": f"map-fp-{n}", "pathMatchers": []})
+                for n in range(4)]
+    armor_policies = [{"name": f"armor-{n}", "fingerprint": f"armor-fp-{n}", "rules": [{}, {}]} for n in range(3)]
+
+    firewall_items = [{
+        "name": f"fw-{i}",
+        "direction": "INGRESS",
+        "allowed": [{"IPProtocol": "tcp", "ports": [("22", "443", "3389", "8080", "5432")[i % 5]]}],
+        "sourceRanges": ["0.0.0.0/0"] if i % 4 == 0 else [f"10.{i & 255}.0.0/16"],
+        "network": "projects/p/global/networks/default",
+        "priority": 1000,
+        "disabled": False,
+    } for i in range(firewalls)]
+
+    bucket_items = [{"name": f"bucket-{i}", "etag": f"etag-{i}"} for i in range(buckets)]
+
+    def bucket_iam(bucket, **_):
+        n = int(bucket.split("-")[-1])
+        members = ["allUsers"] if n % 10 == 0 else ["projectViewer:p"]
+        return {"bindings": [{"role": "roles/storage.objectViewer", "members": members}]}
+
+    return {
+        "compute": FakeService({
+            "instances.aggregatedList": aggregated(fake_instances(vms), page_size, "instances"),
+            "forwardingRules.aggregatedList": aggregated(forwarding_rules, page_size, "forwardingRules"),
+            "targetHttpsProxies.get": proxy,
+            "targetHttpProxies.get": proxy,
+            "sslCertificates.get": lambda sslCertificate, **_: {"name": sslCertificate, "expireTime": "2030-01-01"},
+            "securityPolicies.get": lambda securityPolicy, **_: {"name": securityPolicy, "fingerprint": f"{securityPolicy[:5]}-fp-{securityPolicy[6:]}",
+                                                         "rules": [{}, {}]},
+            "urlMaps.get": lambda urlMap, **_: {"name": urlMap, "fingerprint": f"map-fp-{urlMap[4:]}", "pathMatchers": []},
+            "firewalls.list": paged(firewall_items, page_size),
+            "targetHttpsProxies.aggregatedList": aggregated(https_proxies, page_size, "targetHttpsProxies"),
+            "targetHttpProxies.aggregatedList": aggregated(http_proxies, page_size, "targetHttpProxies"),
+            "sslCertificates.aggregatedList": aggregated(certificates, page_size, "sslCertificates"),
+            "urlMaps.aggregatedList": aggregated(url_maps, page_size, "urlMaps"),
+            "securityPolicies.list": paged(armor_policies, page_size),
+        }, latency=latency),
+        "sqladmin": FakeService({
+            "instances.list": paged([{"name": f"sql-{i}", "ipAddresses": [{"type": "PRIMARY", "ipAddress": f"34.1.{i >> 8}.{i & 255}"}]}
+                                     for i in range(sql)], page_size),
+        }, latency=latency),
+        "container": FakeService({
+            "projects.locations.clusters.list": lambda **_: {"clusters": [{"name": "gke-1", "endpoint": "34.2.2.2"}]},
+        }, latency=latency),
+        "cloudresourcemanager": FakeService({
+            "projects.getIamPolicy": lambda **_: {"bindings": [{"role": "roles/owner", "members": ["serviceAccount:sa@p.iam.gserviceaccount.com"]}]},
+        }, latency=latency),
+        "storage": FakeService({
+            "buckets.list": paged(bucket_items, page_size),
+            "buckets.getIamPolicy": bucket_iam,
+        }, latency=latency),
+        "cloudfunctions": FakeService({
+            "projects.locations.functions.list": paged([{"name": f"projects/p/locations/us-central1/functions/fn-{i}", "httpsTrigger": {"url": "https://x"}}
+                                                        for i in range(functions)], page_size, key="functions"),
+        }, latency=latency),
+        "run": FakeService({
+            "projects.locations.services.list": continued([{"metadata": {"name": f"svc-{i}", "labels": {"cloud.googleapis.com/location": "us-central1"}},
+                                                             "status": {"url": f"https://svc-{i}.run.app"}}
+                                                            for i in range(services)], page_size),
+            "projects.locations.services.getIamPolicy": lambda **_: {"bindings": []},
+        }, latency=latency),
+    }
+
+
+def fake_org(projects, folders=4, latency=0.05, page_size=100):
+    """Cloud Resource Manager v3 with ``projects`` spread over ``folders`` under organizations/1."""
+    project_ids = [f"project-{i}" for i in range(projects)]
+    folder_names = [f"folders/{i}" for i in range(folders)]
+
+    def list_projects(parent, pageToken=None, **_):
+        if parent == "organizations/1" or not folder_names:
+            children = project_ids[::len(folder_names) + 1] if folder_names else project_ids
+        else:
+            slot = folder_names.index(parent) + 1
+            children = project_ids[slot::len(folder_names) + 1]
+        items = [{"projectId": p, "state": "ACTIVE"} for p in children]
+        return paged(items, page_size, key="projects")(pageToken=pageToken)
+
+    def list_folders(parent, pageToken=None, **_):
+        items = [{"name": f, "state": "ACTIVE"} for f in folder_names] if parent == "organizations/1" else []
+        return paged(items, page_size, key="folders")(pageToken=pageToken)
+
+    return FakeService({"projects.list": list_projects, "folders.list": list_folders}, latency=latency)
+
+
+def install(services):
+    """Route every discovery client build to the matching fake service, keyed by ``api:version`` or ``api``."""
+    import gcp_clients
+    gcp_clients._build = lambda api, version, creds: services.get(f"{api}:{version}") or services[api]
+    gcp_clients.clear_clients()
+
+
+def fake_assets(project_ids, **project_kwargs):
+    """
+    The resources and IAM policies of ``fake_project(**project_kwargs)``, once per
+    project, as Cloud Asset export records (``exportAssets`` NDJSON layout).
+    """
+    services = fake_project(latency=0, page_size=10 ** 9, **project_kwargs)
+
+    def call(api, method, **kwargs):
+        return services[api].handlers[method](**kwargs)
+
+    compute = [
+        ("Instance", "instances", "instances.aggregatedList"),
+        ("ForwardingRule", "forwardingRules", "forwardingRules.aggregatedList"),
+        ("TargetHttpsProxy", "targetHttpsProxies", "targetHttpsProxies.aggregatedList"),
+        ("TargetHttpProxy", "targetHttpProxies", "targetHttpProxies.aggregatedList"),
+        ("SslCertificate", "sslCertificates", "sslCertificates.aggregatedList"),
+        ("UrlMap", "urlMaps", "urlMaps.aggregatedList"),
+    ]
+
+    for number, project in enumerate(project_ids, start=1000):
+        ancestors = [f"projects/{number}", "organizations/1"]
+
+        def asset(name, asset_type, data=None, policy=None):
+            record = {"name": name, "asset_type": asset_type, "ancestors": ancestors}
+            if data is not None:
+                record["resource"] = {"version": "v1", "data": data}
+            if policy is not None:
+                record["iam_policy"] = policy
+            return record
+
+        yield asset(f"//cloudresourcemanager.googleapis.com/projects/{number}",
+                    "cloudresourcemanager.googleapis.com/Project",
+                    {"projectNumber": str(number), "projectId": project, "lifecycleState": "ACTIVE"},
+                    call("cloudresourcemanager", "projects.getIamPolicy"))
+        for asset_type, key, method in compute:
+            for scope, scoped in call("compute", method)["items"].items():
+                for item in scoped[key]:
+                    yield asset(f"//compute.googleapis.com/projects/{project}/{scope}/{key}/{item['name']}",
+                                f"compute.googleapis.com/{asset_type}", item)
+        for asset_type, key, method in (("Firewall", "firewalls", "firewalls.list"),
+                                        ("SecurityPolicy", "securityPolicies", "securityPolicies.list")):
+            for item in call("compute", method)["items"]:
+                yield asset(f"//compute.googleapis.com/projects/{project}/global/{key}/{item['name']}",
+                            f"compute.googleapis.com/{asset_type}", item)
+        for item in call("sqladmin", "instances.list")["items"]:
+            yield asset(f"//cloudsql.googleapis.com/projects/{project}/instances/{item['name']}",
+                        "sqladmin.googleapis.com/Instance", item)
+        for item in call("container", "projects.locations.clusters.list")["clusters"]:
+            yield asset(f"//container.googleapis.com/projects/{project}/locations/us-central1/clusters/{item['name']}",
+                        "container.googleapis.com/Cluster", item)
+        for item in call("storage", "buckets.list")["items"]:
+            yield asset(f"//storage.googleapis.com/{item['name']}", "storage.googleapis.com/Bucket", item,
+                        call("storage", "buckets.getIamPolicy", bucket=item["name"]))
+        for item in call("cloudfunctions", "projects.locations.functions.list")["functions"]:
+            yield asset(f"//cloudfunctions.googleapis.com/{item['name']}",
+                        "cloudfunctions.googleapis.com/CloudFunction", item)
+        for item in call("run", "projects.locations.services.list")["items"]:
+            name = item["metadata"]["name"]
+            yield asset(f"//run.googleapis.com/projects/{project}/locations/us-central1/services/{name}",
+                        "run.googleapis.com/Service", item,
+                        call("run", "projects.locations.services.getIamPolicy", resource=name))
+
+
+def fake_cloudasset(assets, latency=0.05, page_size=1000):
+    """Cloud Asset API v1 ``assets.list`` over ``assets``, in API (camelCase) layout."""
+    by_content = {"RESOURCE": [], "IAM_POLICY": []}
+    for a in assets:
+        record = {"name": a["name"], "assetType": a["asset_type"], "ancestors": a["ancestors"]}
+        if "resource" in a:
+            by_content["RESOURCE"].append(dict(record, resource=a["resource"]))
+        if "iam_policy" in a:
+            by_content["IAM_POLICY"].append(dict(record, iamPolicy=a["iam_policy"]))
+
+    selections = {}
+
+    def list_assets(contentType, assetTypes, pageToken=None, **_):
+        key = (contentType, tuple(assetTypes))
+        if key not in selections:
+            selections[key] = paged([r for r in by_content[contentType] if r["assetType"] in assetTypes],
+                                    page_size, key="assets")
+        return selections[key](pageToken=pageToken)
+
+    return FakeService({"assets.list": list_assets}, latency=latency)
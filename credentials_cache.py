@@ -0,0 +1,177 @@
+"""
+In-memory cache of service-account credentials built from uploaded key files.
+
+Each new ``Credentials`` object does its own OAuth token exchange before its
+first API call, so repeated audits of the same service account reuse one
+object (and its access token) instead. Entries are keyed by a SHA-256 digest of
+``client_email``, ``private_key_id`` and the private key itself, so a file that
+only copies the public identifiers of a cached key never matches it.
+
+Credentials are scoped up front: discovery would otherwise re-scope (and so
+copy) them for every client, throwing the cached token away.
+
+Access tokens are shared with the other server worker processes through
+shared_cache: before doing a token exchange, credentials take over a token
+another worker already fetched for the same key, and publish the ones they
+fetch themselves.
+
+A background thread refreshes tokens of entries used in the last
+``CREDENTIAL_HOT_WINDOW`` seconds once they are within
+``TOKEN_REFRESH_MARGIN`` seconds of expiry, so requests don't stall on a token
+exchange. Entries idle for ``CREDENTIAL_IDLE_TTL`` seconds, or beyond
+``CREDENTIAL_CACHE_SIZE`` (least recently used first), are dropped.
+"""
+import datetime
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import shared_cache
+
+CLOUD_PLATFORM_SCOPE = "https://www.googleapis.com/auth/cloud-platform"
+
+CREDENTIAL_CACHE_SIZE = int(os.getenv("CREDENTIAL_CACHE_SIZE", "256"))
+CREDENTIAL_IDLE_TTL = int(os.getenv("CREDENTIAL_IDLE_TTL", "1800"))  # seconds
+CREDENTIAL_HOT_WINDOW = int(os.getenv("CREDENTIAL_HOT_WINDOW", "300"))  # seconds
+TOKEN_REFRESH_MARGIN = int(os.getenv("TOKEN_REFRESH_MARGIN", "300"))  # seconds
+REFRESH_INTERVAL = int(os.getenv("CREDENTIAL_REFRESH_INTERVAL", "30"))  # seconds
+
+logger = logging.getLogger(__name__)
+
+_entries = OrderedDict()  # key -> [credentials, last_used]
+_lock = threading.Lock()
+_refresher = None
+
+
+def cache_key(info: dict):
+    digest = hashlib.sha256()
+    for field in ("client_email", "private_key_id", "private_key"):
+        digest.update(str(info.get(field, "")).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def get_credentials(info: dict):
+    """Scoped credentials for an uploaded service-account key, reused across uploads."""
+    key = cache_key(info)
+    now = time.monotonic()
+
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and now - entry[1] < CREDENTIAL_IDLE_TTL:
+            entry[1] = now
+            _entries.move_to_end(key)
+            return entry[0]
+
+    from google.oauth2 import service_account
+
+    creds = service_account.Credentials.from_service_account_info(info, scopes=[CLOUD_PLATFORM_SCOPE])
+
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            # Another request built it first; keep the one that may already hold a token
+            entry[1] = now
+            return entry[0]
+        _entries[key] = [creds, now]
+        _prune(now)
+    _share_tokens(key, creds)
+    _ensure_refresher()
+    return creds
+
+
+def _prune(now):
+    for key in [k for k, (_, last_used) in _entries.items() if now - last_used >= CREDENTIAL_IDLE_TTL]:
+        del _entries[key]
+    while len(_entries) > CREDENTIAL_CACHE_SIZE:
+        _entries.popitem(last=False)
+
+
+# ----------------- Tokens Shared Across Workers -----------------
+def _adopt_shared_token(key, creds):
+    """Take over the token another worker fetched for ``key``; True if it is not about to expire."""
+    cache = shared_cache.get_cache()
+    entry = cache.get("tokens", key) if cache is not None else None
+    if entry is None:
+        return False
+    expiry = datetime.datetime.fromtimestamp(entry["expiry"], datetime.timezone.utc).replace(tzinfo=None)
+    if (expiry - datetime.datetime.utcnow()).total_seconds() < TOKEN_REFRESH_MARGIN:
+        return False
+    creds.token, creds.expiry = entry["token"], expiry
+    return True
+
+
+def _publish_token(key, creds):
+    cache = shared_cache.get_cache()
+    expiry = getattr(creds, "expiry", None)
+    if cache is None or not getattr(creds, "token", None) or expiry is None:
+        return
+    ttl = (expiry - datetime.datetime.utcnow()).total_seconds()
+    if ttl > 0:
+        timestamp = expiry.replace(tzinfo=datetime.timezone.utc).timestamp()
+        cache.put("tokens", key, {"token": creds.token, "expiry": timestamp}, ttl)
+
+
+def _share_tokens(key, creds):
+    """Route ``creds.refresh`` through the shared cache; google-auth calls it whenever the token is invalid."""
+    if shared_cache.get_cache() is None:
+        return
+    refresh = creds.refresh
+
+    def shared_refresh(request):
+        if not _adopt_shared_token(key, creds):
+            refresh(request)
+            _publish_token(key, creds)
+
+    creds.refresh = shared_refresh
+
+
+def needs_refresh(creds, margin=TOKEN_REFRESH_MARGIN):
+    expiry = getattr(creds, "expiry", None)
+    if not getattr(creds, "token", None) or expiry is None:
+        return False  # never used yet; the first request fetches the token
+    remaining = (expiry - datetime.datetime.utcnow()).total_seconds()
+    return remaining < margin
+
+
+def refresh_hot_entries():
+    """Refresh tokens that are in active use and about to expire."""
+    from google.auth.transport.requests import Request
+
+    now = time.monotonic()
+    with _lock:
+        _prune(now)
+        hot = [creds for creds, last_used in _entries.values()
+               if now - last_used < CREDENTIAL_HOT_WINDOW and needs_refresh(creds)]
+
+    for creds in hot:
+        try:
+            creds.refresh(Request())
+        except Exception as e:
+            logger.warning("Proactive token refresh failed for %s: %s",
+                           getattr(creds, "service_account_email", "?"), e)
+
+
+def _refresh_loop():
+    while True:
+        time.sleep(REFRESH_INTERVAL)
+        try:
+            refresh_hot_entries()
+        except Exception:
+            logger.exception("Credential refresher failed")
+
+
+def _ensure_refresher():
+    global _refresher
+    with _lock:
+        if _refresher is None:
+            _refresher = threading.Thread(target=_refresh_loop, name="credential-refresher", daemon=True)
+            _refresher.start()
+
+
+def clear():
+    with _lock:
+        _entries.clear()
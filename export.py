@@ -0,0 +1,222 @@
+"""
+Findings export: CSV, XLSX and Parquet.
+
+Writers take findings one at a time, as ``audit_runner.stream_audit`` produces
+them, so a check's findings are never all held in memory:
+
+- csv: one CSV per check, streamed to a temporary file;
+- xlsx: a write-only openpyxl workbook, one sheet per check;
+- parquet: one Parquet file per check, written in row groups of ``EXPORT_BATCH``
+  findings (needs the optional ``pyarrow`` package).
+
+CSV and Parquet exports are ZIP archives with one file per check; every format
+also gets a ``status`` table (check, status, error, elapsed_ms). Column names
+and types come from ``findings.SCHEMAS``.
+"""
+import abc
+import csv
+import io
+import os
+import shutil
+import tempfile
+import typing
+import zipfile
+
+from findings import SCHEMAS, as_record
+
+pyarrow = None  # optional, imported by load_pyarrow() on the first Parquet export
+
+EXPORT_BATCH = int(os.getenv("EXPORT_BATCH", "10000"))  # findings per Parquet row group
+
+STATUS_COLUMNS = ["check", "status", "error", "elapsed_ms"]
+
+
+def load_pyarrow():
+    """The pyarrow module with its Parquet support, or None when it is not installed."""
+    global pyarrow
+    if pyarrow is None:
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            return None
+    return pyarrow
+
+
+# ----------------- Cell Conversion -----------------
+def cell(value):
+    """A CSV / spreadsheet cell: lists are joined, missing values left empty."""
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return ", ".join(map(str, value))
+    return value
+
+
+def base_type(annotation):
+    """``Optional[X]`` -> ``X``; ``Union[List[X], X]`` -> ``List[X]``."""
+    if typing.get_origin(annotation) is typing.Union:
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        lists = [a for a in args if typing.get_origin(a) is list]
+        return lists[0] if lists else args[0]
+    return annotation
+
+
+def convert(annotation):
+    """Normalizer for one column's values, e.g. a single string in a list column becomes ``[value]``."""
+    kind = base_type(annotation)
+    if typing.get_origin(kind) is list:
+        item = convert(typing.get_args(kind)[0])
+        return lambda v: [item(x) for x in v] if isinstance(v, (list, tuple)) else [] if v in (None, "") else [item(v)]
+    if kind is int:
+        return lambda v: None if v in (None, "") else int(v)
+    if kind is float:
+        return lambda v: None if v is None else float(v)
+    if kind is bool:
+        return lambda v: None if v is None else bool(v)
+    return lambda v: None if v is None else str(v)
+
+
+def arrow_type(annotation):
+    kind = base_type(annotation)
+    if typing.get_origin(kind) is list:
+        return pyarrow.list_(arrow_type(typing.get_args(kind)[0]))
+    return {int: pyarrow.int64(), float: pyarrow.float64(), bool: pyarrow.bool_()}.get(kind, pyarrow.string())
+
+
+# ----------------- Writers -----------------
+class ExportWriter(abc.ABC):
+    """Collects findings and status lines; ``close()`` writes the export to ``fp``."""
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.statuses = []
+
+    def write_lines(self, lines):
+        """Consume ``stream_audit`` lines: findings and per-check status lines."""
+        for line in lines:
+            if "finding" in line:
+                self.write(line["check"], line["finding"])
+            elif "status" in line:
+                self.statuses.append([line.get(c) for c in STATUS_COLUMNS])
+
+    @abc.abstractmethod
+    def write(self, check, finding):
+        """Add one finding of ``check``."""
+
+    @abc.abstractmethod
+    def close(self):
+        """Write the export to ``fp``."""
+
+
+class CsvExport(ExportWriter):
+    extension = "zip"
+    media_type = "application/zip"
+
+    def __init__(self, fp):
+        super().__init__(fp)
+        self.files = {}
+
+    def write(self, check, finding):
+        if check not in self.files:
+            tmp = tempfile.TemporaryFile("w+", newline="", encoding="utf-8")
+            writer = csv.writer(tmp)
+            writer.writerow(SCHEMAS[check]._fields)
+            self.files[check] = (tmp, writer)
+        self.files[check][1].writerow([cell(v) for v in as_record(SCHEMAS[check], finding)])
+
+    def close(self):
+        with zipfile.ZipFile(self.fp, "w", zipfile.ZIP_DEFLATED) as archive:
+            for check, (tmp, _) in self.files.items():
+                tmp.seek(0)
+                with archive.open(f"{check}.csv", "w") as out, io.TextIOWrapper(out, encoding="utf-8",
+                                                                                newline="") as text:
+                    shutil.copyfileobj(tmp, text)
+                tmp.close()
+            status = io.StringIO()
+            csv.writer(status).writerows([STATUS_COLUMNS] + [[cell(v) for v in row] for row in self.statuses])
+            archive.writestr("status.csv", status.getvalue())
+
+
+class XlsxExport(ExportWriter):
+    extension = "xlsx"
+    media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+    def __init__(self, fp):
+        from openpyxl import Workbook
+
+        super().__init__(fp)
+        # ✅ Write-only workbooks stream rows to disk instead of keeping every cell object
+        self.workbook = Workbook(write_only=True)
+        self.sheets = {}
+
+    def write(self, check, finding):
+        if check not in self.sheets:
+            self.sheets[check] = self.workbook.create_sheet(check[:31])
+            self.sheets[check].append(list(SCHEMAS[check]._fields))
+        self.sheets[check].append([cell(v) for v in as_record(SCHEMAS[check], finding)])
+
+    def close(self):
+        status = self.workbook.create_sheet("status")
+        status.append(STATUS_COLUMNS)
+        for row in self.statuses:
+            status.append([cell(v) for v in row])
+        self.workbook.save(self.fp)
+
+
+class ParquetExport(ExportWriter):
+    extension = "zip"
+    media_type = "application/zip"
+
+    def __init__(self, fp):
+        if load_pyarrow() is None:
+            raise ValueError("Parquet export needs the pyarrow package")
+        super().__init__(fp)
+        self.files = {}
+        self.pending = {}
+
+    def write(self, check, finding):
+        pending = self.pending.setdefault(check, [])
+        pending.append(as_record(SCHEMAS[check], finding))
+        if len(pending) >= EXPORT_BATCH:
+            self.flush(check)
+
+    def flush(self, check):
+        record_type = SCHEMAS[check]
+        hints = typing.get_type_hints(record_type)
+        if check not in self.files:
+            schema = pyarrow.schema([(name, arrow_type(hints[name])) for name in record_type._fields])
+            tmp = tempfile.TemporaryFile()
+            self.files[check] = (tmp, pyarrow.parquet.ParquetWriter(tmp, schema))
+        tmp, writer = self.files[check]
+        rows = self.pending.pop(check)
+        # ✅ Row tuples are transposed into columns once per row group
+        columns = {name: list(map(convert(hints[name]), values))
+                   for name, values in zip(record_type._fields, zip(*rows))}
+        writer.write_table(pyarrow.Table.from_pydict(columns, schema=writer.schema))
+
+    def close(self):
+        for check in list(self.pending):
+            self.flush(check)
+        with zipfile.ZipFile(self.fp, "w", zipfile.ZIP_STORED) as archive:
+            for check, (tmp, writer) in self.files.items():
+                writer.close()
+                tmp.seek(0)
+                with archive.open(f"{check}.parquet", "w") as out:
+                    shutil.copyfileobj(tmp, out)
+                tmp.close()
+            status = pyarrow.table({
+                name: pyarrow.array([None if row[i] is None else str(row[i]) for row in self.statuses],
+                                    pyarrow.string())
+                for i, name in enumerate(STATUS_COLUMNS)})
+            buffer = io.BytesIO()
+            pyarrow.parquet.write_table(status, buffer)
+            archive.writestr("status.parquet", buffer.getvalue())
+
+
+FORMATS = {"csv": CsvExport, "xlsx": XlsxExport, "parquet": ParquetExport}
+
+
+def writer(fmt, fp):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}. Available: {', '.join(FORMATS)}")
+    return FORMATS[fmt](fp)
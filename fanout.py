@@ -0,0 +1,88 @@
+"""
+Bounded concurrent fetching for per-resource sub-requests.
+
+Checks such as the load balancer and bucket audits issue one or more API calls
+per listed resource. ``fetch_all`` runs those calls on a small thread pool, and
+``FetchOnce`` makes sure an object shared by many resources (an SSL certificate,
+a Cloud Armor policy, a URL map) is fetched only once per scan.
+
+Every call shares one long-lived pool of ``FANOUT_POOL_SIZE`` threads, so the
+per-thread HTTP connections in gcp_clients are reused from page to page and
+the number of threads stays bounded however many checks run at once. When the
+pool is fully busy the caller works through the items itself, which also keeps
+nested calls from waiting on each other.
+"""
+import contextvars
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+FANOUT_WORKERS = int(os.getenv("FANOUT_WORKERS", "16"))  # concurrent sub-requests per call
+FANOUT_POOL_SIZE = int(os.getenv("FANOUT_POOL_SIZE", "64"))  # threads shared by every call
+
+_pool = ThreadPoolExecutor(max_workers=FANOUT_POOL_SIZE, thread_name_prefix="fanout")
+# One slot per pool thread: a task is only submitted when a thread is free to run it
+_slots = threading.BoundedSemaphore(FANOUT_POOL_SIZE)
+
+
+def fetch_all(fn, items, max_workers=None):
+    """Return ``[fn(item) for item in items]``, computed on the shared pool and the calling thread."""
+    items = list(items)
+    lanes = min(max_workers or FANOUT_WORKERS, len(items))
+    if lanes <= 1:
+        return [fn(item) for item in items]
+
+    results = [None] * len(items)
+    errors = {}
+    remaining = iter(range(len(items)))
+    lock = threading.Lock()
+    # Each item runs in a copy of the caller's context so telemetry keeps the check attribution
+    context = contextvars.copy_context()
+
+    def lane():
+        while True:
+            with lock:
+                i = next(remaining, None)
+            if i is None:
+                return
+            try:
+                results[i] = context.copy().run(fn, items[i])
+            except Exception as e:
+                errors[i] = e
+
+    futures = []
+    for _ in range(lanes - 1):
+        if not _slots.acquire(blocking=False):
+            break
+        future = _pool.submit(lane)
+        future.add_done_callback(lambda _: _slots.release())
+        futures.append(future)
+    lane()
+    for future in futures:
+        future.result()
+    if errors:
+        raise errors[min(errors)]
+    return results
+
+
+class FetchOnce:
+    """Memoize ``fn(key)`` for one scan; concurrent callers of the same key share one fetch."""
+
+    def __init__(self, fn):
+        self.fn = fn
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+
+        if owner:
+            try:
+                future.set_result(self.fn(key))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
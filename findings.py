@@ -0,0 +1,123 @@
+"""
+Typed finding records.
+
+Every check yields one record type. Records are ``NamedTuple`` classes: tuple
+subclasses with ``__slots__ = ()``, so a finding costs one fixed-size tuple
+(no per-instance dict, no over-allocated list) and still serializes to the
+same JSON array as before. ``SCHEMAS`` maps each check to its record type;
+the API's column listing and the exporters in export.py read their column
+names and types from it.
+
+Error rows use the first column for the message and leave the rest empty.
+"""
+from typing import List, NamedTuple, Optional, Union
+
+
+class ComputePublicIp(NamedTuple):
+    name: str
+    zone: str
+    ip: str
+
+
+class VmPublicIp(NamedTuple):
+    vm_name: str
+    zone: str
+    public_ip: str
+
+
+class SqlPublicIp(NamedTuple):
+    name: str
+    ip: str
+
+
+class GkeCluster(NamedTuple):
+    name: str
+    endpoint: str
+
+
+class OwnerServiceAccount(NamedTuple):
+    member: str
+    role: str
+
+
+class PublicBucket(NamedTuple):
+    bucket: str
+    role: str
+    member: str
+
+
+class LoadBalancer(NamedTuple):
+    name: str
+    scheme: str
+    ip: str
+    ssl_policy: str
+    ssl_cert_status: str
+    https_redirect: str
+    cloud_armor_policy: str
+    armor_rule_strength: str
+    internal_exposure: str
+
+
+class FirewallRule(NamedTuple):
+    name: str
+    direction: Optional[str] = None
+    protocols: List[str] = ()
+    source_ranges: List[str] = ()
+    network: Optional[str] = None
+    priority: Optional[int] = None
+    disabled: Optional[bool] = None
+    public_addresses: Optional[int] = None
+    exposed_ports: List[int] = ()
+    targets: Union[List[str], str] = ()  # tags and service accounts, or "All instances"
+
+
+class FirewallExposure(NamedTuple):
+    instance: str
+    zone: str
+    external_ips: List[str]
+    port: int
+    public_addresses: int
+    internet_v6: bool
+    rules: List[str]
+
+
+class ServerlessService(NamedTuple):
+    kind: str
+    name: str
+    region: str = ""
+    runtime: str = ""
+    trigger: str = ""
+    url: str = ""
+    ingress: str = ""
+    auth: str = ""
+    service_account: str = ""
+    unauthenticated: str = ""
+    exposure_risk: str = ""
+    recommendation: str = ""
+
+
+SCHEMAS = {
+    "compute_public_ips": ComputePublicIp,
+    "sql_public_ips": SqlPublicIp,
+    "gke_clusters": GkeCluster,
+    "owner_service_accounts": OwnerServiceAccount,
+    "public_buckets": PublicBucket,
+    "load_balancers": LoadBalancer,
+    "firewall_rules": FirewallRule,
+    "firewall_exposure": FirewallExposure,
+    "cloud_functions_and_run": ServerlessService,
+    "vm_audit": VmPublicIp,
+}
+
+
+def columns(check):
+    return list(SCHEMAS[check]._fields)
+
+
+def as_record(record_type, value):
+    """A record from a stored row (list) or a verdict cached before records existed (dict)."""
+    if isinstance(value, record_type):
+        return value
+    if isinstance(value, dict):
+        return record_type(**value)
+    return record_type(*value)
@@ -0,0 +1,411 @@
+"""
+Bulk analysis of a project's ingress firewall rules.
+
+``FirewallEngine`` compiles every rule once into flat integer arrays (stdlib
+``array``, one CSR-style offsets array per variable-length field):
+
+- the part of the rule's source ranges that is public internet address space,
+  as merged ``[lo, hi]`` IPv4 intervals (IPv6 ranges are kept alongside);
+- the (protocol, first port, last port) intervals it allows or denies;
+- its priority, action, network and target tags / service accounts.
+
+Queries then run over those arrays instead of re-parsing rules:
+
+- ``public_addresses(i)``: how much of the internet a rule admits, so
+  ``0.0.0.0/1`` + ``128.0.0.0/1`` counts the same as ``0.0.0.0/0``;
+- ``rules_exposing(ports)``: allow rules open to the internet on each port,
+  highest precedence first;
+- ``exposed_instances(instances, ports)``: for every VM with an external IP,
+  the public sources that actually reach each port after GCP's rule order
+  (lower priority number first, deny before allow at the same priority).
+"""
+import heapq
+import ipaddress
+import os
+from array import array
+from bisect import bisect_right
+
+# Ports that should never be reachable from the internet
+SENSITIVE_PORTS = tuple(int(p) for p in os.getenv(
+    "FIREWALL_SENSITIVE_PORTS",
+    "21,22,23,25,445,1433,1521,2375,2379,3306,3389,5432,5601,5900,6379,9200,11211,27017").split(","))
+
+# A rule admitting at least this many public IPv4 addresses counts as open to the internet
+BROAD_PUBLIC_ADDRESSES = int(os.getenv("FIREWALL_BROAD_PUBLIC_ADDRESSES", str(2 ** 16)))
+
+PROTOCOLS = {"tcp": 6, "udp": 17, "icmp": 1, "esp": 50, "ah": 51, "sctp": 132, "ipip": 4}
+ALL_PROTOCOLS = 256  # IPProtocol "all"
+MAX_PORT = 65535
+IPV4_MAX = 2 ** 32 - 1
+
+# IPv4 space that is not routable from the internet
+NON_PUBLIC_V4 = (
+    "0.0.0.0/8", "10.0.0.0/8", "100.64.0.0/10", "127.0.0.0/8", "169.254.0.0/16",
+    "172.16.0.0/12", "192.0.0.0/24", "192.168.0.0/16", "198.18.0.0/15", "224.0.0.0/4", "240.0.0.0/4",
+)
+GLOBAL_UNICAST_V6 = "2000::/3"
+
+
+# ----------------- Interval Helpers -----------------
+# Interval lists are sorted, non-overlapping, inclusive [lo, hi] pairs.
+def cidr_interval(cidr):
+    net = ipaddress.ip_network(cidr.strip(), strict=False)
+    return int(net.network_address), int(net.broadcast_address), net.version
+
+
+def merge(intervals):
+    merged = []
+    for lo, hi in sorted(intervals):
+        if merged and lo <= merged[-1][1] + 1:
+            if hi > merged[-1][1]:
+                merged[-1][1] = hi
+        else:
+            merged.append([lo, hi])
+    return [(lo, hi) for lo, hi in merged]
+
+
+def intersect(a, b):
+    out, i, j = [], 0, 0
+    while i < len(a) and j < len(b):
+        lo, hi = max(a[i][0], b[j][0]), min(a[i][1], b[j][1])
+        if lo <= hi:
+            out.append((lo, hi))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return out
+
+
+def subtract(a, b):
+    out, j = [], 0
+    for lo, hi in a:
+        while j < len(b) and b[j][1] < lo:
+            j += 1
+        k = j
+        while k < len(b) and b[k][0] <= hi:
+            if b[k][0] > lo:
+                out.append((lo, b[k][0] - 1))
+            lo = max(lo, b[k][1] + 1)
+            k += 1
+        if lo <= hi:
+            out.append((lo, hi))
+    return out
+
+
+def size(intervals):
+    return sum(hi - lo + 1 for lo, hi in intervals)
+
+
+def first_match(intervals):
+    """
+    ``(lo, hi, rank)`` segments of the union of ``(lo, hi, rank)`` intervals, each labelled with
+    the lowest rank covering it: one sort and a heap sweep instead of pairwise set arithmetic.
+    """
+    intervals = sorted(intervals)
+    segments, heap, j, n = [], [], 0, len(intervals)
+    pos = intervals[0][0] if intervals else 0
+    while j < n or heap:
+        if not heap:
+            pos = max(pos, intervals[j][0])
+        while j < n and intervals[j][0] <= pos:
+            heapq.heappush(heap, (intervals[j][2], intervals[j][1]))
+            j += 1
+        while heap and heap[0][1] < pos:
+            heapq.heappop(heap)
+        if not heap:
+            continue
+        rank, end = heap[0]
+        if j < n and intervals[j][0] <= end:
+            end = intervals[j][0] - 1
+        segments.append((pos, end, rank))
+        pos = end + 1
+    return segments
+
+
+PUBLIC_V4 = subtract([(0, IPV4_MAX)], merge(cidr_interval(c)[:2] for c in NON_PUBLIC_V4))
+PUBLIC_V6 = [cidr_interval(GLOBAL_UNICAST_V6)[:2]]
+
+
+def network_key(url):
+    """``projects/p/global/networks/n`` for a full or partial network URL."""
+    url = url or ""
+    at = url.find("projects/")
+    return url[at:] if at >= 0 else url
+
+
+def port_intervals(entry):
+    """``(protocol, lo, hi)`` triples for one ``allowed`` / ``denied`` entry."""
+    name = str(entry.get("IPProtocol", "all")).lower()
+    proto = ALL_PROTOCOLS if name == "all" else PROTOCOLS.get(name, int(name) if name.isdigit() else -1)
+    if proto < 0:
+        return []
+    ports = entry.get("ports") or []
+    if proto == ALL_PROTOCOLS or not ports:
+        return [(proto, 0, MAX_PORT)]
+    out = []
+    for spec in ports:
+        lo, _, hi = str(spec).partition("-")
+        out.append((proto, int(lo), int(hi or lo)))
+    return out
+
+
+# ----------------- Engine -----------------
+class FirewallEngine:
+    """Ingress firewall rules of one or more VPC networks, compiled for bulk queries."""
+
+    def __init__(self, rules):
+        self.names = []
+        self.rules = []
+        self._interned = {}
+
+        self.priority = array("l")
+        self.deny = array("b")
+        self.disabled = array("b")
+        self.network = array("l")
+        self.public = array("Q")  # public IPv4 addresses admitted
+
+        self.src_offsets = array("L", [0])
+        self.src_lo = array("Q")
+        self.src_hi = array("Q")
+        self.src6 = []  # public IPv6 intervals per rule (rare; Python ints)
+
+        self.port_offsets = array("L", [0])
+        self.port_proto = array("H")
+        self.port_lo = array("H")
+        self.port_hi = array("H")
+
+        self.tag_offsets = array("L", [0])
+        self.tags = array("l")
+        self.sa_offsets = array("L", [0])
+        self.service_accounts = array("l")
+
+        for rule in rules:
+            if rule.get("direction", "INGRESS") == "INGRESS":
+                self._add(rule)
+
+        self._index_ports()
+        self._index_targets()
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, value):
+        return self._interned.setdefault(value, len(self._interned))
+
+    def _add(self, rule):
+        v4, v6 = [], []
+        for cidr in rule.get("sourceRanges", []):
+            try:
+                lo, hi, version = cidr_interval(cidr)
+            except ValueError:
+                continue
+            (v4 if version == 4 else v6).append((lo, hi))
+        public = intersect(merge(v4), PUBLIC_V4)
+        public6 = intersect(merge(v6), PUBLIC_V6)
+
+        denied = "denied" in rule
+        ports = [p for entry in rule.get("denied" if denied else "allowed", []) for p in port_intervals(entry)]
+
+        self.names.append(rule.get("name", ""))
+        self.rules.append(rule)
+        self.priority.append(int(rule.get("priority", 1000)))
+        self.deny.append(denied)
+        self.disabled.append(bool(rule.get("disabled", False)))
+        self.network.append(self.intern(network_key(rule.get("network"))))
+        self.public.append(size(public))
+
+        for lo, hi in public:
+            self.src_lo.append(lo)
+            self.src_hi.append(hi)
+        self.src_offsets.append(len(self.src_lo))
+        self.src6.append(public6)
+
+        for proto, lo, hi in ports:
+            self.port_proto.append(proto)
+            self.port_lo.append(lo)
+            self.port_hi.append(hi)
+        self.port_offsets.append(len(self.port_proto))
+
+        self.tags.extend(self.intern(("tag", t)) for t in rule.get("targetTags", []))
+        self.tag_offsets.append(len(self.tags))
+        self.service_accounts.extend(self.intern(("sa", s)) for s in rule.get("targetServiceAccounts", []))
+        self.sa_offsets.append(len(self.service_accounts))
+
+    def _index_ports(self):
+        """Per protocol: rules open on every port, and the other port intervals sorted by first port."""
+        self._any_port = {}
+        self._ranges = {}
+        for i in range(len(self.names)):
+            for k in range(self.port_offsets[i], self.port_offsets[i + 1]):
+                proto, lo, hi = self.port_proto[k], self.port_lo[k], self.port_hi[k]
+                if lo == 0 and hi == MAX_PORT:
+                    self._any_port.setdefault(proto, set()).add(i)
+                else:
+                    self._ranges.setdefault(proto, []).append((lo, hi, i))
+        for proto, entries in self._ranges.items():
+            entries.sort()
+            self._ranges[proto] = (array("H", [e[0] for e in entries]),
+                                   array("H", [e[1] for e in entries]),
+                                   array("L", [e[2] for e in entries]))
+
+    def _index_targets(self):
+        """Rule indexes per network for untargeted rules, and per (network, tag or service account)."""
+        self._untargeted = {}
+        self._targeted = {}
+        for i in range(len(self.names)):
+            network = self.network[i]
+            targets = (list(self.tags[self.tag_offsets[i]:self.tag_offsets[i + 1]])
+                       + list(self.service_accounts[self.sa_offsets[i]:self.sa_offsets[i + 1]]))
+            if not targets:
+                self._untargeted.setdefault(network, []).append(i)
+            for target in targets:
+                self._targeted.setdefault((network, target), []).append(i)
+
+    # ----------------- Rule Queries -----------------
+    def public_intervals(self, i):
+        return list(zip(self.src_lo[self.src_offsets[i]:self.src_offsets[i + 1]],
+                        self.src_hi[self.src_offsets[i]:self.src_offsets[i + 1]]))
+
+    def public_addresses(self, i):
+        return self.public[i]
+
+    def is_open_to_internet(self, i):
+        return self.public[i] >= BROAD_PUBLIC_ADDRESSES or bool(self.src6[i])
+
+    def rules_covering(self, port, protocol="tcp"):
+        """Indexes of the rules (allow or deny, enabled or not) whose ports include ``port``."""
+        proto = PROTOCOLS.get(protocol, protocol)
+        found = set(self._any_port.get(ALL_PROTOCOLS, ())) | self._any_port.get(proto, set())
+        for key in (proto, ALL_PROTOCOLS):
+            if key not in self._ranges:
+                continue
+            lo, hi, rule = self._ranges[key]
+            end = bisect_right(lo, port)
+            found.update(rule[k] for k in range(end) if hi[k] >= port)
+        return found
+
+    def exposed_ports(self, i, ports=SENSITIVE_PORTS, protocol="tcp"):
+        """Which of ``ports`` rule ``i`` allows or denies for ``protocol``."""
+        proto = PROTOCOLS.get(protocol, protocol)
+        hits = []
+        for port in ports:
+            for k in range(self.port_offsets[i], self.port_offsets[i + 1]):
+                if self.port_proto[k] in (proto, ALL_PROTOCOLS) and self.port_lo[k] <= port <= self.port_hi[k]:
+                    hits.append(port)
+                    break
+        return hits
+
+    def targets(self, i):
+        names = {v: k for k, v in self._interned.items()}
+        tags = [names[t][1] for t in self.tags[self.tag_offsets[i]:self.tag_offsets[i + 1]]]
+        sas = [names[s][1] for s in self.service_accounts[self.sa_offsets[i]:self.sa_offsets[i + 1]]]
+        return tags, sas
+
+    def rules_exposing(self, ports=SENSITIVE_PORTS, protocol="tcp", min_public=BROAD_PUBLIC_ADDRESSES):
+        """``{port: [rule index, ...]}``: enabled allow rules admitting the internet, by precedence."""
+        exposing = {}
+        for port in ports:
+            hits = [i for i in self.rules_covering(port, protocol)
+                    if not self.deny[i] and not self.disabled[i]
+                    and (self.public[i] >= min_public or self.src6[i])]
+            exposing[port] = sorted(hits, key=lambda i: self.priority[i])
+        return exposing
+
+    # ----------------- Instance Queries -----------------
+    def first_match_segments(self, rules, rank, port_rules):
+        """
+        ``first_match`` over the public sources of ``rules`` that cover the port (``port_rules``),
+        labelled with their ``rank`` in evaluation order. IPv6 intervals sit far above the IPv4
+        range, so both families share one sweep.
+        """
+        intervals = []
+        for i in rules:
+            if i not in port_rules or i not in rank:
+                continue
+            r = rank[i]
+            for k in range(self.src_offsets[i], self.src_offsets[i + 1]):
+                intervals.append((self.src_lo[k], self.src_hi[k], r))
+            if self.src6[i]:
+                intervals.extend((lo, hi, r) for lo, hi in self.src6[i])
+        return first_match(intervals)
+
+    def exposure(self, segments, order):
+        """
+        ``(public IPv4 addresses, internet IPv6, [allowing rule indexes], [allowed IPv4 intervals])``
+        of first-match segments.
+        """
+        public, public6, allowing, allowed = 0, False, set(), []
+        for lo, hi, r in segments:
+            if self.deny[order[r]]:
+                continue
+            if lo > IPV4_MAX:
+                public6 = True
+            else:
+                public += hi - lo + 1
+                allowed.append((lo, hi))
+            allowing.add(r)
+        return public, public6, [order[r] for r in sorted(allowing)], allowed
+
+    def exposed_instances(self, instances, ports=SENSITIVE_PORTS, protocol="tcp"):
+        """
+        Yield ``(instance, port, public IPv4 addresses, internet IPv6, [allowing rule indexes])`` for
+        every instance with an external IP whose ``port`` is reachable from the internet, once per
+        instance and port: the sources admitted through each external interface are combined.
+
+        Each source address is decided by the first rule matching it, so deny rules only mask
+        allow rules evaluated after them. The first match over a union of rule groups is the
+        first match over each group's own first-match segments, so the segments of every rule
+        group (a network's untargeted rules, or its rules for one tag / service account) are
+        computed once per port and then combined per distinct (network, tags, service accounts).
+        """
+        covering = {port: self.rules_covering(port, protocol) for port in ports}
+        # Rules whose sources are all private can neither expose nor shield anything from the internet
+        relevant = [i for i in set().union(*covering.values())
+                    if not self.disabled[i] and (self.public[i] or self.src6[i])]
+        # Evaluation order: lower priority number first, deny before allow on a tie
+        order = sorted(relevant, key=lambda i: (self.priority[i], not self.deny[i]))
+        rank = {i: r for r, i in enumerate(order)}
+        groups = {}
+        verdicts = {}
+
+        def group_segments(key, port):
+            if (key, port) not in groups:
+                rules = self._untargeted.get(key[0], ()) if key[1] is None else self._targeted.get(key, ())
+                groups[key, port] = self.first_match_segments(rules, rank, covering[port])
+            return groups[key, port]
+
+        for instance in instances:
+            tags = frozenset(self._interned.get(("tag", t), -1) for t in instance.get("tags", {}).get("items", []))
+            sas = frozenset(self._interned.get(("sa", s.get("email")), -1) for s in instance.get("serviceAccounts", []))
+            exposed = {}  # port -> verdicts of the instance's exposed interfaces
+            for nic in instance.get("networkInterfaces", []):
+                if not any("natIP" in ac for ac in nic.get("accessConfigs", [])):
+                    continue  # only interfaces with an external IP are reachable from the internet
+                network = self._interned.get(network_key(nic.get("network")), -1)
+                signature = (network, tags, sas)
+                if signature not in verdicts:
+                    keys = [(network, None)] + [(network, t) for t in tags | sas if (network, t) in self._targeted]
+                    verdicts[signature] = {}
+                    for port in ports:
+                        parts = [group_segments(key, port) for key in keys]
+                        segments = parts[0] if len(parts) == 1 else first_match([s for p in parts for s in p])
+                        verdicts[signature][port] = self.exposure(segments, order)
+                for port, verdict in verdicts[signature].items():
+                    if verdict[2]:
+                        exposed.setdefault(port, []).append(verdict)
+
+            for port, found in exposed.items():
+                if len(found) == 1:
+                    public, public6, allowing, _ = found[0]
+                else:
+                    # ✅ Interfaces on different networks admit different sources: count their union once
+                    public = sum(hi - lo + 1 for lo, hi in merge(s for verdict in found for s in verdict[3]))
+                    public6 = any(verdict[1] for verdict in found)
+                    allowing = sorted({i for verdict in found for i in verdict[2]}, key=rank.__getitem__)
+                yield instance, port, public, public6, allowing
+
+
+def instance_external_ips(instance):
+    return [ac["natIP"] for nic in instance.get("networkInterfaces", [])
+            for ac in nic.get("accessConfigs", []) if "natIP" in ac]
@@ -0,0 +1,206 @@
+"""
+Shared factory for Google API discovery clients.
+
+Discovery documents are the copies bundled with google-api-python-client, so
+building a client never fetches anything over the network. Each is parsed once
+per process (``discovery_document``) and every client of that API is built from
+the parsed copy, so a new service account no longer pays for parsing the whole
+document (60-90 ms for compute). Clients themselves are cached keyed by (api,
+version, credentials object) in a bounded LRU with a TTL. credentials_cache hands
+out one object per uploaded key, private key included, so two uploads share
+clients only if they hold the same key.
+
+httplib2 connections are not thread-safe, so requests made through a cached
+client execute on a per-thread connection pool instead of the client's own.
+Every request goes through api_exec for rate limiting and retries, and its
+latency, size, retries and outcome are recorded per API method in telemetry.
+
+googleapiclient and httplib2 are imported on first use (``preload()`` does it
+ahead of time, and can parse the documents too), which keeps them out of the
+server's cold-start import time.
+"""
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import api_exec
+import telemetry
+
+CLIENT_CACHE_SIZE = int(os.getenv("CLIENT_CACHE_SIZE", "64"))
+CLIENT_CACHE_TTL = int(os.getenv("CLIENT_CACHE_TTL", "3600"))  # seconds
+HTTP_TIMEOUT = int(os.getenv("HTTP_TIMEOUT", "60"))  # seconds
+
+_clients = OrderedDict()
+_clients_lock = threading.Lock()
+_local = threading.local()
+_request_class = None
+_request_class_lock = threading.Lock()
+_documents = {}  # (api, version) -> parsed discovery document
+_documents_lock = threading.Lock()
+
+# Optional ``factory(api, version, creds)`` replacing discovery clients in this context
+_override = contextvars.ContextVar("client_override", default=None)
+
+
+def thread_http(creds):
+    """Authorized HTTP for ``creds`` on top of this thread's pooled connections."""
+    import google_auth_httplib2
+    import httplib2
+
+    pool = getattr(_local, "http", None)
+    if pool is None:
+        pool = _local.http = httplib2.Http(timeout=HTTP_TIMEOUT)
+    return google_auth_httplib2.AuthorizedHttp(creds, http=pool)
+
+
+class PooledRequest:
+    """HttpRequest mixin that executes on the calling thread's connection pool, through api_exec."""
+
+    api = None
+    credentials = None
+
+    def execute(self, http=None, num_retries=0):
+        if http is None and self.credentials is not None:
+            http = thread_http(self.credentials)
+        send = super().execute
+        postproc = self.postproc
+        received = [0]
+        attempts = [0]
+
+        def measured(resp, content):
+            # Bytes received and JSON parse time, attributed to the running check
+            start = time.perf_counter()
+            result = postproc(resp, content)
+            received[0] += len(content or b"")
+            telemetry.record_response(len(content or b""), time.perf_counter() - start)
+            return result
+
+        def attempt():
+            attempts[0] += 1
+            return send(http=http)
+
+        self.postproc = measured
+        start = time.perf_counter()
+        error = None
+        try:
+            return api_exec.execute(self.api, self.uri, attempt)
+        except Exception as e:
+            error = getattr(getattr(e, "resp", None), "status", None) or type(e).__name__
+            raise
+        finally:
+            self.postproc = postproc
+            telemetry.record_call(self.api, self.methodId, time.perf_counter() - start,
+                                  received[0], max(0, attempts[0] - 1), error)
+
+
+def pooled_request_class():
+    """``PooledRequest`` over googleapiclient's ``HttpRequest``, created on first use."""
+    global _request_class
+    if _request_class is None:
+        with _request_class_lock:
+            if _request_class is None:
+                from googleapiclient.http import HttpRequest
+                _request_class = type("PooledHttpRequest", (PooledRequest, HttpRequest), {})
+    return _request_class
+
+
+def discovery_document(api, version):
+    """
+    The bundled discovery document of ``api``/``version``, parsed once and shared by
+    its clients. The fix-ups discovery applies to a document's method descriptions
+    only ever add the same keys, so sharing it between threads is safe.
+    """
+    key = (api, version)
+    document = _documents.get(key)
+    if document is None:
+        from googleapiclient import discovery_cache
+        from googleapiclient.errors import UnknownApiNameOrVersion
+
+        with _documents_lock:
+            document = _documents.get(key)
+            if document is None:
+                content = discovery_cache.get_static_doc(api, version)
+                if content is None:
+                    raise UnknownApiNameOrVersion(f"name: {api}  version: {version}")
+                document = _documents[key] = json.loads(content)
+    return document
+
+
+def preload(apis=()):
+    """
+    Import the client and transport libraries now instead of on the first request,
+    and parse the discovery documents of ``apis`` (``(api, version)`` pairs).
+    """
+    import google_auth_httplib2  # noqa: F401
+    import httplib2  # noqa: F401
+    from googleapiclient import discovery  # noqa: F401
+    pooled_request_class()
+    for api, version in apis:
+        discovery_document(api, version)
+
+
+def _request_builder(api, creds):
+    request_class = pooled_request_class()
+
+    def build_request(http, *args, **kwargs):
+        request = request_class(http, *args, **kwargs)
+        request.api = api
+        request.credentials = creds
+        return request
+    return build_request
+
+
+def _build(api, version, creds):
+    from googleapiclient import discovery
+
+    return discovery.build_from_document(
+        discovery_document(api, version),
+        credentials=creds,
+        requestBuilder=_request_builder(api, creds),
+    )
+
+
+@contextlib.contextmanager
+def client_override(factory):
+    """Make ``get_client`` return ``factory(api, version, creds)`` within this context."""
+    token = _override.set(factory)
+    try:
+        yield
+    finally:
+        _override.reset(token)
+
+
+def get_client(api, version, creds):
+    """Return a cached discovery client for ``api``/``version`` bound to ``creds``."""
+    override = _override.get()
+    if override is not None:
+        return override(api, version, creds)
+
+    # ✅ The object, not its public identifiers: a forged key file with a copied
+    # client_email and private_key_id must never get the real key's client
+    key = (api, version, creds)
+    now = time.monotonic()
+
+    with _clients_lock:
+        entry = _clients.get(key)
+        if entry is not None and now - entry[1] < CLIENT_CACHE_TTL:
+            _clients.move_to_end(key)
+            return entry[0]
+
+    client = _build(api, version, creds)
+
+    with _clients_lock:
+        _clients[key] = (client, now)
+        _clients.move_to_end(key)
+        while len(_clients) > CLIENT_CACHE_SIZE:
+            _clients.popitem(last=False)
+    return client
+
+
+def clear_clients():
+    with _clients_lock:
+        _clients.clear()
@@ -0,0 +1,476 @@
+"""
+Inventory snapshots (SQLite).
+
+``collect(creds, project)`` lists every resource the checks read — once, with
+full resources, and with the per-resource IAM policies — and stores them as a
+snapshot. Every resource row is indexed by snapshot and type, and its IP
+addresses, VPC network and network tags go into side tables, so questions
+such as "what owns 34.1.2.3" or "which VMs carry tag web" are indexed lookups
+(``InventoryStore.find``) instead of fresh scans.
+
+Inside ``snapshot_scope(snapshot_id)`` gcp_clients hands out ``ReplayClient``
+objects instead of discovery clients. They answer the same list / get /
+getIamPolicy calls the checks already make from the snapshot, so every check
+in audit_checks runs unchanged against a snapshot, with no API calls. A
+collection that failed while the snapshot was taken (API disabled, missing
+permission) fails the same way on replay.
+
+``INVENTORY_PATH`` picks the database file; the last ``INVENTORY_RETENTION``
+snapshots per project are kept. Snapshots hold full resource bodies and IAM
+policies, so the file is created private to the server's user (see
+sqlite_store) and one that others could read or plant is refused.
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+import gcp_clients
+from fanout import fetch_all
+from firewall_engine import network_key
+from pagination import iter_pages, token_pager
+from sqlite_store import DATA_DIR, SqliteStore, private_database
+
+INVENTORY_PATH = os.getenv("INVENTORY_PATH") or os.path.join(DATA_DIR, "inventory.sqlite3")
+INVENTORY_RETENTION = int(os.getenv("INVENTORY_RETENTION", "5"))  # snapshots per project
+PAGE_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    snapshot_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project TEXT NOT NULL,
+    taken_at REAL NOT NULL,
+    elapsed_ms REAL
+);
+CREATE TABLE IF NOT EXISTS collections (
+    snapshot_id INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    status INTEGER,
+    error TEXT,
+    PRIMARY KEY (snapshot_id, type)
+);
+CREATE TABLE IF NOT EXISTS resources (
+    resource_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    snapshot_id INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    name TEXT NOT NULL,
+    scope TEXT,
+    network TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS resources_by_type ON resources (snapshot_id, type, name);
+CREATE INDEX IF NOT EXISTS resources_by_network ON resources (snapshot_id, network);
+CREATE TABLE IF NOT EXISTS resource_ips (
+    snapshot_id INTEGER NOT NULL,
+    ip TEXT NOT NULL,
+    resource_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ips_by_ip ON resource_ips (snapshot_id, ip);
+CREATE TABLE IF NOT EXISTS resource_tags (
+    snapshot_id INTEGER NOT NULL,
+    tag TEXT NOT NULL,
+    resource_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tags_by_tag ON resource_tags (snapshot_id, tag);
+"""
+
+# (api, method) -> (resource type, key holding the items, aggregatedList?)
+LISTS = {
+    ("compute", "instances.aggregatedList"): ("compute.instances", "instances", True),
+    ("compute", "forwardingRules.aggregatedList"): ("compute.forwardingRules", "forwardingRules", True),
+    ("compute", "firewalls.list"): ("compute.firewalls", "items", False),
+    ("sqladmin", "instances.list"): ("sqladmin.instances", "items", False),
+    ("container", "projects.locations.clusters.list"): ("container.clusters", "clusters", False),
+    ("storage", "buckets.list"): ("storage.buckets", "items", False),
+    ("cloudfunctions", "projects.locations.functions.list"): ("cloudfunctions.functions", "functions", False),
+    ("run", "projects.locations.services.list"): ("run.services", "items", False),
+}
+
+# (api, method) -> (resource type, request parameter naming the resource)
+GETS = {
+    ("compute", "targetHttpsProxies.get"): ("compute.targetHttpsProxies", "targetHttpsProxy"),
+    ("compute", "targetHttpProxies.get"): ("compute.targetHttpProxies", "targetHttpProxy"),
+    ("compute", "sslCertificates.get"): ("compute.sslCertificates", "sslCertificate"),
+    ("compute", "securityPolicies.get"): ("compute.securityPolicies", "securityPolicy"),
+    ("compute", "urlMaps.get"): ("compute.urlMaps", "urlMap"),
+    ("storage", "buckets.getIamPolicy"): ("storage.bucketIamPolicies", "bucket"),
+    ("run", "projects.locations.services.getIamPolicy"): ("run.serviceIamPolicies", "resource"),
+    ("cloudresourcemanager", "projects.getIamPolicy"): ("cloudresourcemanager.projectIamPolicies", "resource"),
+}
+
+
+# ----------------- Indexed Attributes -----------------
+def resource_ips(kind, data):
+    if kind == "compute.instances":
+        return [ip for nic in data.get("networkInterfaces", [])
+                for ip in [nic.get("networkIP")] + [ac.get("natIP") for ac in nic.get("accessConfigs", [])] if ip]
+    if kind == "compute.forwardingRules":
+        return [data["IPAddress"]] if data.get("IPAddress") else []
+    if kind == "sqladmin.instances":
+        return [ip["ipAddress"] for ip in data.get("ipAddresses", []) if ip.get("ipAddress")]
+    if kind == "container.clusters":
+        return [data["endpoint"]] if data.get("endpoint") else []
+    return []
+
+
+def resource_network(kind, data):
+    if kind == "compute.instances":
+        nics = data.get("networkInterfaces", [])
+        return network_key(nics[0].get("network")) if nics else None
+    if kind in ("compute.forwardingRules", "compute.firewalls", "container.clusters"):
+        return network_key(data.get("network")) if data.get("network") else None
+    return None
+
+
+def resource_tags(kind, data):
+    if kind == "compute.instances":
+        return data.get("tags", {}).get("items", [])
+    if kind == "compute.firewalls":
+        return data.get("targetTags", [])
+    return []
+
+
+def resource_name(data):
+    return data.get("name") or data.get("metadata", {}).get("name") or ""
+
+
+# ----------------- Store -----------------
+class InventoryStore(SqliteStore):
+    def __init__(self, path, retention=INVENTORY_RETENTION):
+        private_database(path)
+        super().__init__(path)
+        self.retention = retention
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    # ----------------- Writing -----------------
+    def save(self, project, collections, elapsed_ms=None):
+        """
+        Store one snapshot. ``collections`` maps a resource type to a list of
+        ``(name, scope, data)`` tuples, or to an ``HttpError`` if listing it failed.
+        """
+        with self._conn() as conn:
+            snapshot_id = conn.execute(
+                "INSERT INTO snapshots (project, taken_at, elapsed_ms) VALUES (?, ?, ?)",
+                (project, time.time(), elapsed_ms),
+            ).lastrowid
+            for kind, rows in collections.items():
+                if isinstance(rows, Exception):
+                    conn.execute("INSERT INTO collections VALUES (?, ?, 0, ?, ?)",
+                                 (snapshot_id, kind, error_status(rows), str(rows)))
+                    continue
+                for name, scope, data in rows:
+                    resource_id = conn.execute(
+                        "INSERT INTO resources (snapshot_id, type, name, scope, network, data) VALUES (?, ?, ?, ?, ?, ?)",
+                        (snapshot_id, kind, name, scope, resource_network(kind, data), json.dumps(data)),
+                    ).lastrowid
+                    conn.executemany("INSERT INTO resource_ips VALUES (?, ?, ?)",
+                                     [(snapshot_id, ip, resource_id) for ip in resource_ips(kind, data)])
+                    conn.executemany("INSERT INTO resource_tags VALUES (?, ?, ?)",
+                                     [(snapshot_id, tag, resource_id) for tag in resource_tags(kind, data)])
+                conn.execute("INSERT INTO collections VALUES (?, ?, ?, NULL, NULL)", (snapshot_id, kind, len(rows)))
+            self._prune(conn, project)
+        return snapshot_id
+
+    def _prune(self, conn, project):
+        stale = [row[0] for row in conn.execute(
+            "SELECT snapshot_id FROM snapshots WHERE project=? ORDER BY snapshot_id DESC LIMIT -1 OFFSET ?",
+            (project, self.retention),
+        )]
+        for table in ("resource_ips", "resource_tags", "resources", "collections", "snapshots"):
+            conn.executemany(f"DELETE FROM {table} WHERE snapshot_id=?", [(s,) for s in stale])
+
+    # ----------------- Reading -----------------
+    def snapshot(self, snapshot_id):
+        row = self._conn().execute(
+            "SELECT snapshot_id, project, taken_at, elapsed_ms FROM snapshots WHERE snapshot_id=?", (snapshot_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        counts = {kind: {"count": count, "error": error} if error else count
+                  for kind, count, error in self._conn().execute(
+                      "SELECT type, count, error FROM collections WHERE snapshot_id=? ORDER BY type", (snapshot_id,))}
+        return {"snapshot_id": row[0], "project_id": row[1], "taken_at": row[2],
+                "elapsed_ms": row[3], "resources": counts}
+
+    def snapshots(self, project):
+        rows = self._conn().execute(
+            "SELECT snapshot_id FROM snapshots WHERE project=? ORDER BY snapshot_id DESC", (project,)
+        ).fetchall()
+        return [self.snapshot(row[0]) for row in rows]
+
+    def failure(self, snapshot_id, kind):
+        """``(status, message)`` if listing ``kind`` failed when the snapshot was taken."""
+        return self._conn().execute(
+            "SELECT status, error FROM collections WHERE snapshot_id=? AND type=? AND error IS NOT NULL",
+            (snapshot_id, kind),
+        ).fetchone()
+
+    def resources(self, snapshot_id, kind):
+        """``(scope, data)`` of every resource of one type."""
+        rows = self._conn().execute(
+            "SELECT scope, data FROM resources WHERE snapshot_id=? AND type=? ORDER BY resource_id",
+            (snapshot_id, kind),
+        ).fetchall()
+        return [(scope, json.loads(data)) for scope, data in rows]
+
+    def get(self, snapshot_id, kind, name):
+        row = self._conn().execute(
+            "SELECT data FROM resources WHERE snapshot_id=? AND type=? AND name=? LIMIT 1",
+            (snapshot_id, kind, name),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find(self, snapshot_id, kind=None, ip=None, network=None, tag=None, limit=1000):
+        """Resources matching every given filter, through the type / IP / network / tag indexes."""
+        sql = "SELECT r.type, r.name, r.scope, r.network, r.data FROM resources r"
+        where, params = ["r.snapshot_id=?"], [snapshot_id]
+        if ip:
+            sql += " JOIN resource_ips i ON i.resource_id = r.resource_id AND i.snapshot_id = r.snapshot_id"
+            where.append("i.ip=?")
+            params.append(ip)
+        if tag:
+            sql += " JOIN resource_tags t ON t.resource_id = r.resource_id AND t.snapshot_id = r.snapshot_id"
+            where.append("t.tag=?")
+            params.append(tag)
+        if kind:
+            where.append("r.type=?")
+            params.append(kind)
+        if network:
+            where.append("r.network=?")
+            params.append(network_key(network))
+        sql += " WHERE " + " AND ".join(where) + " ORDER BY r.resource_id LIMIT ?"
+        params.append(limit)
+        return [{"type": kind, "name": name, "scope": scope, "network": net, "data": json.loads(data)}
+                for kind, name, scope, net, data in self._conn().execute(sql, params)]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = InventoryStore(INVENTORY_PATH)
+        return _store
+
+
+def error_status(error):
+    return getattr(getattr(error, "resp", None), "status", None)
+
+
+def not_found(what, status=404, message=None):
+    import httplib2
+
+    return HttpError(httplib2.Response({"status": status}),
+                     json.dumps({"error": {"code": status, "message": message or f"{what} not in snapshot"}}).encode())
+
+
+# ----------------- Collection -----------------
+def collect(creds, project, store=None):
+    """List every resource the checks read into a new snapshot; returns its id."""
+    start = time.perf_counter()
+    compute = gcp_clients.get_client("compute", "v1", creds)
+    sqladmin = gcp_clients.get_client("sqladmin", "v1beta4", creds)
+    container = gcp_clients.get_client("container", "v1", creds)
+    storage = gcp_clients.get_client("storage", "v1", creds)
+    functions = gcp_clients.get_client("cloudfunctions", "v1", creds)
+    run = gcp_clients.get_client("run", "v1", creds)
+    crm = gcp_clients.get_client("cloudresourcemanager", "v1", creds)
+
+    def aggregated(resource, key):
+        def listing():
+            req = resource().aggregatedList(project=project, maxResults=PAGE_SIZE)
+            return [(resource_name(item), scope, item)
+                    for res in iter_pages(req, resource().aggregatedList_next)
+                    for scope, scoped in res.get("items", {}).items()
+                    for item in scoped.get(key, [])]
+        return listing
+
+    def listed(request, next_request, key="items"):
+        def listing():
+            return [(resource_name(item), None, item)
+                    for res in iter_pages(request(), next_request)
+                    for item in res.get(key, [])]
+        return listing
+
+    def run_services(**page):
+        return run.projects().locations().services().list(
+            parent=f"projects/{project}/locations/-", limit=PAGE_SIZE, **page)
+
+    listings = {
+        "compute.instances": aggregated(compute.instances, "instances"),
+        "compute.forwardingRules": aggregated(compute.forwardingRules, "forwardingRules"),
+        "compute.targetHttpsProxies": aggregated(compute.targetHttpsProxies, "targetHttpsProxies"),
+        "compute.targetHttpProxies": aggregated(compute.targetHttpProxies, "targetHttpProxies"),
+        "compute.sslCertificates": aggregated(compute.sslCertificates, "sslCertificates"),
+        "compute.urlMaps": aggregated(compute.urlMaps, "urlMaps"),
+        "compute.securityPolicies": listed(
+            lambda: compute.securityPolicies().list(project=project, maxResults=PAGE_SIZE),
+            compute.securityPolicies().list_next),
+        "compute.firewalls": listed(
+            lambda: compute.firewalls().list(project=project, maxResults=PAGE_SIZE), compute.firewalls().list_next),
+        "sqladmin.instances": listed(
+            lambda: sqladmin.instances().list(project=project, maxResults=PAGE_SIZE), sqladmin.instances().list_next),
+        "container.clusters": listed(
+            lambda: container.projects().locations().clusters().list(parent=f"projects/{project}/locations/-"),
+            lambda req, res: None, key="clusters"),
+        "storage.buckets": listed(
+            lambda: storage.buckets().list(project=project, maxResults=1000, projection="noAcl"),
+            storage.buckets().list_next),
+        "cloudfunctions.functions": listed(
+            lambda: functions.projects().locations().functions().list(
+                parent=f"projects/{project}/locations/-", pageSize=PAGE_SIZE),
+            functions.projects().locations().functions().list_next, key="functions"),
+        "run.services": listed(run_services, token_pager(run_services, token_field="metadata.continue",
+                                                         param="continue")),
+        "cloudresourcemanager.projectIamPolicies": lambda: [
+            (project, None, crm.projects().getIamPolicy(resource=project, body={}).execute())],
+    }
+
+    def attempt(listing):
+        try:
+            return listing()
+        except HttpError as e:
+            return e
+
+    # ✅ Every collection is listed concurrently
+    collections = dict(zip(listings, fetch_all(attempt, listings.values())))
+
+    # Per-resource IAM policies the bucket and Cloud Run checks read
+    def bucket_policy(bucket):
+        return storage.buckets().getIamPolicy(bucket=bucket).execute()
+
+    def service_policy(resource):
+        return run.projects().locations().services().getIamPolicy(resource=resource).execute()
+
+    policies = []
+    if not isinstance(collections["storage.buckets"], Exception):
+        policies.append(("storage.bucketIamPolicies", bucket_policy,
+                         [name for name, _, _ in collections["storage.buckets"]]))
+    if not isinstance(collections["run.services"], Exception):
+        policies.append(("run.serviceIamPolicies", service_policy, [
+            f"projects/{project}/locations/"
+            f"{data.get('metadata', {}).get('labels', {}).get('cloud.googleapis.com/location', 'global')}"
+            f"/services/{name}"
+            for name, _, data in collections["run.services"]]))
+
+    for kind, fetch, names in policies:
+        # A policy that cannot be read is left out, so the replayed getIamPolicy answers 404
+        results = fetch_all(lambda name: attempt(lambda: fetch(name)), names)
+        collections[kind] = [(name, None, policy) for name, policy in zip(names, results)
+                             if not isinstance(policy, Exception)]
+
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+    return (store or get_store()).save(project, collections, elapsed_ms)
+
+
+# ----------------- Snapshot Replay -----------------
+class SnapshotRequest:
+    def __init__(self, client, method, kwargs):
+        self.client = client
+        self.method = method
+        self.kwargs = kwargs
+
+    def execute(self, http=None, num_retries=0):
+        return self.client.answer(self.method, self.kwargs)
+
+
+class SnapshotResource:
+    def __init__(self, client, path):
+        self._client = client
+        self._path = path
+
+    def __getattr__(self, name):
+        path = f"{self._path}.{name}" if self._path else name
+        if name.endswith("_next"):
+            # A snapshot answers every list call in a single page
+            return lambda previous_request=None, previous_response=None: None
+        if (self._client.api, path) in LISTS or (self._client.api, path) in GETS:
+            return lambda **kwargs: SnapshotRequest(self._client, path, kwargs)
+        return lambda **kwargs: SnapshotResource(self._client, path)
+
+
+class ReplayClient(SnapshotResource):
+    """Stands in for a discovery client, answering from a data source.
+
+    A source has ``resources(kind)`` -> ``[(scope, data)]``, ``get(kind, name)``
+    -> data or ``None``, and ``failure(kind)`` -> ``(status, message)`` or ``None``;
+    ``SnapshotSource`` reads a stored snapshot, ``asset_export.ExportSource`` a
+    Cloud Asset export.
+    """
+
+    def __init__(self, source, api):
+        self.source = source
+        self.api = api
+        super().__init__(self, "")
+
+    def answer(self, method, kwargs):
+        if (self.api, method) in LISTS:
+            kind, key, aggregated = LISTS[self.api, method]
+            self.raise_if_failed(kind)
+            rows = self.source.resources(kind)
+            if not aggregated:
+                return {key: [data for _, data in rows]}
+            items = {}
+            for scope, data in rows:
+                items.setdefault(scope, {key: []})[key].append(data)
+            return {"items": items}
+
+        kind, param = GETS[self.api, method]
+        self.raise_if_failed(kind)
+        name = kwargs.get(param, "")
+        data = self.source.get(kind, name)
+        if data is None:
+            raise not_found(f"{kind} {name}")
+        return data
+
+    def raise_if_failed(self, kind):
+        failure = self.source.failure(kind)
+        if failure is not None:
+            raise not_found(kind, failure[0] or 500, failure[1])
+
+
+class SnapshotSource:
+    """One stored snapshot as a data source for ``ReplayClient``."""
+
+    def __init__(self, store, snapshot_id):
+        self.store = store
+        self.snapshot_id = snapshot_id
+
+    def resources(self, kind):
+        return self.store.resources(self.snapshot_id, kind)
+
+    def get(self, kind, name):
+        return self.store.get(self.snapshot_id, kind, name)
+
+    def failure(self, kind):
+        return self.store.failure(self.snapshot_id, kind)
+
+
+class SnapshotCredentials:
+    """Placeholder credentials for checks run against a snapshot or export; never used for a request."""
+
+    def __init__(self, project):
+        self.project_id = project
+
+
+@contextlib.contextmanager
+def replay_scope(source):
+    """Serve every ``get_client`` call made in this context (and its copies) from ``source``."""
+    with gcp_clients.client_override(lambda api, version, creds: ReplayClient(source, api)):
+        yield
+
+
+def snapshot_scope(snapshot_id, store=None):
+    """``replay_scope`` over a stored snapshot; raises ``ValueError`` if it does not exist."""
+    store = store or get_store()
+    if store.snapshot(snapshot_id) is None:
+        raise ValueError(f"Unknown snapshot {snapshot_id}")
+    return replay_scope(SnapshotSource(store, snapshot_id))
@@ -0,0 +1,259 @@
+"""
+Background audit jobs.
+
+``POST /jobs`` queues an audit and returns immediately; a fixed number of
+worker tasks (``AUDIT_JOB_WORKERS``) take jobs off a local queue and run them
+with audit_runner, recording each check's result on the job as soon as it
+finishes. Jobs are not tied to the submitting request, so they survive client
+disconnects, and a submission for a project and check selection that is
+already queued or running returns the existing job instead of starting a new
+one. Finished jobs are kept for ``AUDIT_JOB_RETENTION`` seconds.
+
+A job runs in the server worker process that accepted it, which publishes its
+state to shared_cache as it progresses, so with several workers (serve.py) any
+of them can report the job, and a submission that another worker is already
+running is coalesced onto that job too. Each check's result is published once,
+under its own key, when the check finishes; progress updates only carry the
+job's status and the names of the finished checks. The SQLite writes run on one
+``publish_executor`` thread, in order, never on the event loop.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import audit_runner
+import shared_cache
+
+AUDIT_JOB_WORKERS = int(os.getenv("AUDIT_JOB_WORKERS", "2"))
+AUDIT_JOB_RETENTION = int(os.getenv("AUDIT_JOB_RETENTION", "3600"))  # seconds
+# How long an unfinished job published by another worker still counts as running
+AUDIT_JOB_STALE = int(os.getenv("AUDIT_JOB_STALE", "900"))  # seconds
+
+logger = logging.getLogger(__name__)
+
+# ✅ One thread: a job's updates reach the cache in the order they were made
+publish_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-publish")
+
+
+class Job:
+    def __init__(self, creds, project, checks, timeout=None, identity=None):
+        self.id = uuid.uuid4().hex
+        self.creds = creds
+        self.identity = identity
+        self.project = project
+        self.checks = checks
+        self.timeout = timeout
+        self.status = "queued"
+        self.results = {}
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def key(self):
+        # ✅ Another key for the same project may not see what this one can, so it gets its own job
+        return (self.identity, self.project, tuple(sorted(self.checks)), self.timeout)
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "project_id": self.project,
+            "status": self.status,
+            "progress": {"completed": len(self.results), "total": len(self.checks)},
+            "checks": self.results,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+    def published_state(self):
+        # Results are published separately, once per check, under "job_checks"
+        return {**self.to_dict(), "checks": list(self.results)}
+
+
+class PublishedJob:
+    """A job run by another worker process, as it last published itself."""
+
+    def __init__(self, state, results=None):
+        self.state = state
+        self.results = results or {}
+        self.id = state["job_id"]
+        self.status = state["status"]
+
+    @classmethod
+    def load(cls, cache, job_id):
+        state = cache.get("jobs", job_id)
+        if state is None:
+            return None
+        results = {}
+        for name in state["checks"]:
+            result = cache.get("job_checks", f"{job_id}/{name}")
+            if result is not None:
+                results[name] = result
+        return cls(state, results)
+
+    def to_dict(self):
+        return {**self.state, "checks": self.results}
+
+
+class JobManager:
+    def __init__(self, workers=AUDIT_JOB_WORKERS, retention=AUDIT_JOB_RETENTION):
+        self.workers = workers
+        self.retention = retention
+        self._jobs = {}
+        self._active = {}  # job key -> queued/running job (a future while it is being claimed), for coalescing
+        self._queue = None
+        self._tasks = []
+
+    def _ensure_workers(self):
+        # Workers are started lazily on the running event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def submit(self, creds, project, checks=None, timeout=None, identity=None):
+        """
+        Queue an audit; returns ``(job, coalesced)``. ``identity`` names the
+        credentials (``credentials_cache.cache_key``) for coalescing.
+        """
+        self._ensure_workers()
+        self._prune()
+
+        job = Job(creds, project, audit_runner.select_checks(checks), timeout, identity)
+        existing = self._active.get(job.key)
+        if isinstance(existing, asyncio.Future):
+            return await asyncio.shield(existing)  # an identical submission is still claiming its job
+        if existing is not None and not existing.finished:
+            return existing, True
+
+        loop = asyncio.get_running_loop()
+        claiming = self._active[job.key] = loop.create_future()
+        try:
+            published = await loop.run_in_executor(publish_executor, self._claim, job, job.published_state())
+        except BaseException as e:
+            del self._active[job.key]
+            claiming.set_exception(e)
+            raise
+        if published is not None:
+            del self._active[job.key]
+            claiming.set_result((published, True))
+            return published, True
+
+        self._jobs[job.id] = job
+        self._active[job.key] = job
+        claiming.set_result((job, True))
+        self._queue.put_nowait(job)
+        return job, False
+
+    def get(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            cache = shared_cache.get_cache()
+            if cache is not None:
+                return PublishedJob.load(cache, job_id)
+        return job
+
+    async def shutdown(self):
+        """Stop the workers; jobs still queued or running are marked failed so pollers stop waiting."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for job in self._jobs.values():
+            if not job.finished:
+                job.status = "failed"
+                job.error = "Server shut down before the job finished"
+                job.finished_at = time.time()
+                job.creds = None
+                self._publish(job)
+        self._active.clear()
+        await asyncio.get_running_loop().run_in_executor(publish_executor, lambda: None)  # let them land
+
+    # ----------------- Cross-Worker State -----------------
+    def _claim(self, job, state):
+        """
+        Register ``job`` as the active one for its key and publish ``state``, or
+        return the other worker's job that is active. Runs on ``publish_executor``.
+        """
+        cache = shared_cache.get_cache()
+        if cache is None:
+            return None
+        key = json.dumps(job.key)
+        try:
+            if not cache.add("active_jobs", key, job.id, AUDIT_JOB_STALE):
+                other = cache.get("active_jobs", key)
+                published = PublishedJob.load(cache, other) if other else None
+                if published is not None and published.status in ("queued", "running"):
+                    return published
+                cache.put("active_jobs", key, job.id, AUDIT_JOB_STALE)  # that job finished or its worker went away
+            cache.put("jobs", job.id, state, AUDIT_JOB_STALE + self.retention)
+        except sqlite3.Error as e:
+            logger.warning("Could not publish job %s: %s", job.id, e)
+        return None
+
+    def _publish(self, job, check=None):
+        """Publish ``job``'s state, and the result of ``check`` if given, without blocking the event loop."""
+        if shared_cache.get_cache() is None:
+            return
+        ttl = self.retention if job.finished else AUDIT_JOB_STALE + self.retention
+        state = job.published_state()
+        result = job.results[check] if check is not None else None
+
+        def write():
+            cache = shared_cache.get_cache()
+            try:
+                if check is not None:
+                    cache.put("job_checks", f"{job.id}/{check}", result, AUDIT_JOB_STALE + self.retention)
+                cache.put("jobs", job.id, state, ttl)
+                if state["status"] in ("done", "failed"):
+                    cache.delete("active_jobs", json.dumps(job.key), job.id)
+            except sqlite3.Error as e:
+                # Only other workers lose sight of the job; it still runs and reports here
+                logger.warning("Could not publish job %s: %s", job.id, e)
+
+        asyncio.get_running_loop().run_in_executor(publish_executor, write)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    async def _run(self, job):
+        async def run_one(name):
+            job.results[name] = await audit_runner.run_check(name, job.creds, job.project, job.timeout)
+            self._publish(job, name)
+
+        await asyncio.gather(*(run_one(name) for name in job.checks))
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            self._publish(job)
+            try:
+                await self._run(job)
+                job.status = "done"
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                job.creds = None  # don't hold uploaded keys longer than needed
+                if self._active.get(job.key) is job:
+                    del self._active[job.key]
+                self._publish(job)
+                self._queue.task_done()
+
+
+jobs = JobManager()
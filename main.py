@@ -1,22 +1,82 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Header
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from googleapiclient import discovery
-from google.oauth2 import service_account
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextlib
+import contextvars
+import gzip
 import json
-import bcrypt
 import jwt
+import logging
 import os
+import tempfile
+import time
+
+from gcp_clients import get_client
+from pagination import iter_pages
+import audit_runner
+import org_scan
+import api_exec
+import audit_cache
+import credentials_cache
+import export
+import findings
+import inventory
+import telemetry
+from asset_export import AssetExport
+from findings import VmPublicIp
+from jobs import jobs
+import auth
+from auth import SECRET_KEY, ALGORITHM  # SECRET_KEY comes from env; use Secret Manager in prod
 
 # -----------------------------
 # ⚙️ Configuration
 # -----------------------------
-SECRET_KEY = os.getenv("SECRET_KEY", "supersecretjwtkey")  # Use Secret Manager in prod
-ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
-app = FastAPI(title="GCP VM Audit API", version="2.0")
+# Max audits running at once; the Google API client is blocking, so audits run
+# on this dedicated pool instead of the event loop.
+AUDIT_MAX_CONCURRENCY = int(os.getenv("AUDIT_MAX_CONCURRENCY", "8"))
+audit_executor = ThreadPoolExecutor(max_workers=AUDIT_MAX_CONCURRENCY, thread_name_prefix="audit")
+
+# Work done once the server is up instead of on the first request:
+# "off", "imports" (API client libraries) or "clients" (also the discovery documents of every check API)
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "off")
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# 🔥 Startup Warm-up
+# -----------------------------
+def warm_up():
+    start = time.perf_counter()
+    auth.user_db()
+    audit_runner.warm_up(clients=STARTUP_WARMUP == "clients")
+    logger.info("Warm-up (%s) done in %.0f ms", STARTUP_WARMUP, (time.perf_counter() - start) * 1000)
+
+
+async def run_warm_up():
+    # ✅ Scheduled from startup, runs on a thread so the server starts listening without waiting for it
+    await asyncio.sleep(0)
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, warm_up)
+    except Exception:
+        logger.exception("Startup warm-up failed")
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    task = asyncio.create_task(run_warm_up()) if STARTUP_WARMUP != "off" else None
+    yield
+    if task is not None:
+        task.cancel()
+    await jobs.shutdown()
+
+
+app = FastAPI(title="GCP VM Audit API", version="2.0", lifespan=lifespan)
 
 # -----------------------------
 # 🌐 Enable CORS
@@ -36,24 +96,23 @@ class LoginPayload(BaseModel):
     username: str
     password: str
 
-# Mock user credentials (for demo)
-USER_DB = {
-    "admin": bcrypt.hashpw("admin123".encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-}
+# Mock user credentials (for demo) are precomputed bcrypt hashes, loaded lazily by auth.user_db()
 
 # -----------------------------
 # 🔐 Login & JWT Tokenization
 # -----------------------------
 @app.post("/login")
-def login(payload: LoginPayload):
+async def login(payload: LoginPayload):
     username = payload.username
-    password = payload.password.encode('utf-8')
 
-    if username not in USER_DB:
-        raise HTTPException(status_code=401, detail="Invalid username or password")
+    # ✅ bcrypt runs on a bounded pool; shed load instead of queueing without limit
+    try:
+        valid = await auth.verify_password(username, payload.password)
+    except auth.LoginBusy:
+        raise HTTPException(status_code=429, detail="Too many login attempts in progress, retry shortly",
+                            headers={"Retry-After": "1"})
 
-    stored_hash = USER_DB[username].encode('utf-8')
-    if not bcrypt.checkpw(password, stored_hash):
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid username or password")
 
     # ✅ Create JWT token
@@ -63,70 +122,402 @@ def login(payload: LoginPayload):
 
 
 # -----------------------------
-# 🔍 Verify JWT Token
+# 🧠 VM Audit Function
 # -----------------------------
-def verify_token(token: str):
+def iter_compute_public_ips(service_account_info: dict):
+    """Yield one finding per public IP, page by page, so large projects never sit in memory."""
+    creds = credentials_cache.get_credentials(service_account_info)
+    project_id = creds.project_id
+    compute = get_client("compute", "v1", creds)
+
+    req = compute.instances().aggregatedList(
+        project=project_id, maxResults=500,
+        fields="items/*/instances(name,networkInterfaces/accessConfigs/natIP),nextPageToken"
+    )
+    for res in iter_pages(req, compute.instances().aggregatedList_next):
+        for zone, scoped_list in res.get("items", {}).items():
+            for instance in scoped_list.get("instances", []):
+                name = instance["name"]
+                for nic in instance.get("networkInterfaces", []):
+                    for ac in nic.get("accessConfigs", []):
+                        if "natIP" in ac:
+                            yield VmPublicIp(name, zone.split("/")[-1], ac["natIP"])
+
+
+def check_compute_public_ips(service_account_info: dict, timings: bool = False):
+    try:
+        project_id = service_account_info.get("project_id")
+        with telemetry.check_scope("vm_audit") as trace:
+            vm_data = list(iter_compute_public_ips(service_account_info))
+        # /vm_audit keeps its per-VM objects on the wire; they are built only for the response
+        vulnerable_vms = [vm._asdict() for vm in vm_data]
+        audit_cache.record_scan(project_id, "vm_audit", vulnerable_vms)
+
+        result = {"project_id": project_id, "vulnerable_vms": vulnerable_vms}
+        if not vm_data:
+            result["message"] = "✅ No public IPs found — all VMs are safe"
+        if timings:
+            result["timings"] = trace.summary()
+        return result
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Audit error: {str(e)}")
+
+
+def stream_compute_public_ips(service_account_info: dict):
+    yield {"project_id": service_account_info.get("project_id")}
     try:
-        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+        for vm in iter_compute_public_ips(service_account_info):
+            yield vm._asdict()
+    except Exception as e:
+        yield {"error": f"Audit error: {str(e)}"}
 
 
 # -----------------------------
-# 🧠 VM Audit Function
+# 📥 Request Helpers
 # -----------------------------
-def check_compute_public_ips(service_account_info: dict):
+def ndjson_response(lines):
+    """Stream dicts as newline-delimited JSON; sync iterators are stepped on audit_executor."""
+    if hasattr(lines, "__aiter__"):
+        async def body():
+            async for line in lines:
+                yield json.dumps(line) + "\n"
+    else:
+        async def body():
+            # ✅ Same AUDIT_MAX_CONCURRENCY bound as the non-streaming audits, one context for every step
+            loop = asyncio.get_running_loop()
+            context = contextvars.copy_context()
+            done = object()
+            try:
+                while (line := await loop.run_in_executor(audit_executor, context.run, next, lines, done)) is not done:
+                    yield json.dumps(line) + "\n"
+            finally:
+                if hasattr(lines, "close"):
+                    await loop.run_in_executor(audit_executor, context.run, lines.close)
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+async def read_service_account(file: UploadFile):
     try:
-        creds = service_account.Credentials.from_service_account_info(service_account_info)
-        project_id = creds.project_id
-        compute = discovery.build("compute", "v1", credentials=creds)
-        vm_data = []
-
-        req = compute.instances().aggregatedList(project=project_id)
-        while req is not None:
-            res = req.execute()
-            for zone, scoped_list in res.get("items", {}).items():
-                for instance in scoped_list.get("instances", []):
-                    name = instance["name"]
-                    for nic in instance.get("networkInterfaces", []):
-                        for ac in nic.get("accessConfigs", []):
-                            if "natIP" in ac:
-                                vm_data.append({
-                                    "vm_name": name,
-                                    "zone": zone.split("/")[-1],
-                                    "public_ip": ac["natIP"]
-                                })
-            req = compute.instances().aggregatedList_next(req, res)
-
-        return {
-            "project_id": project_id,
-            "vulnerable_vms": vm_data or "✅ No public IPs found — all VMs are safe"
-        }
+        content = await file.read()
+        return json.loads(content)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid JSON file uploaded.")
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Audit error: {str(e)}")
+
+def parse_checks(checks: str = None):
+    """Check names from a comma-separated ``checks`` parameter (all checks if empty); ValueError if unknown."""
+    return audit_runner.select_checks([c.strip() for c in (checks or "").split(",") if c.strip()])
 
 
 # -----------------------------
 # 🚀 VM Audit Endpoint (JSON File Upload)
 # -----------------------------
-@app.post("/vm_audit")
-async def vm_audit(file: UploadFile = File(...), authorization: str = Header(None)):
+@app.post("/vm_audit", dependencies=[Depends(auth.require_token)])
+async def vm_audit(file: UploadFile = File(...), stream: bool = False, timings: bool = False):
     """
     Upload a GCP Service Account JSON file and audit VMs for public IPs.
     Requires JWT Bearer token in header.
+    With `?stream=true` findings are streamed as NDJSON while the VMs are listed;
+    `?timings=true` adds the time spent per Google API method.
+    """
+    sa_info = await read_service_account(file)
+
+    if stream:
+        return ndjson_response(stream_compute_public_ips(sa_info))
+
+    # ✅ Run the blocking audit off the event loop so /login and other requests stay responsive
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(audit_executor, check_compute_public_ips, sa_info, timings)
+
+
+# -----------------------------
+# 🛡️ Multi-Check Audit Endpoint
+# -----------------------------
+@app.post("/audit", dependencies=[Depends(auth.require_token)])
+async def audit(
+    file: UploadFile = File(...),
+    checks: str = Form(None),
+    timeout: float = Form(None),
+    stream: bool = False,
+    timings: bool = False,
+):
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
-    token = authorization.split(" ")[1]
-    verify_token(token)
+    Upload a GCP Service Account JSON file and run the selected checks concurrently.
+    `checks` is a comma-separated list of check names (default: all checks);
+    `timeout` overrides the per-check timeout in seconds.
+    With `?stream=true` findings are streamed as NDJSON as each check produces them;
+    `?timings=true` adds each check's time per Google API method.
+    """
+    sa_info = await read_service_account(file)
 
     try:
-        content = await file.read()
-        sa_info = json.loads(content)
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid JSON file uploaded.")
+        names = parse_checks(checks)
+        creds = credentials_cache.get_credentials(sa_info)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if stream:
+        return ndjson_response(audit_runner.stream_audit(creds, creds.project_id, names, timeout, timings))
+    return await audit_runner.run_audit(creds, creds.project_id, names, timeout, timings)
+
+
+@app.post("/audit/export", dependencies=[Depends(auth.require_token)])
+async def audit_export(
+    file: UploadFile = File(...),
+    checks: str = Form(None),
+    timeout: float = Form(None),
+    format: str = "csv",
+):
+    """
+    Run the selected checks and download the findings as `?format=csv` (ZIP of one
+    CSV per check), `xlsx` (one sheet per check) or `parquet` (ZIP of one Parquet
+    file per check; needs pyarrow). Findings are written as they arrive.
+    """
+    sa_info = await read_service_account(file)
+
+    out = tempfile.TemporaryFile()
+    try:
+        names = parse_checks(checks)
+        creds = credentials_cache.get_credentials(sa_info)
+        writer = export.writer(format, out)
+    except ValueError as e:
+        out.close()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    loop = asyncio.get_running_loop()
+    batch = []
+    # ✅ Rows are handed to the writer in batches, off the event loop
+    async for line in audit_runner.stream_audit(creds, creds.project_id, names, timeout):
+        batch.append(line)
+        if len(batch) >= audit_runner.STREAM_BUFFER:
+            await loop.run_in_executor(audit_executor, writer.write_lines, batch)
+            batch = []
+    await loop.run_in_executor(audit_executor, writer.write_lines, batch)
+    await loop.run_in_executor(audit_executor, writer.close)
+
+    def body():
+        with out:
+            out.seek(0)
+            while chunk := out.read(1 << 16):
+                yield chunk
+
+    filename = f"audit-{creds.project_id}.{writer.extension}"
+    return StreamingResponse(body(), media_type=writer.media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+# -----------------------------
+# 🏢 Organization / Folder Audit Endpoint
+# -----------------------------
+@app.post("/org_audit", dependencies=[Depends(auth.require_token)])
+async def org_audit(
+    file: UploadFile = File(...),
+    parent: str = Form(...),
+    checks: str = Form(None),
+    timeout: float = Form(None),
+    source: str = Form("api"),
+):
+    """
+    Upload a GCP Service Account JSON file and audit every active project under
+    `parent` (`organizations/123` or `folders/456`, sub-folders included).
 
-    return check_compute_public_ips(sa_info)
+    `source=assets` reads every project's resources and IAM policies in bulk from
+    Cloud Asset Inventory instead of calling each API per project and resource.
+    """
+    sa_info = await read_service_account(file)
+    if source not in ("api", "assets"):
+        raise HTTPException(status_code=400, detail="source must be 'api' or 'assets'")
+
+    try:
+        names = parse_checks(checks)
+        creds = credentials_cache.get_credentials(sa_info)
+        if source == "assets":
+            return await org_scan.scan_assets(creds, parent, names, timeout)
+        return await org_scan.scan_parent(creds, parent, names, timeout)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Audit error: {str(e)}")
+
+
+@app.post("/org_audit/asset_export", dependencies=[Depends(auth.require_token)])
+async def org_audit_export(
+    file: UploadFile = File(...),
+    checks: str = Form(None),
+    timeout: float = Form(None),
+):
+    """
+    Upload a Cloud Asset export (NDJSON as written by `exportAssets`, a JSON array,
+    or saved `assets.list` pages; `.gz` accepted) and audit every project in it.
+    """
+    try:
+        names = parse_checks(checks)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    fp = gzip.GzipFile(fileobj=file.file, mode="rb") if (file.filename or "").endswith(".gz") else file.file
+    loop = asyncio.get_running_loop()
+    try:
+        export = await loop.run_in_executor(audit_executor, AssetExport.load, fp)
+    except (ValueError, UnicodeDecodeError, OSError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid asset export: {str(e)}")
+    return await org_scan.scan_export(export, names, timeout)
+
+
+@app.get("/audit/diff", dependencies=[Depends(auth.require_token)])
+def audit_diff(project_id: str, check: str = None):
+    """
+    Findings added and removed since the previous scan, per check
+    (`check` may be any /audit check name or `vm_audit`).
+    """
+    cache = audit_cache.get_cache()
+    if cache is None:
+        raise HTTPException(status_code=404, detail="Audit cache is disabled")
+
+    names = [check] if check else cache.checks_scanned(project_id)
+    diffs = {name: cache.diff(project_id, name) for name in names}
+    if not any(diffs.values()):
+        raise HTTPException(status_code=404, detail="No scans recorded for this project")
+    return {"project_id": project_id, "checks": {name: d for name, d in diffs.items() if d}}
+
+
+# -----------------------------
+# 🧵 Background Audit Jobs
+# -----------------------------
+@app.post("/jobs", status_code=202, dependencies=[Depends(auth.require_token)])
+async def submit_job(
+    file: UploadFile = File(...),
+    checks: str = Form(None),
+    timeout: float = Form(None),
+):
+    """
+    Queue an audit of the uploaded service account's project and return its job id.
+    A job already queued or running for the same key, project, checks and timeout is returned instead.
+    """
+    sa_info = await read_service_account(file)
+
+    try:
+        names = parse_checks(checks)
+        creds = credentials_cache.get_credentials(sa_info)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    job, coalesced = await jobs.submit(creds, creds.project_id, names, timeout,
+                                       identity=credentials_cache.cache_key(sa_info))
+    return {"job_id": job.id, "status": job.status, "coalesced": coalesced}
+
+
+@app.get("/jobs/{job_id}", dependencies=[Depends(auth.require_token)])
+def get_job(job_id: str):
+    """Job status, progress and the results of the checks finished so far."""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+# -----------------------------
+# 🗂️ Inventory Snapshots
+# -----------------------------
+@app.post("/inventory/snapshots", dependencies=[Depends(auth.require_token)])
+async def take_snapshot(file: UploadFile = File(...)):
+    """
+    Upload a GCP Service Account JSON file and store a snapshot of every resource
+    the checks read in its project; the checks can then run against it with no API calls.
+    """
+    sa_info = await read_service_account(file)
+    try:
+        creds = credentials_cache.get_credentials(sa_info)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    loop = asyncio.get_running_loop()
+    try:
+        snapshot_id = await loop.run_in_executor(audit_executor, inventory.collect, creds, creds.project_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Snapshot error: {str(e)}")
+    return inventory.get_store().snapshot(snapshot_id)
+
+
+@app.get("/inventory/snapshots", dependencies=[Depends(auth.require_token)])
+def list_snapshots(project_id: str):
+    return {"project_id": project_id, "snapshots": inventory.get_store().snapshots(project_id)}
+
+
+@app.get("/inventory/snapshots/{snapshot_id}/resources", dependencies=[Depends(auth.require_token)])
+def find_resources(snapshot_id: int, type: str = None, ip: str = None, network: str = None,
+                   tag: str = None, limit: int = 1000):
+    """
+    Resources of a snapshot matching every given filter: resource `type`
+    (e.g. `compute.instances`), IP address, VPC `network` and network `tag`.
+    """
+    store = inventory.get_store()
+    if store.snapshot(snapshot_id) is None:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    return {"snapshot_id": snapshot_id,
+            "resources": store.find(snapshot_id, type, ip, network, tag, limit)}
+
+
+@app.post("/inventory/snapshots/{snapshot_id}/audit", dependencies=[Depends(auth.require_token)])
+async def audit_snapshot(
+    snapshot_id: int,
+    checks: str = Form(None),
+    stream: bool = False,
+    timings: bool = False,
+):
+    """Run the selected checks (default: all) against a stored snapshot instead of the live APIs."""
+    snapshot = inventory.get_store().snapshot(snapshot_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+
+    try:
+        names = parse_checks(checks)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    project = snapshot["project_id"]
+    creds = inventory.SnapshotCredentials(project)
+    if stream:
+        return ndjson_response(audit_runner.stream_audit(creds, project, names, None, timings, snapshot_id))
+    result = await audit_runner.run_audit(creds, project, names, None, timings, snapshot_id)
+    result["snapshot_id"] = snapshot_id
+    return result
+
+
+@app.get("/audit/checks", dependencies=[Depends(auth.require_token)])
+def list_checks():
+    """Check names, and the column order of each check's finding arrays."""
+    return {"checks": list(audit_runner.CHECKS),
+            "columns": {name: findings.columns(name) for name in audit_runner.CHECKS}}
+
+
+@app.get("/api_stats", dependencies=[Depends(auth.require_token)])
+def api_stats():
+    """
+    Request, retry, throttle-wait and failure counters per Google API, and
+    bytes received / JSON parse time per check.
+    """
+    return {"apis": api_exec.counters(), "checks": telemetry.payload_stats()}
+
+
+# -----------------------------
+# 📈 Prometheus Metrics
+# -----------------------------
+def api_exec_metrics():
+    counter = telemetry.Counter("gcp_api_executor_total",
+                                "Rate-limit waits, retries and failures per Google API.", ("api", "counter"))
+    for api, values in api_exec.counters().items():
+        for name, value in values.items():
+            counter.inc((api, name), value)
+    return counter
+
+
+@app.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(auth.require_token)])
+def metrics():
+    """
+    Call counts, latency histograms, bytes and retries per Google API method, and
+    run counts / wall time per check, in the Prometheus text format.
+    """
+    return PlainTextResponse(telemetry.render_prometheus([api_exec_metrics()]),
+                             media_type="text/plain; version=0.0.4")
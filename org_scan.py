@@ -0,0 +1,179 @@
+"""
+Organization / folder wide scanning.
+
+Projects under a parent are enumerated through Cloud Resource Manager, then
+every (project, check) pair is scheduled on a fixed number of workers:
+
+- ``ORG_SCAN_CONCURRENCY`` caps how many checks run at once across all projects;
+- each Google API gets a token bucket (``ORG_SCAN_API_RATE`` check starts per
+  second, per-API overrides in ``ORG_SCAN_API_RATES``, e.g. ``compute=5,storage=20``),
+  split between the ``SERVER_WORKERS`` server processes like api_exec's limits;
+- work is dequeued round-robin across projects, so one large project cannot
+  starve the others.
+
+Per-project results and failures are merged into a single report.
+
+With a Cloud Asset export (``scan_export``, ``scan_assets``) the projects and
+their resources come from the export instead: no per-project API calls and no
+rate limiting.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import api_exec
+import audit_runner
+import inventory
+from asset_export import AssetExport
+from gcp_clients import get_client
+from pagination import iter_pages
+from ratelimit import RateLimiters, parse_rates
+
+ORG_SCAN_CONCURRENCY = int(os.getenv("ORG_SCAN_CONCURRENCY", "32"))
+ORG_SCAN_API_RATE = float(os.getenv("ORG_SCAN_API_RATE", "10"))
+
+
+ORG_SCAN_API_RATES = parse_rates(os.getenv("ORG_SCAN_API_RATES"))
+
+org_executor = ThreadPoolExecutor(max_workers=ORG_SCAN_CONCURRENCY, thread_name_prefix="org-scan")
+
+
+# ----------------- Project Enumeration -----------------
+def list_projects(creds, parent, recursive=True):
+    """Active project IDs under ``organizations/N`` or ``folders/N``, including sub-folders."""
+    if not parent.startswith(("organizations/", "folders/")):
+        raise ValueError("parent must look like 'organizations/123' or 'folders/456'")
+
+    crm = get_client('cloudresourcemanager', 'v3', creds)
+    project_ids = []
+    parents = deque([parent])
+
+    while parents:
+        current = parents.popleft()
+
+        for res in iter_pages(crm.projects().list(parent=current), crm.projects().list_next):
+            for project in res.get('projects', []):
+                if project.get('state', 'ACTIVE') == 'ACTIVE':
+                    project_ids.append(project['projectId'])
+
+        if recursive:
+            for res in iter_pages(crm.folders().list(parent=current), crm.folders().list_next):
+                for folder in res.get('folders', []):
+                    if folder.get('state', 'ACTIVE') == 'ACTIVE':
+                        parents.append(folder['name'])
+
+    return project_ids
+
+
+# ----------------- Fair Scheduling -----------------
+class FairQueue:
+    """Per-project FIFO queues served round-robin."""
+
+    def __init__(self):
+        self._queues = {}
+        self._order = deque()
+
+    def put(self, project, item):
+        if project not in self._queues:
+            self._queues[project] = deque()
+            self._order.append(project)
+        self._queues[project].append(item)
+
+    def pop(self):
+        """Next item from the next project in rotation, or ``None`` when empty."""
+        while self._order:
+            project = self._order.popleft()
+            queue = self._queues[project]
+            if queue:
+                item = queue.popleft()
+                if queue:
+                    self._order.append(project)
+                else:
+                    del self._queues[project]
+                return item
+            del self._queues[project]
+        return None
+
+    def __len__(self):
+        return sum(len(q) for q in self._queues.values())
+
+
+async def scan_projects(creds, projects, checks=None, timeout=None, concurrency=None, limiters=None, sources=None):
+    """
+    Run the selected checks against every project and aggregate the results.
+    ``sources`` maps a project to the data source its checks read instead of the live APIs.
+    """
+    names = audit_runner.select_checks(checks)
+    workers = api_exec.SERVER_WORKERS
+    limiters = limiters or RateLimiters(ORG_SCAN_API_RATE / workers,
+                                        overrides={api: rate / workers for api, rate in ORG_SCAN_API_RATES.items()})
+    start = time.perf_counter()
+
+    queue = FairQueue()
+    for project in projects:
+        for name in names:
+            queue.put(project, (project, name))
+
+    results = {project: {} for project in projects}
+
+    async def worker():
+        while True:
+            item = queue.pop()
+            if item is None:
+                return
+            project, name = item
+            source = sources.get(project) if sources else None
+            if source is None:
+                for api in audit_runner.CHECK_APIS.get(name, []):
+                    await limiters.get(api).acquire_async()
+            results[project][name] = await audit_runner.run_check(name, creds, project, timeout, org_executor,
+                                                                  source=source)
+
+    workers = min(concurrency or ORG_SCAN_CONCURRENCY, len(queue)) or 1
+    await asyncio.gather(*(worker() for _ in range(workers)))
+
+    failures = [
+        {"project_id": project, "check": name, "status": result["status"], "error": result.get("error")}
+        for project, checks_done in results.items()
+        for name, result in checks_done.items()
+        if result["status"] != "ok"
+    ]
+    return {
+        "projects": {project: {"checks": checks_done} for project, checks_done in results.items()},
+        "failures": failures,
+        "summary": {
+            "projects": len(projects),
+            "checks_run": len(projects) * len(names),
+            "checks_failed": len(failures),
+            "findings": sum(len(r.get("findings", [])) for c in results.values() for r in c.values()),
+        },
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+async def scan_parent(creds, parent, checks=None, timeout=None, recursive=True):
+    """Enumerate the projects under ``parent`` and scan them all."""
+    loop = asyncio.get_running_loop()
+    projects = await loop.run_in_executor(org_executor, list_projects, creds, parent, recursive)
+    report = await scan_projects(creds, projects, checks, timeout)
+    report["parent"] = parent
+    return report
+
+
+async def scan_export(export, checks=None, timeout=None):
+    """Scan every active project of an ``AssetExport``, reading nothing but the export."""
+    projects = export.projects()
+    creds = inventory.SnapshotCredentials(None)
+    return await scan_projects(creds, projects, checks, timeout,
+                               sources={project: export.source(project) for project in projects})
+
+
+async def scan_assets(creds, parent, checks=None, timeout=None):
+    """Read the assets under ``parent`` from Cloud Asset Inventory in bulk, then scan them like an export."""
+    loop = asyncio.get_running_loop()
+    export = await loop.run_in_executor(org_executor, AssetExport.from_api, creds, parent)
+    report = await scan_export(export, checks, timeout)
+    report["parent"] = parent
+    return report
@@ -0,0 +1,122 @@
+"""
+Shared paginator for list-style Google API calls.
+
+``iter_pages`` follows every page of a list request. Page N+1 is fetched on a
+background thread while the caller is still processing page N, with at most
+``PAGE_PREFETCH`` pages buffered ahead; ``PAGE_PREFETCH=0`` fetches pages
+strictly one after another on the calling thread.
+
+Background fetches run on up to ``PAGE_PREFETCH_THREADS`` long-lived threads,
+which keep their HTTP connections alive between listings; when every one of
+them is busy, the listing is fetched on the calling thread instead. They are
+daemon threads, like the credential refresher: a fetcher still waiting on a
+listing nobody reads any more must not hold up interpreter exit, which a
+ThreadPoolExecutor's threads would (they are joined at exit).
+"""
+import contextvars
+import os
+import queue
+import threading
+
+PAGE_PREFETCH = int(os.getenv("PAGE_PREFETCH", "2"))
+PAGE_PREFETCH_THREADS = int(os.getenv("PAGE_PREFETCH_THREADS", "32"))
+
+_fetcher_slots = threading.BoundedSemaphore(PAGE_PREFETCH_THREADS)
+_fetches = queue.SimpleQueue()
+_idle_fetchers = threading.Semaphore(0)  # one count per fetcher thread waiting for work
+_fetcher_count = 0
+_fetcher_lock = threading.Lock()
+
+_DONE = object()
+
+
+def _fetcher():
+    while True:
+        _fetches.get()()
+        _idle_fetchers.release()
+
+
+def _submit(call):
+    """Run ``call`` on an idle fetcher thread, starting one if none is idle (``_fetcher_slots`` bounds them)."""
+    global _fetcher_count
+    _fetches.put(call)
+    if not _idle_fetchers.acquire(blocking=False):
+        with _fetcher_lock:
+            _fetcher_count += 1
+            threading.Thread(target=_fetcher, name=f"page-prefetch_{_fetcher_count}", daemon=True).start()
+
+
+class _Failed:
+    def __init__(self, error):
+        self.error = error
+
+
+def token_pager(build, token_field="nextPageToken", param="pageToken"):
+    """
+    ``next_request`` for APIs without a generated ``*_next`` method: ``build(**{param: token})``
+    with the token found at the dotted ``token_field`` of the previous response.
+    """
+    def next_request(previous_request, response):
+        token = response
+        for key in token_field.split("."):
+            token = (token or {}).get(key)
+        return build(**{param: token}) if token else None
+    return next_request
+
+
+def iter_pages(request, next_request, prefetch=None):
+    """
+    Yield the response of ``request`` and of every following page.
+
+    ``next_request(previous_request, previous_response)`` returns the request
+    for the next page or ``None``; the generated ``list_next`` /
+    ``aggregatedList_next`` methods fit as-is.
+    """
+    prefetch = PAGE_PREFETCH if prefetch is None else prefetch
+    if prefetch <= 0 or request is None or not _fetcher_slots.acquire(blocking=False):
+        while request is not None:
+            response = request.execute()
+            yield response
+            request = next_request(request, response)
+        return
+
+    pages = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+
+    def put(item):
+        # Wait for room in the buffer, giving up once the consumer has gone away
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def fetch(req):
+        try:
+            while req is not None and not stop.is_set():
+                response = req.execute()
+                if not put(response):
+                    return
+                req = next_request(req, response)
+            put(_DONE)
+        except Exception as e:
+            put(_Failed(e))
+        finally:
+            _fetcher_slots.release()
+
+    # The fetcher runs in a copy of the caller's context so telemetry attribution follows it
+    context = contextvars.copy_context()
+    _submit(lambda: context.run(fetch, request))
+
+    try:
+        while True:
+            item = pages.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failed):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
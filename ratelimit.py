@@ -0,0 +1,73 @@
+"""
+Token-bucket rate limiting shared by the scanners.
+
+A bucket refills at ``rate`` tokens per second up to ``burst`` tokens. Callers
+reserve a token and wait out the returned delay, either blocking a worker
+thread (``acquire``) or yielding to the event loop (``acquire_async``).
+"""
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(1.0, rate))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=1.0):
+        """Take ``tokens`` now and return how many seconds the caller must wait before using them."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens=1.0):
+        wait = self.reserve(tokens)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens=1.0):
+        wait = self.reserve(tokens)
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class RateLimiters:
+    """Lazily created token buckets keyed by name (an API, or an API and project)."""
+
+    def __init__(self, rate, burst=None, overrides=None):
+        self.rate = rate
+        self.burst = burst
+        self.overrides = overrides or {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                name = key[0] if isinstance(key, tuple) else key
+                bucket = self._buckets[key] = TokenBucket(self.overrides.get(name, self.rate), self.burst)
+            return bucket
+
+
+def parse_rates(value):
+    """Parse ``"compute=5,storage=20"`` into ``{"compute": 5.0, "storage": 20.0}``."""
+    rates = {}
+    for item in (value or "").split(","):
+        if "=" in item:
+            api, rate = item.split("=", 1)
+            rates[api.strip()] = float(rate)
+    return rates
@@ -0,0 +1,70 @@
+"""
+Production server: uvicorn with one worker process per CPU the container may use.
+
+    python serve.py
+
+Blocking Google API calls, bcrypt and findings processing hold a process's GIL,
+so a single ``uvicorn main:app`` process uses one core however many the
+container has. Settings (environment):
+
+- ``HOST`` / ``PORT``: listen address (default ``0.0.0.0:8080``);
+- ``WEB_CONCURRENCY``: worker processes, default the CPUs available to this
+  process: its scheduler affinity mask, capped by the cgroup CPU quota (Cloud
+  Run, Kubernetes CPU limits);
+- ``GRACEFUL_SHUTDOWN_TIMEOUT``: seconds in-flight requests get to finish after
+  SIGTERM before their connections are closed (Cloud Run waits 10s before
+  SIGKILL).
+
+Workers share access tokens and job state through shared_cache and audit
+verdicts through audit_cache. ``SERVER_WORKERS`` is passed to every worker so
+api_exec and org_scan split their API rate limits between them.
+"""
+import math
+import os
+
+import uvicorn
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8080"))
+GRACEFUL_SHUTDOWN_TIMEOUT = int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "8"))  # seconds
+
+
+def cpu_quota():
+    """CPUs granted by the cgroup CPU quota, or None when there is no quota."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:  # cgroup v2
+            quota, period = f.read().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:  # cgroup v1
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        return quota / period if quota > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus():
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS / Windows
+        cpus = os.cpu_count() or 1
+    quota = cpu_quota()
+    if quota:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
+
+
+def main(app="main:app"):
+    workers = int(os.getenv("WEB_CONCURRENCY") or available_cpus())
+    # ✅ Inherited by the worker processes, before they import api_exec
+    os.environ["SERVER_WORKERS"] = str(workers)
+    uvicorn.run(app, host=HOST, port=PORT, workers=workers,
+                timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_TIMEOUT)
+
+
+if __name__ == "__main__":
+    main()
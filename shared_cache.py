@@ -0,0 +1,105 @@
+"""
+Cache shared by every server worker process (SQLite).
+
+serve.py runs several uvicorn worker processes, and anything a process keeps in
+memory is invisible to the others. Entries here are JSON values under a
+(namespace, key) with an expiry time, in one database file every worker opens:
+
+- OAuth access tokens of uploaded service accounts (credentials_cache), so a
+  token one worker fetched is reused by the others instead of each worker doing
+  its own token exchange;
+- background job state (jobs), so any worker can answer ``GET /jobs/{id}`` and
+  identical submissions coalesce across workers.
+
+Audit verdicts and scan history are already shared through audit_cache's
+database. Discovery clients stay per process: they are Python objects bound to
+the process's connections, and building one makes no API call.
+
+Set ``SHARED_CACHE=off`` to disable; ``SHARED_CACHE_PATH`` picks the database
+file. It holds access tokens, so it is created private to the server's user
+(see sqlite_store); a file others could read or plant is refused, and the
+cache is then disabled: each worker keeps its tokens to itself.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from sqlite_store import DATA_DIR, SqliteStore, private_database
+
+SHARED_CACHE_ENABLED = os.getenv("SHARED_CACHE", "on").lower() not in ("0", "off", "false", "no")
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH") or os.path.join(DATA_DIR, "shared.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_by_expiry ON entries (expires_at);
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class SharedCache(SqliteStore):
+    def __init__(self, path):
+        super().__init__(path)
+        private_database(path)
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def get(self, namespace, key):
+        row = self._conn().execute(
+            "SELECT value FROM entries WHERE namespace=? AND key=? AND expires_at>?",
+            (namespace, key, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, namespace, key, value, ttl):
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute("DELETE FROM entries WHERE expires_at<=?", (now,))
+            conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                         (namespace, key, json.dumps(value, default=str), now + ttl))
+
+    def add(self, namespace, key, value, ttl):
+        """Store ``value`` unless an unexpired entry exists; True if it was stored."""
+        now = time.time()
+        # ✅ Both statements run in one write transaction, so only one worker can win
+        with self._conn() as conn:
+            conn.execute("DELETE FROM entries WHERE namespace=? AND key=? AND expires_at<=?", (namespace, key, now))
+            cur = conn.execute("INSERT OR IGNORE INTO entries VALUES (?, ?, ?, ?)",
+                               (namespace, key, json.dumps(value, default=str), now + ttl))
+            return cur.rowcount == 1
+
+    def delete(self, namespace, key, value=None):
+        """Remove an entry; with ``value``, only if it still holds that value."""
+        sql, params = "DELETE FROM entries WHERE namespace=? AND key=?", [namespace, key]
+        if value is not None:
+            sql, params = sql + " AND value=?", params + [json.dumps(value, default=str)]
+        with self._conn() as conn:
+            conn.execute(sql, params)
+
+
+_cache = None
+_cache_failed = False
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """The cache shared with the other worker processes, or ``None`` when it is disabled or unsafe."""
+    global _cache, _cache_failed
+    if not SHARED_CACHE_ENABLED or _cache_failed:
+        return None
+    with _cache_lock:
+        if _cache is None and not _cache_failed:
+            try:
+                _cache = SharedCache(SHARED_CACHE_PATH)
+            except OSError as e:
+                _cache_failed = True
+                logger.error("Shared cache disabled: %s", e)
+        return _cache
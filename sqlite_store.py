@@ -0,0 +1,72 @@
+"""
+Base class of the SQLite-backed stores: audit_cache, inventory and shared_cache.
+
+sqlite3 connections must stay on the thread that opened them, so a store keeps
+one per thread. They run in WAL mode, so the server's threads and worker
+processes keep reading while another one writes.
+
+The databases hold findings, resource bodies, IAM policies and access tokens,
+so by default they live in ``DATA_DIR``, a directory only the server's user can
+enter, and every database file is created exclusively (never through a
+symlink) with mode 0600. A directory or file that belongs to another user, or
+that others can read, is refused with ``PermissionError``.
+"""
+import os
+import sqlite3
+import stat
+import tempfile
+import threading
+
+SQLITE_BUSY_TIMEOUT = 30  # seconds a write waits for another writer's lock
+DATA_DIR = os.path.join(tempfile.gettempdir(), f"gcp_audit-{os.geteuid()}")
+
+
+# ----------------- Private Files -----------------
+def _check_private(path, st, kind):
+    if not kind(st.st_mode) or st.st_uid != os.geteuid() or st.st_mode & 0o077:
+        raise PermissionError(f"{path} must be owned by this user and not accessible to others")
+
+
+def private_dir(path):
+    """Create ``path`` with mode 0700, or check that the existing one is ours and private."""
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    _check_private(path, os.lstat(path), stat.S_ISDIR)
+
+
+def private_file(path):
+    """Create ``path`` with mode 0600, or check that the existing one is ours and private."""
+    flags = os.O_RDWR | getattr(os, "O_NOFOLLOW", 0)
+    try:
+        fd = os.open(path, flags | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        fd = os.open(path, flags)  # ✅ O_NOFOLLOW: a planted symlink fails here
+    try:
+        _check_private(path, os.fstat(fd), stat.S_ISREG)
+    finally:
+        os.close(fd)
+
+
+def private_database(path):
+    """``private_file(path)``, creating ``DATA_DIR`` first when the file lives there."""
+    if os.path.dirname(path) == DATA_DIR:
+        private_dir(DATA_DIR)
+    private_file(path)
+
+
+# ----------------- Store -----------------
+
+class SqliteStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
@@ -0,0 +1,206 @@
+"""
+Attribution of Google API traffic to the check that caused it.
+
+audit_runner wraps each check in ``check_scope(name)``; the scope travels with
+the check's worker threads (fanout and the page prefetcher copy the context),
+and every response received through gcp_clients is recorded against it: calls,
+bytes received and time spent parsing the JSON body.
+
+Every API call is also recorded per method (``compute.instances.aggregatedList``)
+and every check run per check name, as Prometheus counters and latency
+histograms rendered by ``render_prometheus`` for the ``/metrics`` endpoint. The
+scope's ``CheckTrace`` keeps the same per-method breakdown for a single run, so
+an audit response can report where that check spent its time.
+"""
+import contextlib
+import contextvars
+import os
+import threading
+import time
+from collections import defaultdict
+
+current_check = contextvars.ContextVar("current_check", default=None)
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+# Histogram bucket upper bounds, in seconds
+API_LATENCY_BUCKETS = tuple(float(b) for b in os.getenv(
+    "API_LATENCY_BUCKETS", "0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30").split(","))
+CHECK_LATENCY_BUCKETS = tuple(float(b) for b in os.getenv(
+    "CHECK_LATENCY_BUCKETS", "0.1,0.25,0.5,1,2.5,5,10,30,60,120,300").split(","))
+
+_payloads = defaultdict(lambda: {"calls": 0, "bytes": 0, "parse_seconds": 0.0})
+_payloads_lock = threading.Lock()
+
+
+# ----------------- Metric Types -----------------
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, labels, value=1):
+        with self._lock:
+            self._values[labels] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                for bound, hits in zip(self.buckets, series):
+                    le = _labels(self.labels + ("le",), labels + (_number(bound),))
+                    lines.append(f"{self.name}_bucket{le} {hits}")
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), labels + ('+Inf',))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {_number(series[-2])}")
+                lines.append(f"{self.name}_count{_labels(self.labels, labels)} {series[-1]}")
+        return lines
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(round(value, 6))
+
+
+def _labels(names, values):
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+api_calls = Counter("gcp_api_calls_total", "Google API calls by method and outcome.", ("api", "method", "status"))
+api_latency = Histogram("gcp_api_call_duration_seconds",
+                        "Google API call latency by method, including throttling and retries.",
+                        ("api", "method"), API_LATENCY_BUCKETS)
+api_bytes = Counter("gcp_api_response_bytes_total", "Response bytes received by method.", ("api", "method"))
+api_retries = Counter("gcp_api_retries_total", "Retried Google API attempts by method.", ("api", "method"))
+check_runs = Counter("audit_check_runs_total", "Audit check runs by check and outcome.", ("check", "status"))
+check_latency = Histogram("audit_check_duration_seconds", "Audit check wall time.", ("check",), CHECK_LATENCY_BUCKETS)
+check_api_calls = Counter("audit_check_api_calls_total", "Google API calls made on behalf of each check.", ("check", "method"))
+
+METRICS = [api_calls, api_latency, api_bytes, api_retries, check_runs, check_latency, check_api_calls]
+
+
+# ----------------- Per-Run Trace -----------------
+class CheckTrace:
+    """Per-method totals of the API calls made during one check run."""
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.elapsed = None
+        self._methods = defaultdict(lambda: {"calls": 0, "seconds": 0.0, "bytes": 0, "retries": 0, "errors": 0})
+        self._lock = threading.Lock()
+
+    def add(self, method, seconds, nbytes, retries, error):
+        with self._lock:
+            stats = self._methods[method]
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            stats["bytes"] += nbytes
+            stats["retries"] += retries
+            stats["errors"] += bool(error)
+
+    def summary(self):
+        """``{"total_ms", "api_ms", "api": {method: {...}}}``; api_ms counts overlapping calls in full."""
+        elapsed = self.elapsed if self.elapsed is not None else time.perf_counter() - self.start
+        methods = {}
+        with self._lock:
+            for method, stats in self._methods.items():
+                stats = dict(stats)
+                stats["ms"] = round(stats.pop("seconds") * 1000, 1)
+                methods[method] = stats
+        return {
+            "total_ms": round(elapsed * 1000, 1),
+            "api_ms": round(sum(stats["ms"] for stats in methods.values()), 1),
+            "api": dict(sorted(methods.items(), key=lambda item: -item[1]["ms"])),
+        }
+
+
+@contextlib.contextmanager
+def check_scope(name):
+    trace = CheckTrace(name)
+    tokens = current_check.set(name), current_trace.set(trace)
+    status = "ok"
+    try:
+        yield trace
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        trace.elapsed = time.perf_counter() - trace.start
+        current_trace.reset(tokens[1])
+        current_check.reset(tokens[0])
+        check_runs.inc((name, status))
+        check_latency.observe((name,), trace.elapsed)
+
+
+# ----------------- Recording -----------------
+def record_response(nbytes, parse_seconds):
+    check = current_check.get() or "(none)"
+    with _payloads_lock:
+        stats = _payloads[check]
+        stats["calls"] += 1
+        stats["bytes"] += nbytes
+        stats["parse_seconds"] += parse_seconds
+
+
+def record_call(api, method, seconds, nbytes=0, retries=0, error=None):
+    """One API call as seen by the caller: ``error`` is the HTTP status or exception name it failed with."""
+    method = method or api or "unknown"
+    api_calls.inc((api, method, str(error) if error else "ok"))
+    api_latency.observe((api, method), seconds)
+    if nbytes:
+        api_bytes.inc((api, method), nbytes)
+    if retries:
+        api_retries.inc((api, method), retries)
+    check_api_calls.inc((current_check.get() or "(none)", method))
+
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(method, seconds, nbytes, retries, error)
+
+
+def payload_stats():
+    """``{check: {"calls", "bytes", "parse_seconds"}}`` since the process started."""
+    with _payloads_lock:
+        return {check: dict(stats, parse_seconds=round(stats["parse_seconds"], 6))
+                for check, stats in _payloads.items()}
+
+
+def render_prometheus(extra=()):
+    """All metrics in the Prometheus text exposition format; ``extra`` adds more metric objects."""
+    lines = []
+    for metric in list(METRICS) + list(extra):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,68 @@
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+import api_exec
+
+
+def throttled(retry_after=None):
+    headers = {"status": "429"}
+    if retry_after is not None:
+        headers["retry-after"] = str(retry_after)
+    return HttpError(httplib2.Response(headers), b"rate limited")
+
+
+class Flaky:
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(api_exec.time, "sleep", slept.append)
+    return slept
+
+
+def test_retry_after_is_waited_in_full(monkeypatch, sleeps):
+    monkeypatch.setattr(api_exec, "API_BACKOFF_MAX", 2.0)
+    send = Flaky([throttled(retry_after=5)])
+    assert api_exec.execute("compute", "/projects/p/x", send) == "ok"
+    assert sleeps == [5.0]
+
+
+def test_retry_after_beyond_retry_budget_gives_up(monkeypatch, sleeps):
+    monkeypatch.setattr(api_exec, "API_BACKOFF_MAX", 2.0)
+    monkeypatch.setattr(api_exec, "API_MAX_RETRIES", 3)
+    send = Flaky([throttled(retry_after=3600)])
+    with pytest.raises(HttpError):
+        api_exec.execute("compute", "/projects/p/x", send)
+    assert send.calls == 1 and sleeps == []
+
+
+def test_retry_after_beyond_deadline_gives_up(sleeps):
+    send = Flaky([throttled(retry_after=10)])
+    with api_exec.deadline_scope(5), pytest.raises(HttpError):
+        api_exec.execute("compute", "/projects/p/x", send)
+    assert send.calls == 1 and sleeps == []
+
+
+def test_retry_within_deadline(sleeps):
+    send = Flaky([throttled(retry_after=1)])
+    with api_exec.deadline_scope(5):
+        assert api_exec.execute("compute", "/projects/p/x", send) == "ok"
+    assert sleeps == [1.0]
+
+
+def test_nested_deadline_keeps_the_earliest():
+    with api_exec.deadline_scope(5):
+        with api_exec.deadline_scope(60):
+            assert api_exec.time_left() <= 5
+    assert api_exec.time_left() is None
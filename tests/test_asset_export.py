@@ -0,0 +1,49 @@
+import gzip
+import io
+import json
+
+import pytest
+
+from asset_export import _TextReader, iter_assets, iter_values
+
+ASSETS = [{"name": f"//compute.googleapis.com/projects/p/zones/z/instances/vm-é{i}",
+           "assetType": "compute.googleapis.com/Instance"} for i in range(50)]
+
+
+class UploadSpool:
+    """Only ``read()``, like Starlette's SpooledTemporaryFile on Python 3.10."""
+
+    def __init__(self, data):
+        self._file = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+
+def ndjson():
+    return "".join(json.dumps(a, ensure_ascii=False) + "\n" for a in ASSETS).encode("utf-8")
+
+
+def test_binary_stream_without_readable():
+    assert list(iter_assets(UploadSpool(ndjson()))) == ASSETS
+
+
+def test_multibyte_characters_split_across_reads():
+    source = _TextReader(UploadSpool(ndjson()))
+    assert list(iter_values(source, chunk_size=1)) == ASSETS
+
+
+def test_gzip_upload_and_pages():
+    pages = json.dumps([{"assets": ASSETS[:20]}, {"assets": ASSETS[20:]}]).encode("utf-8")
+    fp = gzip.GzipFile(fileobj=UploadSpool(gzip.compress(pages)), mode="rb")
+    assert list(iter_assets(fp)) == ASSETS
+
+
+def test_text_stream():
+    assert list(iter_assets(io.StringIO(ndjson().decode("utf-8")))) == ASSETS
+
+
+def test_non_object_values_are_rejected():
+    for data in ("[1, 2]", '"text"', '{"assets": [1]}', '{"assets": 3}'):
+        with pytest.raises(ValueError):
+            list(iter_assets(io.StringIO(data)))
@@ -0,0 +1,113 @@
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+import audit_cache
+import audit_checks
+import gcp_clients
+
+
+class Request:
+    def __init__(self, respond):
+        self.respond = respond
+
+    def execute(self):
+        return self.respond()
+
+
+class Storage:
+    """buckets.list with one bucket, and a getIamPolicy that depends on who is asking."""
+
+    def __init__(self, creds):
+        self.creds = creds
+
+    def buckets(self):
+        return self
+
+    def list(self, **_):
+        return Request(lambda: {"items": [{"name": "b1", "etag": "e1", "metageneration": "1"}]})
+
+    def list_next(self, request, response):
+        return None
+
+    def getIamPolicy(self, bucket, **_):
+        def respond():
+            if not self.creds.can_read_iam:
+                raise HttpError(httplib2.Response({"status": "403"}), b"forbidden")
+            return {"bindings": [{"role": "roles/storage.objectViewer", "members": ["allUsers"]}]}
+        return Request(respond)
+
+
+class Creds:
+    def __init__(self, email, can_read_iam):
+        self.service_account_email = email
+        self.can_read_iam = can_read_iam
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(audit_cache, "AUDIT_CACHE_ENABLED", True)
+    monkeypatch.setattr(audit_cache, "_cache", audit_cache.AuditCache(str(tmp_path / "audit.sqlite3")))
+    with gcp_clients.client_override(lambda api, version, creds: Storage(creds)):
+        yield
+
+
+def scan(creds):
+    return [tuple(f) for f in audit_checks.check_public_buckets(creds, "p")]
+
+
+def test_unreadable_iam_is_not_cached_for_other_accounts():
+    assert scan(Creds("a@p.iam.gserviceaccount.com", can_read_iam=False)) == []
+    assert scan(Creds("b@p.iam.gserviceaccount.com", can_read_iam=True)) == [
+        ("b1", "roles/storage.objectViewer", "allUsers")]
+
+
+def test_unreadable_iam_is_not_cached_for_the_same_account():
+    creds = Creds("a@p.iam.gserviceaccount.com", can_read_iam=False)
+    assert scan(creds) == []
+    creds.can_read_iam = True  # e.g. the missing role was granted
+    assert scan(creds) == [("b1", "roles/storage.objectViewer", "allUsers")]
+
+
+def test_verdicts_are_per_viewer():
+    scan(Creds("b@p.iam.gserviceaccount.com", can_read_iam=True))
+    cache = audit_cache.get_cache()
+    assert cache.get_verdict("p", "public_buckets", "b@p.iam.gserviceaccount.com", "b1", "e1:1") is not None
+    assert cache.get_verdict("p", "public_buckets", "a@p.iam.gserviceaccount.com", "b1", "e1:1") is None
+
+
+def test_refuses_cache_file_others_can_write(tmp_path):
+    path = tmp_path / "planted.sqlite3"
+    path.touch()
+    path.chmod(0o666)
+    with pytest.raises(PermissionError):
+        audit_cache.AuditCache(str(path))
+
+
+def test_new_cache_file_is_private(tmp_path):
+    path = tmp_path / "new.sqlite3"
+    audit_cache.AuditCache(str(path))
+    assert path.stat().st_mode & 0o777 == 0o600
+
+
+def test_streamed_scan_is_written_in_batches(monkeypatch):
+    cache = audit_cache.get_cache()
+    monkeypatch.setattr(audit_cache, "SCAN_WRITE_BATCH", 2)
+    cache.record_scan("p", "c", [["a"], ["b"]])
+    writer = audit_cache.scan_writer("p", "c")
+    for finding in (["b"], ["c"], ["d"]):
+        writer.add(finding)
+    assert writer.batch == [["d"]]  # two already written
+    assert cache.diff("p", "c")["previous_scan_at"] is None  # unfinished scans stay out of diffs
+    writer.finish()
+    diff = cache.diff("p", "c")
+    assert diff["added"] == [["c"], ["d"]] and diff["removed"] == [["a"]] and diff["unchanged"] == 1
+
+
+def test_abandoned_scan_leaves_no_rows():
+    cache = audit_cache.get_cache()
+    writer = audit_cache.scan_writer("p", "c")
+    writer.add(["a"])
+    writer.abandon()
+    assert cache.diff("p", "c") is None and cache.checks_scanned("p") == []
+    assert cache._conn().execute("SELECT COUNT(*) FROM scan_findings").fetchone()[0] == 0
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import api_exec
+import audit_runner
+
+
+def sleeper(seconds, findings=("f",)):
+    def check(creds, project):
+        time.sleep(seconds)
+        return list(findings)
+    return check
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    scans = []
+    monkeypatch.setattr(audit_runner.audit_cache, "record_scan", lambda *args: scans.append(args))
+
+    class Writer:
+        def __init__(self, project, check):
+            self.args = (project, check, [])
+
+        def add(self, finding):
+            self.args[2].append(finding)
+
+        def finish(self):
+            scans.append(self.args)
+
+        def abandon(self):
+            pass
+
+    monkeypatch.setattr(audit_runner.audit_cache, "scan_writer", Writer)
+    return scans
+
+
+@pytest.fixture
+def checks(monkeypatch):
+    registry = {}
+    monkeypatch.setattr(audit_runner, "CHECKS", registry)
+    monkeypatch.setattr(audit_runner, "STREAMS", {})
+    monkeypatch.setattr(audit_runner, "CHECK_TIMEOUTS", {})
+    return registry
+
+
+def test_timeout_excludes_time_queued(checks, recorded):
+    checks.update(a=sleeper(0.3), b=sleeper(0.3))
+    with ThreadPoolExecutor(1) as pool:
+        async def main():
+            return await asyncio.gather(*(audit_runner.run_check(name, None, "p", 0.5, executor=pool)
+                                          for name in checks))
+        results = asyncio.run(main())
+    assert [r["status"] for r in results] == ["ok", "ok"]
+    assert len(recorded) == 2
+
+
+def test_timed_out_check_stops_at_its_next_api_call(checks, recorded):
+    calls, finished = [], threading.Event()
+
+    def check(creds, project):
+        try:
+            while True:
+                api_exec.execute("compute", "/projects/p/x", lambda: calls.append(time.sleep(0.05)))
+        finally:
+            finished.set()
+
+    checks["slow"] = check
+    result = asyncio.run(audit_runner.run_check("slow", None, "p", 0.2))
+    assert result["status"] == "timeout"
+    assert finished.wait(1)
+    assert recorded == []
+
+
+def collect(**kwargs):
+    async def main():
+        return [line async for line in audit_runner.stream_audit(None, "p", **kwargs)]
+    return asyncio.run(main())
+
+
+def test_stream_applies_each_checks_own_timeout(checks, recorded, monkeypatch):
+    checks.update(slow=sleeper(1.0), fast=sleeper(0.4))
+    monkeypatch.setattr(audit_runner, "CHECK_TIMEOUTS", {"slow": 0.2, "fast": 2})
+    start = time.perf_counter()
+    lines = collect()
+    statuses = {line["check"]: line["status"] for line in lines if "status" in line}
+    assert statuses == {"slow": "timeout", "fast": "ok"}
+    assert [line["check"] for line in lines if "status" in line] == ["slow", "fast"]
+    assert time.perf_counter() - start < 0.9
+
+
+def test_stream_records_complete_scans(checks, recorded):
+    checks.update(a=sleeper(0, ["x", "y"]))
+    lines = collect()
+    assert [line["finding"] for line in lines if "finding" in line] == ["x", "y"]
+    assert recorded == [("p", "a", ["x", "y"])]
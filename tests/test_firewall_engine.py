@@ -0,0 +1,75 @@
+from firewall_engine import FirewallEngine
+
+NET_A = "https://www.googleapis.com/compute/v1/projects/p/global/networks/a"
+NET_B = "https://www.googleapis.com/compute/v1/projects/p/global/networks/b"
+
+
+def rule(name, network, sources, port="22", priority=1000, action="allowed"):
+    return {"name": name, "network": network, "priority": priority, "direction": "INGRESS",
+            "sourceRanges": sources, action: [{"IPProtocol": "tcp", "ports": [port]}]}
+
+
+def nic(network, ip):
+    return {"network": network, "accessConfigs": [{"natIP": ip}]}
+
+
+def test_multi_nic_instance_is_reported_once_per_port():
+    engine = FirewallEngine([
+        rule("a-ssh", NET_A, ["8.8.8.0/24"]),
+        rule("b-ssh", NET_B, ["8.8.8.128/25", "9.9.9.0/24"]),
+    ])
+    vm = {"name": "vm", "networkInterfaces": [nic(NET_A, "34.0.0.1"), nic(NET_B, "34.0.0.2")]}
+    found = list(engine.exposed_instances([vm], ports=(22,)))
+    assert len(found) == 1
+    instance, port, public, public6, allowing = found[0]
+    assert (instance, port, public6) == (vm, 22, False)
+    assert public == 256 + 256  # 8.8.8.0/24 counted once, plus 9.9.9.0/24
+    assert sorted(engine.names[i] for i in allowing) == ["a-ssh", "b-ssh"]
+
+
+def test_single_nic_instance():
+    engine = FirewallEngine([rule("open", NET_A, ["0.0.0.0/0"]), rule("web", NET_A, ["0.0.0.0/0"], port="80")])
+    vm = {"name": "vm", "networkInterfaces": [nic(NET_A, "34.0.0.1"), {"network": NET_B}]}
+    found = sorted((port, [engine.names[i] for i in allowing])
+                   for _, port, _, _, allowing in engine.exposed_instances([vm], ports=(22, 80, 443)))
+    assert found == [(22, ["open"]), (80, ["web"])]
+
+
+def test_split_halves_count_as_the_whole_internet():
+    engine = FirewallEngine([rule("any", NET_A, ["0.0.0.0/0"]), rule("halves", NET_A, ["0.0.0.0/1", "128.0.0.0/1"])])
+    assert engine.public_addresses(1) == engine.public_addresses(0)
+    assert engine.rules_exposing(ports=(22,)) == {22: [0, 1]}
+
+
+def test_large_public_cidr_is_open_to_the_internet():
+    engine = FirewallEngine([rule("wide", NET_A, ["34.0.0.0/8"]), rule("office", NET_A, ["8.8.8.0/24"]),
+                             rule("internal", NET_A, ["10.0.0.0/8"])])
+    assert [engine.public_addresses(i) for i in range(3)] == [2 ** 24, 256, 0]
+    assert engine.rules_exposing(ports=(22,)) == {22: [0]}
+
+
+def test_port_range_overlapping_a_sensitive_port():
+    engine = FirewallEngine([rule("range", NET_A, ["0.0.0.0/0"], port="3000-3400")])
+    assert engine.exposed_ports(0, ports=(22, 3306, 5432)) == [3306]
+    assert engine.rules_exposing(ports=(22, 3306)) == {22: [], 3306: [0]}
+
+
+def test_deny_wins_over_allow_at_equal_priority():
+    engine = FirewallEngine([rule("allow", NET_A, ["0.0.0.0/0"]),
+                             rule("deny", NET_A, ["0.0.0.0/0"], action="denied")])
+    vm = {"name": "vm", "networkInterfaces": [nic(NET_A, "34.0.0.1")]}
+    assert list(engine.exposed_instances([vm], ports=(22,))) == []
+
+
+def test_higher_priority_deny_hides_allow():
+    engine = FirewallEngine([rule("allow", NET_A, ["0.0.0.0/0"]),
+                             rule("deny-low-half", NET_A, ["0.0.0.0/1"], priority=100, action="denied"),
+                             rule("high-half", NET_B, ["128.0.0.0/1"])])
+    vm = {"name": "vm", "networkInterfaces": [nic(NET_A, "34.0.0.1")]}
+    [(_, port, public, _, allowing)] = engine.exposed_instances([vm], ports=(22,))
+    assert public == engine.public_addresses(2)  # only the half the deny rule leaves
+    assert [engine.names[i] for i in allowing] == ["allow"]
+
+    engine = FirewallEngine([rule("allow", NET_A, ["0.0.0.0/0"]),
+                             rule("deny-all", NET_A, ["0.0.0.0/0"], priority=100, action="denied")])
+    assert list(engine.exposed_instances([vm], ports=(22,))) == []
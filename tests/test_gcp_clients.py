@@ -0,0 +1,58 @@
+import json
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+import credentials_cache
+import gcp_clients
+
+
+def key_file(private_key_id="key-1"):
+    pem = rsa.generate_private_key(public_exponent=65537, key_size=2048).private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    return {
+        "type": "service_account",
+        "project_id": "p",
+        "client_email": "audit@p.iam.gserviceaccount.com",
+        "private_key_id": private_key_id,
+        "private_key": pem,
+        "token_uri": "https://oauth2.googleapis.com/token",
+    }
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    monkeypatch.setattr(credentials_cache, "_share_tokens", lambda key, creds: None)
+    monkeypatch.setattr(credentials_cache, "_ensure_refresher", lambda: None)
+    gcp_clients.clear_clients()
+    yield
+    gcp_clients.clear_clients()
+
+
+def test_forged_key_with_copied_identifiers_gets_its_own_client():
+    real = key_file()
+    forged = dict(key_file(), private_key_id=real["private_key_id"])
+    real_creds = credentials_cache.get_credentials(real)
+    forged_creds = credentials_cache.get_credentials(forged)
+    assert forged_creds is not real_creds
+
+    gcp_clients.get_client("storage", "v1", real_creds)
+    client = gcp_clients.get_client("storage", "v1", forged_creds)
+    request = client.buckets().list(project="p")
+    assert request.credentials is forged_creds
+
+
+def test_same_key_reuses_its_client():
+    info = key_file()
+    creds = credentials_cache.get_credentials(info)
+    assert credentials_cache.get_credentials(json.loads(json.dumps(info))) is creds
+    assert gcp_clients.get_client("storage", "v1", creds) is gcp_clients.get_client("storage", "v1", creds)
+
+
+def test_clients_of_new_accounts_share_the_parsed_document():
+    first = gcp_clients.get_client("storage", "v1", credentials_cache.get_credentials(key_file("key-1")))
+    second = gcp_clients.get_client("storage", "v1", credentials_cache.get_credentials(key_file("key-2")))
+    assert first is not second
+    assert first._rootDesc is second._rootDesc is gcp_clients.discovery_document("storage", "v1")
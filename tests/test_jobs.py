@@ -0,0 +1,71 @@
+import asyncio
+import threading
+
+import pytest
+
+import jobs
+import shared_cache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = shared_cache.SharedCache(str(tmp_path / "shared.sqlite3"))
+    monkeypatch.setattr(shared_cache, "SHARED_CACHE_ENABLED", True)
+    monkeypatch.setattr(shared_cache, "_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def run_check(monkeypatch):
+    threads = []
+
+    async def run_check(name, creds, project, timeout):
+        return {"status": "ok", "findings": [f"{name}-finding"]}
+
+    def select_checks(checks):
+        return list(checks)
+
+    put = shared_cache.SharedCache.put
+
+    def recording_put(self, namespace, key, value, ttl):
+        threads.append(threading.current_thread().name)
+        put(self, namespace, key, value, ttl)
+
+    monkeypatch.setattr(jobs.audit_runner, "run_check", run_check)
+    monkeypatch.setattr(jobs.audit_runner, "select_checks", select_checks)
+    monkeypatch.setattr(shared_cache.SharedCache, "put", recording_put)
+    return threads
+
+
+async def finish(manager, job):
+    while not job.finished:
+        await asyncio.sleep(0.01)
+    await manager.shutdown()
+
+
+def test_other_workers_see_results_published_once_per_check(cache, run_check):
+    manager = jobs.JobManager(workers=1)
+
+    async def main():
+        job, coalesced = await manager.submit(None, "p", ["a", "b"])
+        await finish(manager, job)
+        return job
+
+    job = asyncio.run(main())
+    assert cache.get("jobs", job.id)["checks"] == ["a", "b"]  # names only, not the findings
+    other = jobs.JobManager().get(job.id)
+    assert other.to_dict() == job.to_dict()
+    assert all(name.startswith("job-publish") for name in run_check)
+
+
+def test_identical_submissions_coalesce_while_claiming(cache, run_check):
+    manager = jobs.JobManager(workers=1)
+
+    async def main():
+        (first, _), (second, coalesced) = await asyncio.gather(
+            manager.submit(None, "p", ["a"]), manager.submit(None, "p", ["a"]))
+        await finish(manager, first)
+        return first, second, coalesced
+
+    first, second, coalesced = asyncio.run(main())
+    assert second is first and coalesced
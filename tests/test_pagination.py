@@ -0,0 +1,197 @@
+"""iter_pages and token_pager against a fake multi-page API."""
+import contextvars
+import threading
+import time
+
+import pytest
+
+import pagination
+from pagination import iter_pages, token_pager
+
+
+class FakeRequest:
+    """One page of a fake list API serving ``pages`` pages linked by ``nextPageToken``."""
+
+    def __init__(self, api, token=None):
+        self.api = api
+        self.token = token
+
+    def execute(self):
+        return self.api.serve(self.token)
+
+
+class FakeListApi:
+    def __init__(self, pages=5, fail_at=None, delay=0.0):
+        self.pages = pages
+        self.fail_at = fail_at
+        self.delay = delay
+        self.executed = []
+        self.threads = set()
+        self.lock = threading.Lock()
+
+    def serve(self, token):
+        index = int(token or 0)
+        with self.lock:
+            self.executed.append(index)
+            self.threads.add(threading.current_thread().name)
+        if self.delay:
+            time.sleep(self.delay)
+        if index == self.fail_at:
+            raise RuntimeError(f"page {index} failed")
+        page = {"items": [f"item-{index}"]}
+        if index + 1 < self.pages:
+            page["nextPageToken"] = str(index + 1)
+        return page
+
+    def list(self, pageToken=None):
+        return FakeRequest(self, pageToken)
+
+    def list_next(self, previous_request, previous_response):
+        token = previous_response.get("nextPageToken")
+        return FakeRequest(self, token) if token else None
+
+
+def items(pages):
+    return [item for page in pages for item in page["items"]]
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.mark.parametrize("prefetch", [0, 1, 2])
+def test_follows_every_page_in_order(prefetch):
+    api = FakeListApi(pages=7)
+    pages = list(iter_pages(api.list(), api.list_next, prefetch=prefetch))
+    assert items(pages) == [f"item-{i}" for i in range(7)]
+    assert sorted(api.executed) == list(range(7))
+
+
+@pytest.mark.parametrize("prefetch", [0, 2])
+def test_single_page_and_no_request(prefetch):
+    api = FakeListApi(pages=1)
+    assert items(iter_pages(api.list(), api.list_next, prefetch=prefetch)) == ["item-0"]
+    assert list(iter_pages(None, api.list_next, prefetch=prefetch)) == []
+
+
+def test_prefetch_fetches_on_a_pool_thread():
+    api = FakeListApi(pages=3)
+    list(iter_pages(api.list(), api.list_next, prefetch=2))
+    assert api.threads == {name for name in api.threads if name.startswith("page-prefetch")}
+
+
+def test_no_prefetch_fetches_on_the_calling_thread():
+    api = FakeListApi(pages=3)
+    list(iter_pages(api.list(), api.list_next, prefetch=0))
+    assert api.threads == {threading.current_thread().name}
+
+
+def test_prefetch_overlaps_fetching_with_processing():
+    api = FakeListApi(pages=4, delay=0.05)
+    start = time.perf_counter()
+    for _ in iter_pages(api.list(), api.list_next, prefetch=2):
+        time.sleep(0.05)  # processing a page takes as long as fetching one
+    overlapped = time.perf_counter() - start
+
+    api = FakeListApi(pages=4, delay=0.05)
+    start = time.perf_counter()
+    for _ in iter_pages(api.list(), api.list_next, prefetch=0):
+        time.sleep(0.05)
+    sequential = time.perf_counter() - start
+    assert overlapped < sequential * 0.85
+
+
+def test_falls_back_to_the_calling_thread_when_the_pool_is_busy(monkeypatch):
+    monkeypatch.setattr(pagination, "_fetcher_slots", threading.BoundedSemaphore(1))
+    pagination._fetcher_slots.acquire()  # every prefetch thread taken
+    api = FakeListApi(pages=3)
+    assert items(iter_pages(api.list(), api.list_next, prefetch=2)) == ["item-0", "item-1", "item-2"]
+    assert api.threads == {threading.current_thread().name}
+
+
+@pytest.mark.parametrize("prefetch", [0, 2])
+def test_fetch_errors_reach_the_consumer_after_earlier_pages(prefetch):
+    api = FakeListApi(pages=5, fail_at=2)
+    seen = []
+    with pytest.raises(RuntimeError, match="page 2 failed"):
+        for page in iter_pages(api.list(), api.list_next, prefetch=prefetch):
+            seen.extend(page["items"])
+    assert seen == ["item-0", "item-1"]
+    assert 3 not in api.executed
+
+
+def test_error_in_next_request_is_raised():
+    api = FakeListApi(pages=3)
+
+    def broken_next(previous_request, previous_response):
+        raise ValueError("bad token")
+
+    with pytest.raises(ValueError, match="bad token"):
+        list(iter_pages(api.list(), broken_next, prefetch=2))
+
+
+def test_fetcher_stops_when_the_consumer_exits_early():
+    slots = pagination._fetcher_slots._value
+    api = FakeListApi(pages=1000)
+    pages = iter_pages(api.list(), api.list_next, prefetch=2)
+    assert next(pages)["items"] == ["item-0"]
+    pages.close()
+
+    # The fetcher notices within its put timeout and hands its pool slot back
+    assert wait_until(lambda: pagination._fetcher_slots._value == slots)
+    fetched = len(api.executed)
+    time.sleep(0.2)
+    assert len(api.executed) == fetched
+    assert fetched <= 1 + 2 + 1  # the consumed page, a full buffer and one blocked put
+
+
+def test_fetcher_stops_when_the_consumer_breaks_out_of_a_loop():
+    slots = pagination._fetcher_slots._value
+    api = FakeListApi(pages=1000)
+    for page in iter_pages(api.list(), api.list_next, prefetch=2):
+        if page["items"] == ["item-3"]:
+            break
+    assert wait_until(lambda: pagination._fetcher_slots._value == slots)
+    assert len(api.executed) < 10
+
+
+def test_fetcher_runs_in_the_callers_context():
+    var = contextvars.ContextVar("check", default=None)
+    seen = []
+
+    class ContextRequest(FakeRequest):
+        def execute(self):
+            seen.append(var.get())
+            return super().execute()
+
+    api = FakeListApi(pages=3)
+    var.set("firewall_rules")
+    next_request = lambda req, resp: ContextRequest(api, resp["nextPageToken"]) if "nextPageToken" in resp else None
+    list(iter_pages(ContextRequest(api), next_request, prefetch=2))
+    assert seen == ["firewall_rules"] * 3
+
+
+def test_token_pager_reads_dotted_token_field():
+    calls = []
+
+    def build(**kwargs):
+        calls.append(kwargs)
+        return kwargs
+
+    pager = token_pager(build, token_field="metadata.continue", param="continue")
+    assert pager(None, {"metadata": {"continue": "abc"}}) == {"continue": "abc"}
+    assert pager(None, {"metadata": {}}) is None
+    assert pager(None, {}) is None
+    assert calls == [{"continue": "abc"}]
+
+
+@pytest.mark.parametrize("prefetch", [0, 2])
+def test_token_pager_drives_iter_pages(prefetch):
+    api = FakeListApi(pages=4)
+    pages = iter_pages(api.list(), token_pager(api.list), prefetch=prefetch)
+    assert items(pages) == ["item-0", "item-1", "item-2", "item-3"]
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+import shared_cache
+import sqlite_store
+
+
+def test_creates_private_file(tmp_path):
+    path = tmp_path / "shared.sqlite3"
+    cache = shared_cache.SharedCache(str(path))
+    cache.put("tokens", "k", {"token": "t"}, 60)
+    assert cache.get("tokens", "k") == {"token": "t"}
+    assert os.stat(path).st_mode & 0o777 == 0o600
+
+
+def test_refuses_file_readable_by_others(tmp_path):
+    path = tmp_path / "shared.sqlite3"
+    path.touch(mode=0o644)
+    os.chmod(path, 0o644)
+    with pytest.raises(PermissionError):
+        shared_cache.SharedCache(str(path))
+
+
+def test_refuses_planted_symlink(tmp_path):
+    target = tmp_path / "elsewhere"
+    target.touch(mode=0o600)
+    path = tmp_path / "shared.sqlite3"
+    path.symlink_to(target)
+    with pytest.raises(OSError):
+        shared_cache.SharedCache(str(path))
+
+
+def test_refuses_shared_directory(tmp_path):
+    directory = tmp_path / "app"
+    directory.mkdir(mode=0o755)
+    os.chmod(directory, 0o755)
+    with pytest.raises(PermissionError):
+        sqlite_store.private_dir(str(directory))
+
+
+def test_unsafe_file_disables_cache(tmp_path, monkeypatch):
+    directory = tmp_path / "app"
+    directory.mkdir(mode=0o777)
+    os.chmod(directory, 0o777)
+    monkeypatch.setattr(sqlite_store, "DATA_DIR", str(directory))
+    monkeypatch.setattr(shared_cache, "SHARED_CACHE_PATH", str(directory / "shared.sqlite3"))
+    monkeypatch.setattr(shared_cache, "SHARED_CACHE_ENABLED", True)
+    monkeypatch.setattr(shared_cache, "_cache", None)
+    monkeypatch.setattr(shared_cache, "_cache_failed", False)
+    assert shared_cache.get_cache() is None
+    assert not (directory / "shared.sqlite3").exists()